@@ -56,6 +56,8 @@ function powerWidget(initialPowerData) {
         // i.e {name,description,category, power_id,blockly_json,python_code,parameters}
         power: initialPowerData,
         formValues: {},
+        // placement rate in blocks per second, sent along with the power's parameters
+        placementRate: '100',
         showAdminControls: false,
         currentExecutionId: null,
 
@@ -191,6 +193,14 @@ function controlPanel() {
                       }
                   }
               });
+
+              // Throttled placement counters of a running power
+              socket.on('power_progress', (data) => {
+                  const current = this.powerStatuses[data.id];
+                  if (current && current.status === 'running') {
+                      current.progress = data;
+                  }
+              });
           }
 
 
@@ -275,6 +285,14 @@ function controlPanel() {
         return this.powerStatuses[powerId] || { status: 'Idle', message: '' , execution_id: null};
     },
 
+    // Formats the latest progress event of a running power, e.g. "1200 placed, 800 left, 950/s, ETA 1s"
+    getProgressText(powerId) {
+        const p = (this.powerStatuses[powerId] || {}).progress;
+        if (!p) return '';
+        const eta = p.eta === null ? '?' : `${Math.ceil(p.eta)}s`;
+        return `${p.placed} placed, ${p.remaining} left, ${Math.round(p.blocks_per_second)}/s, ETA ${eta} (${p.backend})`;
+    },
+
    // NEW METHOD to fetch the latest power data
     refreshPowersData() {
       console.log("Refreshing full powers data from server...");
@@ -11,7 +11,8 @@ from mcshell.mcrepo import JsonFileRepository
 from mcshell.mcclient import MCClient
 from mcshell.mcserver import start_app_server,app_server_thread
 from mcshell.mcactions import *
-from mcshell.mcserver import execute_power_in_thread, RUNNING_POWERS # Import helpers
+from mcshell.mcserver import execute_power_in_thread, RUNNING_POWERS, POWER_PROGRESS # Import helpers
+from mcshell.mcundo import list_undo_journals
 from mcshell.ppmanager import *
 from mcshell.ppdownloader import *
 
@@ -42,6 +43,7 @@ class MCShell(Magics):
         self.ip.set_hook('complete_command', self._complete_mc_run, re_key='%mc_run')
         self.ip.set_hook('complete_command', self._complete_mc_help, re_key='%mc_help')
         self.ip.set_hook('complete_command',self._complete_mc_cancel_power, re_key='%mc_cancel_power')
+        self.ip.set_hook('complete_command',self._complete_mc_undo, re_key='%mc_undo')
         self.ip.set_hook('complete_command',self._complete_world_command, re_key='%pp_start_world')
         self.ip.set_hook('complete_command',self._complete_world_command, re_key='%pp_delete_world')
 
@@ -791,6 +793,52 @@ class MCShell(Magics):
         else:
             print(f"Error: No running power found with ID: {execution_id}")
 
+    @line_magic
+    def mc_progress(self, line):
+        """Shows the placement progress of running powers (all of them, or the given execution ID)."""
+        execution_id = line.strip()
+        progress = {k: v for k, v in POWER_PROGRESS.items() if not execution_id or k == execution_id}
+        if not progress:
+            print("No running power is placing blocks." if not execution_id else
+                  f"Error: No running power found with ID: {execution_id}")
+            return
+        for _id, _progress in progress.items():
+            _s = _progress.snapshot()
+            _eta = f"{_s['eta']}s" if _s['eta'] is not None else "unknown"
+            print(f"{_id}: {_s['placed']} placed, {_s['remaining']} remaining, "
+                  f"{_s['blocks_per_second']} blocks/s, ETA {_eta}, backend {_s['backend']}")
+
+    def _complete_mc_undo(self, ipyshell, event):
+        text = event.symbol
+        parts = event.line.split()
+
+        arg_matches = []
+        if len(parts) == 1:
+            arg_matches = list_undo_journals()
+        elif len(parts) == 2 and text != '':
+            arg_matches = [c for c in list_undo_journals() if c.startswith(text)]
+
+        return arg_matches
+
+    @line_magic
+    def mc_undo(self, line):
+        """Restores the blocks changed by a power execution, from its undo journal."""
+        execution_id = line.strip()
+        if not execution_id:
+            print("Usage: %mc_undo <execution_id>")
+            print("Executions that can be undone (most recent first):", list_undo_journals())
+            return
+
+        if execution_id in RUNNING_POWERS:
+            print(f"Error: Power {execution_id} is still running. Cancel it first with %mc_cancel_power.")
+            return
+
+        mc_actions = MCActions(self._get_player(self._get_mc_name()), blocks_per_second=None)
+        try:
+            mc_actions.undo(execution_id)
+        finally:
+            mc_actions.close()
+
         # @line_magic
         # def mc_start_debug(self, line):
         #     """Starts the debug mcserver in a separate thread."""
@@ -853,7 +901,8 @@ class MCShell(Magics):
         print("Stopping any running application servers.")
         stop_app_server()
         print(f"Starting application server for authorized Minecraft player: {minecraft_name}")
-        start_app_server(self.server_data,minecraft_name,self.shell)
+        world_path = self.active_paper_server.world_data_path if self.active_paper_server else None
+        start_app_server(self.server_data,minecraft_name,self.shell,world_path)
         return
 
     @line_magic
@@ -61,6 +61,11 @@ MC_SERVER_DATA = {
     'password': None,
 }
 
+# default pace of MCActions.spawn_entities, in entities per second...
+ENTITY_SPAWN_RATE = 100.0
+# ... sent in pipelined batches of at most this many spawn requests
+ENTITY_SPAWN_BATCH = 50
+
 MC_DATA_DIR = pathlib.Path(__file__).parent.joinpath('data')
 
 FJ_JAR_PATH = MC_DATA_DIR.joinpath('FruitJuice-0.4.0.jar')
@@ -87,6 +92,9 @@ MC_APP_SRC_DIR = pathlib.Path(__file__).parent.parent.joinpath('mced/src')
 
 MC_POWER_LIBRARY_DIR = MC_DATA_DIR.joinpath('powers')
 MC_CONTROL_LAYOUT_PATH = MC_DATA_DIR.joinpath('control_layout.json')
+# per-user state, kept out of the package directory
+MC_STATE_DIR = pathlib.Path(os.environ.get('XDG_STATE_HOME') or pathlib.Path('~').expanduser().joinpath('.local/state')).joinpath('mc-shell')
+MC_UNDO_DIR = MC_STATE_DIR.joinpath('undo')
 MC_WORLDS_BASE_DIR = pathlib.Path('~').expanduser().joinpath('mc-worlds')
 MC_CENTRAL_CONFIG_FILE = pathlib.Path("/etc/mc-shell/user_map.json")
 
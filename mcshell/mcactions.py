@@ -1,4 +1,7 @@
 import ast
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from mcshell.mcplayer import MCPlayer
 from mcshell.constants import *
 
@@ -10,10 +13,69 @@ from mcshell.mcvoxel import (
     generate_digital_cube_coordinates,
     generate_digital_disc_coordinates,
     generate_digital_line_coordinates,
-    generate_digital_sphere_coordinates)
+    generate_digital_sphere_coordinates,
+    generate_digital_convex_hull_coordinates)
+
+from mcshell.mcimage import (
+    load_image_pixels,
+    load_pixel_art_materials,
+    map_pixels_to_materials,
+    find_row_runs,
+    image_runs_to_boxes,
+    DEFAULT_PIXEL_ART_GROUPS)
+
+from mcshell.mcplacement import (
+    coords_to_array,
+    decompose_into_boxes,
+    occupied_read_boxes,
+    parse_get_blocks_reply,
+    lookup_materials,
+    box_voxels,
+    split_box,
+    transform_blocks,
+    READ_MAX_VOLUME,
+    boxes_bounds,
+    boxes_overlap,
+    box_volumes,
+    chunk_order,
+    proximity_order,
+    CHUNK_ORDER_MIN_BATCH,
+    FruitJuiceBackend,
+    RconBackend,
+    PlacementScheduler,
+    parse_placement_rate,
+    PLACEMENT_TICK,
+    PlacementProgress,
+    WriteBuffer,
+    MaterialPalette,
+    UNKNOWN_MATERIAL,
+    RCON_MIN_BOX_VOLUME,
+    DEFAULT_PLACEMENT_RATE,
+    parse_verify,
+    VERIFY_RETRIES,
+    VERIFY_MIN_SAMPLE)
+
+from mcshell.mcpipeline import PipelinedConnection, ShardedConnection, ParallelReader, send_pipelined_requests
+from pyncraft.util import flatten_parameters_to_bytestring
+from mcshell.mcundo import UndoJournal, load_undo_journal, undo_journal_path
+from mcshell.mccache import WorldCache, DEFAULT_CACHE_MAX_AGE, HEIGHT_UNKNOWN
+
+from mcshell.mcterrain import (
+    generate_terrain_heights,
+    generate_terrain_columns,
+    DEFAULT_TERRAIN_LAYERS)
+from mcshell.mcschematic import load_schematic, save_schematic, AIR_MATERIALS, StructureTemplateBackend
+from mcshell.mcworld import InMemoryWorld
 
 class MCActionBase:
-    def __init__(self, mc_player_instance:MCPlayer,delay_between_blocks:float): # Added mc_version parameter
+    def __init__(self, mc_player_instance:MCPlayer,delay_between_blocks:Optional[float]=None,
+                 backend:str='auto', rcon_min_box_volume:int=RCON_MIN_BOX_VOLUME,
+                 transport:str='pipelined', connections:int=1, diff:bool=False,
+                 blocks_per_second=DEFAULT_PLACEMENT_RATE, execution_id:Optional[str]=None,
+                 progress_callback=None, asynchronous:bool=False,
+                 buffered:bool=False, cache_max_age=DEFAULT_CACHE_MAX_AGE,
+                 world:Optional[InMemoryWorld]=None, placement_order:str='chunk',
+                 focus_vec3=None, verify=False, world_path=None): # Added mc_version parameter
         """
         Initializes the action base.
 
@@ -21,48 +83,634 @@ class MCActionBase:
             mc_player_instance: An instance of a player connection class (e.g., MCPlayer).
             mc_version (str): The Minecraft version to load data for. This should match
                               the version of the server you are connecting to.
+            delay_between_blocks (float): Deprecated; a delay per block, converted to the
+                                          equivalent blocks_per_second if given.
+            backend (str): The default placement backend: 'fruitjuice', 'rcon', 'auto' or 'structure'.
+            rcon_min_box_volume (int): With the 'auto' backend, the smallest box sent as /fill over RCON.
+            transport (str): 'pipelined' to send FruitJuice writes over a buffered, fire-and-forget
+                             connection, or 'direct' to send each write through MCPlayer.pc.
+            connections (int): The number of pipelined connections writes are sharded over, by
+                               XZ region (see ShardedConnection); the control panel uses
+                               PLACEMENT_CONNECTIONS.
+            diff (bool): If True, read the world first and only place blocks that differ.
+            blocks_per_second: The placement rate of FruitJuice writes, or None/'unlimited'.
+            execution_id (str): If given, the block at each written coordinate is recorded
+                                first, in an undo journal saved under this id by close().
+            progress_callback: Called with throttled placement progress dicts (see PlacementProgress).
+            asynchronous (bool): If True, placement calls return a Future at once and the blocks
+                                 are placed by a background worker, in call order. Reads wait
+                                 only for the pending writes that overlap them.
+            buffered (bool): If True, writes are collected in a WriteBuffer and only the final
+                             block of each voxel is sent, on commit(), before a read, or when
+                             the buffer is full.
+            cache_max_age (float): How long (seconds) get_block and get_height may serve a cached
+                                   read; None caches for the whole run, 0 disables the cache.
+            world (InMemoryWorld): If given, every read and write goes to this in-memory world
+                                   instead of the server (dry runs and benchmarks), without
+                                   pacing.
+            placement_order (str): How large batches are ordered: 'chunk' (chunk by chunk) or
+                                   'proximity' (nearest to focus_vec3 first, chunk by chunk within
+                                   a distance band).
+            focus_vec3 (Vec3): The focus of 'proximity' ordering; defaults to the player's
+                               position, read once when first needed.
+            verify: If set, close() reads the placed blocks back and re-sends the missing ones
+                    (see verify_placement). True checks every block; a fraction checks a random
+                    sample first and everything only if the sample finds a missing block.
+            world_path: The data directory of the server's world (see
+                        PaperServerManager.world_data_path), needed by the 'structure' backend.
         """
         self.mcplayer = mc_player_instance
+        self.world = world
 
         # Initialize mapping dictionaries
         self.bukkit_to_entity_id_map = {}
         self._initialize_entity_id_map()
 
-        # allow a delay for between visuals
-        self.delay_between_blocks = delay_between_blocks
+        # pace placement for the visual effect of an animated build
+        if delay_between_blocks is not None:
+            blocks_per_second = 1.0 / delay_between_blocks if delay_between_blocks > 0 else None
+        if world is not None:
+            # nobody watches an in-memory world being built
+            blocks_per_second = None
+        self.scheduler = PlacementScheduler(blocks_per_second, before_wait=self._flush_writes)
+
+        # counters for blocks placed, throughput and ETA
+        self.progress = PlacementProgress(progress_callback)
+
+        # choose between FruitJuice and RCON /fill placement per call
+        # (an in-memory world has no RCON)
+        self.backend = 'fruitjuice' if world is not None else backend
+        self.rcon_min_box_volume = rcon_min_box_volume
+        self.world_path = world_path
+
+        # block writes can bypass the request/response connection of MCPlayer.pc
+        self.transport = transport
+        self.connections = max(1, int(connections))
+        self._pipeline = None
+
+        # send the part of a build nearest the player first
+        if placement_order not in ('chunk', 'proximity'):
+            print(f"Warning: Unknown placement order '{placement_order}'; using 'chunk'.")
+            placement_order = 'chunk'
+        self.placement_order = placement_order
+        self.focus = None if focus_vec3 is None else (focus_vec3.x, focus_vec3.y, focus_vec3.z)
+
+        # skip voxels that already hold the target block
+        self.diff = diff
+
+        # remember what was overwritten, so that the execution can be undone
+        # block types are interned once and carried as uint16 ids through the pipeline
+        self.palette = MaterialPalette()
+
+        self.journal = UndoJournal(execution_id, palette=self.palette) if execution_id else None
+
+        # placement can run on a single background worker while the program continues
+        self.asynchronous = asynchronous
+        self._executor = None
+        self._worker_ident = None
+        self._pending = []  # (bounds, future) of placements not yet waited for
+        self._closed = False
+        # MCPlayer.pc is one unlocked request/response socket that the program uses too (e.g.
+        # mcplayer.position), so the worker never touches it: it writes over the pipelined
+        # connection and reads over self.reader
+        self._pc_lock = threading.RLock()
+
+        # merge overlapping writes of the execution, last writer wins
+        self.write_buffer = WriteBuffer(palette=self.palette) if buffered else None
+
+        # (blocks, palette, source box) of the last copy_region
+        self.clipboard = None
+
+        # the final material of every block placed, to check against the world afterwards
+        self.verify = parse_verify(verify)
+        self.placed = WriteBuffer(palette=self.palette) if self.verify else None
+        self.verification = None
+
+        # serve repeated get_block/get_height calls locally
+        self.world_cache = WorldCache(self.palette, max_age=cache_max_age)
+        self._reader = None
+        self._reader_lock = threading.Lock()
 
     def _place_blocks_from_coords(self, coords_list, block_type_from_blockly,
-                                  placement_offset_vec3=None):
+                                  placement_offset_vec3=None, backend=None, diff=None, record=True,
+                                  buffered=True):
         """
         Helper method to take a list of coordinates and a Blockly block type,
         parse the block type, and set the blocks.
+
+        The voxels are first covered with boxes so that solid regions go out as one
+        setBlocks call per box; only the leftover voxels are sent with setBlock.
+
+        Args:
+            backend: The placement backend for this call (see _place_boxes).
+            diff: If True (defaults to self.diff), the blocks in the shape's bounding region are
+                  read first and voxels that already hold the block type are not sent.
+            record: If False, the overwritten blocks are not added to the undo journal.
+            buffered: If False, bypass the write buffer. Calls with a backend, diff or record
+                      option bypass it too, once the writes buffered before them are sent.
+
+        Returns:
+            The number of boxes and single blocks placed, a Future of it in asynchronous mode,
+            or the number of buffered voxels if the write buffer is on.
         """
-        if not coords_list:
+        if coords_list is None or len(coords_list) == 0:
             print("No coordinates generated, nothing to place.")
-            return
+            return 0
 
         # we use Bukkit IDs which are output in mc-ed
         minecraft_block_id = block_type_from_blockly
 
-        # print(f"Attempting to place {len(coords_list)} blocks of type '{minecraft_block_id}'")
-
-        offset_x, offset_y, offset_z = (0,0,0)
+        offset = (0, 0, 0)
         if placement_offset_vec3: # If a Vec3 object is given for overall placement
-            offset_x, offset_y, offset_z = int(placement_offset_vec3.x), int(placement_offset_vec3.y), int(placement_offset_vec3.z)
+            offset = (int(placement_offset_vec3.x), int(placement_offset_vec3.y), int(placement_offset_vec3.z))
 
-        for x, y, z in coords_list:
+        coords = coords_to_array(coords_list, offset)
+        if buffered and self.write_buffer is not None and threading.get_ident() != self._worker_ident:
+            if backend is None and diff is None and record:
+                return self._buffer_writes(coords, minecraft_block_id)
+            # the buffer does not carry per-call options, so this call bypasses it, after what it holds
+            self.commit()
+        return self._place_voxel_groups([(minecraft_block_id, coords)], backend, diff, record)
+
+    def _place_voxel_groups(self, groups, backend=None, diff=None, record=True):
+        """
+        Places voxels of several materials as one batch of boxes, so that the placement
+        order covers all of them rather than one material at a time.
+
+        Args:
+            groups: A list of (material, (N, 3) coords) pairs. Voxels of different groups
+                    must not overlap.
+            backend, diff, record: As for _place_blocks_from_coords.
+
+        Returns:
+            The number of boxes and single blocks placed, or a Future of it in asynchronous mode.
+        """
+        if self._should_defer():
+            return self._submit(boxes_bounds([np.concatenate([coords.min(axis=0), coords.max(axis=0)])
+                                              for _, coords in groups]),
+                                self._place_voxel_groups, groups, backend, diff, record)
+
+        coords = np.concatenate([coords for _, coords in groups])
+        materials = np.concatenate([np.full(len(coords), self.palette.intern(material), dtype=np.uint16)
+                                    for material, coords in groups])
+        diff = self.diff if diff is None else diff
+        record = record and self.journal is not None
+        if diff or record:
+            coords, first = np.unique(coords, axis=0, return_index=True)
+            materials = materials[first]
+            current = self._read_materials(coords)
+            if diff:
+                unchanged = current == materials
+                print(f"Diff placement: {int(unchanged.sum())} of {len(coords)} blocks already in place, "
+                      f"sending {int((~unchanged).sum())}.")
+                coords, materials, current = coords[~unchanged], materials[~unchanged], current[~unchanged]
+                if len(coords) == 0:
+                    return 0
+            if record:
+                self.journal.record(coords, current)
+
+        boxes = []
+        for material_id in dict.fromkeys(materials.tolist()):
+            material_boxes, singles = decompose_into_boxes(coords[materials == material_id])
+
+            # single voxels are degenerate boxes, which _place_boxes sends with setBlock
+            material_boxes = np.vstack([material_boxes, np.hstack([singles, singles])])
+            material = self.palette.name(material_id)
+            boxes.extend(tuple(box) + (material,) for box in material_boxes.tolist())
+        self._place_boxes(boxes, backend=backend, record=False, disjoint=True)
+
+        return len(boxes)
+
+    def _place_boxes(self, boxes, block_type=None, backend=None, record=True, disjoint=False):
+        """
+        Helper method to place axis-aligned boxes of blocks, one setBlocks call per box.
+
+        Args:
+            boxes: An iterable of (x1, y1, z1, x2, y2, z2) tuples (inclusive corners), or of
+                   (x1, y1, z1, x2, y2, z2, block_type) tuples if block_type is None.
+            block_type: The Bukkit material ID to use for every box.
+            backend: 'fruitjuice', 'rcon', 'auto' or 'structure' (defaults to self.backend).
+                     With 'auto', boxes of at least self.rcon_min_box_volume blocks are sent as
+                     /fill commands over RCON when a password is available. With 'structure',
+                     all boxes are written as structure templates and placed by the server.
+            record: If False, the overwritten blocks are not added to the undo journal.
+            disjoint: True if no two boxes overlap, so that they can be sent in any order.
+
+        FruitJuice writes are paced by self.scheduler; /fill commands are not, since they
+        are meant for bulk placement. Boxes are placed in order whichever backend sends them,
+        so later boxes win where they overlap. Disjoint batches of CHUNK_ORDER_MIN_BATCH boxes
+        or more are sent in self.placement_order instead.
 
-            final_x = x + offset_x
-            final_y = y + offset_y
-            final_z = z + offset_z
-            self.mcplayer.pc.setBlock(int(final_x), int(final_y), int(final_z), minecraft_block_id)
+        Returns:
+            None, or a Future in asynchronous mode.
+        """
+        boxes = list(boxes)
+        if not boxes:
+            return None
+        if self.write_buffer is not None and threading.get_ident() != self._worker_ident:
+            if backend is None and record:
+                # consecutive boxes of one material are added together, keeping the call order
+                for material, material_boxes in itertools.groupby(
+                        boxes, key=lambda box: block_type if block_type is not None else box[6]):
+                    self.write_buffer.add(box_voxels(list(material_boxes)), material)
+                if self.write_buffer.full:
+                    self.commit()
+                return None
+            self.commit()
+        if self._should_defer():
+            return self._submit(boxes_bounds(boxes), self._place_boxes, boxes, block_type, backend, record,
+                                disjoint)
+
+        # reordering overlapping boxes would change which of them wins
+        if disjoint and len(boxes) >= CHUNK_ORDER_MIN_BATCH:
+            boxes = [boxes[i] for i in self._placement_permutation(boxes)]
+
+        if record and self.journal is not None:
+            voxels = box_voxels(boxes)
+            self.journal.record(voxels, self._read_materials(voxels))
+
+        if self.placed is not None:
+            for material, material_boxes in itertools.groupby(
+                    boxes, key=lambda box: block_type if block_type is not None else box[6]):
+                self.placed.add(box_voxels(list(material_boxes)), material)
+
+        self.progress.add_planned(box_volumes([box[:6] for box in boxes]).sum())
+
+        backend = backend or self.backend
+        if backend == 'structure':
+            if self.structure_backend.available:
+                self._place_structure(boxes, block_type)
+                return
+            print("Warning: The structure backend needs a server password and the world directory; "
+                  "using 'auto' instead.")
+            backend = 'auto'
+        use_rcon = backend in ('rcon', 'auto') and self.rcon_backend.available
+        if backend == 'rcon' and not use_rcon:
+            print("Warning: The rcon backend needs a server password; using FruitJuice instead.")
+
+        fruitjuice = self.fruitjuice_backend
+        rcon_run = []
+        for box in boxes:
+            x1, y1, z1, x2, y2, z2 = (int(v) for v in box[:6])
+            material = block_type if block_type is not None else box[6]
+            volume = (abs(x2 - x1) + 1) * (abs(y2 - y1) + 1) * (abs(z2 - z1) + 1)
+
+            if use_rcon and (backend == 'rcon' or volume >= self.rcon_min_box_volume):
+                # consecutive /fill commands share one RCON connection
+                rcon_run.append((x1, y1, z1, x2, y2, z2, material))
+                continue
+            if rcon_run:
+                self._place_rcon(rcon_run)
+                rcon_run = []
+
+            self.scheduler.throttle(volume)
+            fruitjuice.set_boxes([(x1, y1, z1, x2, y2, z2)], material)
+            self.world_cache.apply_box((x1, y1, z1, x2, y2, z2), material)
+            self.progress.add_placed(volume, 'fruitjuice')
+
+        if rcon_run:
+            self._place_rcon(rcon_run)
+        self.progress.report(force=True)
+
+        self._flush_writes()
+
+    def _place_rcon(self, boxes):
+        # boxes are placed in call order, so earlier FruitJuice writes must land first
+        self._sync_writes()
+        self.rcon_backend.place_boxes(boxes)
+        for box in boxes:
+            self.world_cache.apply_box(box[:6], box[6])
+        self.progress.add_placed(box_volumes([box[:6] for box in boxes]).sum(), 'rcon')
+
+    def _place_structure(self, boxes, block_type=None):
+        # earlier FruitJuice writes to the same blocks must land first
+        self._sync_writes()
+        boxes = [tuple(int(v) for v in box[:6]) + (block_type if block_type is not None else box[6],)
+                 for box in boxes]
+        self.structure_backend.place_boxes(boxes)
+        for box in boxes:
+            self.world_cache.apply_box(box[:6], box[6])
+        self.progress.add_placed(box_volumes([box[:6] for box in boxes]).sum(), 'structure')
+        self.progress.report(force=True)
+
+    def _placement_permutation(self, boxes) -> np.ndarray:
+        """The order to send a batch of boxes in, according to self.placement_order."""
+        corners1 = np.array([box[:3] for box in boxes], dtype=np.int64)
+        corners2 = np.array([box[3:6] for box in boxes], dtype=np.int64)
+        self._resolve_focus()
+        if self.placement_order == 'proximity':
+            return proximity_order(corners1, corners2, self.focus)
+        # visit each chunk once, by the lower corner of every box
+        return chunk_order(np.minimum(corners1, corners2))
+
+    def _resolve_focus(self):
+        """Reads the player position as the focus of 'proximity' order, on the program thread."""
+        if self.placement_order != 'proximity' or self.focus is not None:
+            return
+        if threading.get_ident() == self._worker_ident:
+            # _submit reads it before queuing work, so only a failed read gets here
+            self.placement_order = 'chunk'
+            return
+        try:
+            with self._pc_lock:
+                position = self.mcplayer.position
+            self.focus = (position.x, position.y, position.z)
+        except Exception as e:
+            print(f"Warning: Could not read the player position ({e}); placing chunk by chunk.")
+            self.placement_order = 'chunk'
+
+    def _read_materials(self, coords) -> np.ndarray:
+        """
+        Reads the world around an (N, 3) voxel array with world.getBlocks.
 
-            # Pause execution for a fraction of a second
-            if self.delay_between_blocks > 0:
-                time.sleep(self.delay_between_blocks)
+        Returns:
+            An (N,) uint16 array of the palette ids of the materials at coords;
+            UNKNOWN_MATERIAL where a region could not be read.
+        """
+        # pending writes must land before we look at the world
+        self._sync_writes()
+        materials = np.full(len(coords), UNKNOWN_MATERIAL, dtype=np.uint16)
+        read_boxes = occupied_read_boxes(coords)
+        for read_box, reply in zip(read_boxes, self._fetch_many(read_boxes)):
+            lookup_materials(coords, read_box, parse_get_blocks_reply(reply, read_box, self.palette), materials)
+        return materials
+
+    @property
+    def reader(self):
+        """The ParallelReader for bulk reads and the worker's reads, or the in-memory world."""
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = self.world or ParallelReader(self.mcplayer.host, self.mcplayer.fruit_juice_port)
+            return self._reader
+
+    def _fetch_many(self, boxes) -> list:
+        """Fetches the raw getBlocks replies of several boxes, in parallel if there is more than one."""
+        if len(boxes) <= 1:
+            return [self._fetch_blocks(box) for box in boxes]
+        self._sync_writes()
+        return self.reader.get_blocks(boxes)
+
+    def _fetch_blocks(self, box) -> Optional[str]:
+        """Sends one world.getBlocks request for a box; returns the raw reply, or None on failure."""
+        self._sync_writes()
+        if threading.get_ident() == self._worker_ident:
+            return self.reader.get_blocks([box])[0]
+        try:
+            with self._pc_lock:
+                return self.pc.conn.sendReceive(b"world.getBlocks", *box)
+        except Exception as e:
+            print(f"Warning: Could not read blocks in {box}: {e}")
+            return None
+
+    def _fetch_height(self, x, z):
+        self._sync_writes()
+        with self._pc_lock:
+            return self.pc.getHeight(x, z)
+
+    def undo(self, execution_id: str) -> int:
+        """
+        Restores the blocks overwritten by a power execution from its undo journal, with
+        the same bulk placement path used to build. The journal is deleted afterwards.
 
-        # print(f"Placed {len(coords_list)} blocks.")
+        Returns:
+            The number of blocks restored.
+        """
+        try:
+            coords, indices, palette = load_undo_journal(execution_id)
+        except FileNotFoundError:
+            print(f"Error: No undo journal found for execution ID: {execution_id}")
+            return 0
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 0
+
+        # only the materials the journal uses; the palette is that of the whole execution
+        for index in np.unique(indices).tolist():
+            self._place_blocks_from_coords(coords[indices == index], palette[index], diff=False, record=False,
+                                           buffered=False)
+        self.wait()
+        undo_journal_path(execution_id).unlink(missing_ok=True)
+        print(f"Restored {len(coords)} blocks changed by {execution_id}.")
+        return len(coords)
+
+    def verify_placement(self, retries=VERIFY_RETRIES) -> Optional[dict]:
+        """
+        Reads back every block placed since the last verification with bulk getBlocks reads,
+        compares it with the material last written to it, and re-sends only the blocks that
+        differ, up to `retries` times. With a verify fraction below 1, a random sample is
+        read first, and the whole set only if the sample finds a missing block.
 
+        Blocks copied with /clone are not checked, since their material is not known here.
+
+        Returns:
+            A dict with the number of 'blocks' placed, of 'checked' blocks, of blocks 'missing'
+            at first, of blocks that 'failed' after the retries, the success 'ratio' and a
+            'summary' line; None if verification is off or nothing was placed.
+        """
+        if self.placed is None:
+            return None
+        self._wait_for_writes()
+        _, groups = self.placed.drain()
+        if not groups:
+            return None
+        coords = np.concatenate([material_coords for _, material_coords in groups])
+        intended = np.concatenate([np.full(len(material_coords), self.palette.intern(material), dtype=np.uint16)
+                                   for material, material_coords in groups])
+        total = len(coords)
+
+        checked = total
+        if self.verify < 1.0:
+            checked = min(total, max(VERIFY_MIN_SAMPLE, int(total * self.verify)))
+            sample = np.random.default_rng().choice(total, checked, replace=False)
+            missing_in_sample = self._read_materials(coords[sample]) != intended[sample]
+            if missing_in_sample.any():
+                checked = total
+        if checked == total:
+            missing = self._read_materials(coords) != intended
+        else:
+            missing = np.zeros(total, dtype=bool)
+        initially_missing = int(missing.sum())
+
+        for _ in range(max(0, int(retries))):
+            if not missing.any():
+                break
+            for material_id in np.unique(intended[missing]):
+                resend = missing & (intended == material_id)
+                self._place_blocks_from_coords(coords[resend], self.palette.name(material_id),
+                                               diff=False, record=False, buffered=False)
+            self._wait_for_writes()
+            missing[missing] = self._read_materials(coords[missing]) != intended[missing]
+        # the re-sent blocks were logged again; they are already part of this check
+        self.placed.drain()
+
+        failed = int(missing.sum())
+        ratio = (total - failed) / total
+        if checked < total:
+            summary = f"Verified a sample of {checked} of {total} blocks: all in place."
+        elif not initially_missing:
+            summary = f"Verified {total} blocks: all in place."
+        else:
+            summary = (f"Verified {total} blocks: {ratio:.1%} in place after re-sending "
+                       f"{initially_missing} missing blocks.")
+        print(summary if failed == 0 else f"Warning: {summary}")
+        self.verification = {'blocks': total, 'checked': checked, 'missing': initially_missing,
+                             'failed': failed, 'ratio': ratio, 'summary': summary}
+        return self.verification
+
+    def _should_defer(self) -> bool:
+        """
+        Whether a placement call should be handed to the worker instead of run now. Without
+        a pipelined connection the worker would have to write through MCPlayer.pc, so the
+        call runs now.
+        """
+        if not self.asynchronous or threading.get_ident() == self._worker_ident:
+            return False
+        return self.world is not None or self._open_pipeline() is not None
+
+    def _mark_worker(self):
+        self._worker_ident = threading.get_ident()
+
+    def _submit(self, bounds, fn, *args):
+        """Queues fn(*args) on the placement worker and remembers the region it writes to."""
+        # the worker cannot read the player position itself
+        self._resolve_focus()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mcactions-io',
+                                                initializer=self._mark_worker)
+        self._pending = [(b, f) for b, f in self._pending if not f.done() or (not f.cancelled() and f.exception() is not None)]
+        future = self._executor.submit(fn, *args)
+        self._pending.append((bounds, future))
+        return future
+
+    def _buffer_writes(self, coords, block_type) -> int:
+        self.write_buffer.add(coords, block_type)
+        if self.write_buffer.full:
+            self.commit()
+        return len(coords)
+
+    def commit(self):
+        """Sends the final block of every voxel in the write buffer as one merged batch."""
+        if not self.write_buffer:
+            return
+        writes, groups = self.write_buffer.drain()
+        voxels = sum(len(coords) for _, coords in groups)
+        if writes > voxels:
+            print(f"Write buffer: {writes} writes merged into {voxels} blocks.")
+        # the groups are disjoint, so they are placed as one batch in self.placement_order
+        self._place_voxel_groups(groups)
+
+    def _wait_for_writes(self, bounds=None, sync=True):
+        """
+        Waits for the pending asynchronous placements whose region overlaps bounds (all of
+        them if bounds is None), then, if sync is True, for the server to apply the buffered
+        writes. Errors raised by those placements are re-raised here.
+        """
+        if self.write_buffer and threading.get_ident() != self._worker_ident:
+            # a read must see the program's own writes
+            self.commit()
+        if self._pending and threading.get_ident() != self._worker_ident:
+            waiting = [(b, f) for b, f in self._pending if bounds is None or boxes_overlap(b, bounds)]
+            self._pending = [item for item in self._pending if item not in waiting]
+            for _, future in waiting:
+                if not future.cancelled():
+                    future.result()
+        if sync:
+            self._sync_writes()
+
+    def wait(self):
+        """Waits until every placement so far has been applied by the server."""
+        self._wait_for_writes()
+
+    @property
+    def pc(self):
+        """The pyncraft Minecraft connection of the player, or the in-memory world."""
+        return self.world if self.world is not None else self.mcplayer.pc
+
+    @property
+    def writer(self):
+        """The object block writes are sent through: the pipelined connection or MCPlayer.pc."""
+        if self.world is not None:
+            return self.world
+        pipeline = self._open_pipeline()
+        return pipeline if pipeline is not None else self.mcplayer.pc
+
+    def _open_pipeline(self):
+        """Opens the pipelined connection on first use; returns it, or None with the direct transport."""
+        if self.transport == 'pipelined' and self._pipeline is None:
+            try:
+                if self.connections > 1:
+                    self._pipeline = ShardedConnection(self.mcplayer.host, self.mcplayer.fruit_juice_port,
+                                                       self.connections)
+                else:
+                    self._pipeline = PipelinedConnection(self.mcplayer.host, self.mcplayer.fruit_juice_port)
+            except OSError as e:
+                print(f"Warning: Could not open a pipelined connection ({e}); sending blocks directly.")
+                self.transport = 'direct'
+        return self._pipeline
+
+    def _flush_writes(self):
+        """Sends any buffered writes without waiting for the server."""
+        if self._pipeline is not None:
+            self._pipeline.flush()
+
+    def _sync_writes(self):
+        """
+        Waits until the server has applied every buffered write. Must be called before
+        anything that goes through MCPlayer.pc and could observe those writes.
+        """
+        if self._pipeline is not None:
+            self._pipeline.sync()
+            self._pipeline.report_errors()
+
+    def close(self):
+        """
+        Applies all outstanding writes, closes the pipelined connection and saves the undo
+        journal. Only the first call does anything, even if it raises.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        cancelled = getattr(self.mcplayer, 'cancel_event', None) and self.mcplayer.cancel_event.is_set()
+        if self.write_buffer and not cancelled:
+            self.commit()
+        if self.placed is not None and not cancelled:
+            self.verify_placement()
+        if self._executor is not None:
+            if cancelled:
+                for _, future in self._pending:
+                    future.cancel()
+            try:
+                self.wait()
+            finally:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        if self._pipeline is not None:
+            self._pipeline.close()
+            self._pipeline.report_errors()
+            if isinstance(self._pipeline, ShardedConnection):
+                print(self._pipeline.report())
+            self._pipeline = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self.world_cache.hits or self.world_cache.misses:
+            print(self.world_cache.report())
+        if self.journal is not None and self.journal.save():
+            print(f"Saved undo journal of {len(self.journal)} blocks for {self.journal.execution_id}.")
+        if self.world is not None:
+            print(self.world.report())
+
+    @property
+    def fruitjuice_backend(self) -> FruitJuiceBackend:
+        return FruitJuiceBackend(self.writer, self.palette)
+
+    @property
+    def rcon_backend(self) -> RconBackend:
+        return RconBackend(self.mcplayer)
+
+    @property
+    def structure_backend(self) -> StructureTemplateBackend:
+        return StructureTemplateBackend(self.mcplayer, self.world_path)
 
     def _initialize_entity_id_map(self):
         with MC_ENTITY_ID_MAP_PATH.open('rb') as f:
@@ -82,8 +730,17 @@ class MCActionBase:
         return self.bukkit_to_entity_id_map.get(bukkit_enum_string)
 
 class MCActions(MCActionBase): # Inherits from MCActionBase
-    def __init__(self, mc_player_instance,delay_between_blocks=0.01):
-        super().__init__(mc_player_instance,delay_between_blocks) # Call parent constructor
+    def __init__(self, mc_player_instance,delay_between_blocks=None,backend='auto',diff=False,
+                 connections=1,placement_order='chunk',focus_vec3=None,verify=False,
+                 world_path=None,
+                 blocks_per_second=DEFAULT_PLACEMENT_RATE,execution_id=None,progress_callback=None,
+                 asynchronous=False,buffered=False,cache_max_age=DEFAULT_CACHE_MAX_AGE,world=None):
+        super().__init__(mc_player_instance,delay_between_blocks,backend,diff=diff,connections=connections,
+                         placement_order=placement_order,focus_vec3=focus_vec3,verify=verify,
+                         world_path=world_path,
+                         blocks_per_second=blocks_per_second,execution_id=execution_id,
+                         progress_callback=progress_callback,asynchronous=asynchronous,
+                         buffered=buffered,cache_max_age=cache_max_age,world=world) # Call parent constructor
         self.default_material_id = 1 # Example: material ID for stone in voxelmap
                                      # Or map block_type to material_id
 
@@ -103,7 +760,7 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
             radius=float(radius),
             inner_radius=float(inner_radius)
         )
-        self._place_blocks_from_coords(coords, block_type) # No additional offset needed if center is world coord
+        return self._place_blocks_from_coords(coords, block_type) # No additional offset needed if center is world coord
 
     def create_digital_tube(self, point1_vec3, point2_vec3, outer_thickness, block_type, inner_thickness=0.0):
         """
@@ -121,7 +778,7 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
             inner_thickness=float(inner_thickness)
 
         )
-        self._place_blocks_from_coords(coords, block_type)
+        return self._place_blocks_from_coords(coords, block_type)
 
     def create_digital_line(self, point1_vec3, point2_vec3, block_type):
         """
@@ -142,7 +799,7 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
         )
 
         # Use the existing helper to place the blocks
-        self._place_blocks_from_coords(coords, block_type)
+        return self._place_blocks_from_coords(coords, block_type)
 
     def create_digital_cube(self, center_vec3, side_length, rotation_matrix3, block_type, inner_offset_factor=0.0):
         """
@@ -160,7 +817,7 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
             rotation_matrix=rotation_matrix3.to_numpy(), # Your func expects np.ndarray
             inner_offset_factor=float(inner_offset_factor)
         )
-        self._place_blocks_from_coords(coords, block_type)
+        return self._place_blocks_from_coords(coords, block_type)
 
     def create_digital_tetrahedron(self, vertices_list_of_vec3, block_type, inner_offset_factor=0.0):
         """
@@ -181,7 +838,27 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
             vertices=vertex_tuples,
             inner_offset_factor=float(inner_offset_factor)
         )
-        self._place_blocks_from_coords(coords, block_type)
+        return self._place_blocks_from_coords(coords, block_type)
+
+    def create_digital_convex_hull(self, vertices_list_of_vec3, block_type, hollow=False):
+        """
+        Blockly action to create the convex hull of an arbitrary list of points
+        (pyramids, prisms, crystals, ...).
+        vertices_list_of_vec3: A list of at least 4 non-coplanar Vec3 instances.
+        block_type: string (Blockly ID)
+        hollow: bool (True for a 1-voxel thick shell)
+        """
+        if not isinstance(vertices_list_of_vec3, list) or len(vertices_list_of_vec3) < 4:
+            print("Error: create_digital_convex_hull expects a list of at least 4 Vec3 vertices.")
+            return
+
+        vertex_tuples = [v.to_tuple() for v in vertices_list_of_vec3]
+
+        coords = generate_digital_convex_hull_coordinates(
+            points=vertex_tuples,
+            hollow=bool(hollow)
+        )
+        return self._place_blocks_from_coords(coords, block_type)
 
     def create_digital_plane(self, normal_vec3, point_on_plane_vec3, block_type,
                                outer_width, outer_length, plane_thickness=1.0):
@@ -205,7 +882,7 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
                 outer_rect_dims=outer_rect_dims_tuple,
                 plane_thickness=float(plane_thickness)
             )
-            self._place_blocks_from_coords(coords, block_type)
+            return self._place_blocks_from_coords(coords, block_type)
         except (ValueError, TypeError) as e:
             print(f"Error: Invalid parameter type for create_digital_plane. Width, Length, and Thickness must be numbers. Error: {e}")
 
@@ -223,7 +900,197 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
             disc_thickness=float(disc_thickness),
             inner_radius=float(inner_radius)
         )
-        self._place_blocks_from_coords(coords, block_type)
+        return self._place_blocks_from_coords(coords, block_type)
+
+    def build_image(self, path, origin_vec3, orientation='xy', width=32,
+                    material_groups=DEFAULT_PIXEL_ART_GROUPS, dither=False):
+        """
+        Builds pixel art from an image file. Each pixel is mapped to the block whose
+        colour is nearest, and runs of the same block along a row are placed together.
+        Transparent pixels are skipped.
+
+        Args:
+            path (str): The path of the image file.
+            origin_vec3 (Vec3): The position of the bottom-left pixel.
+            orientation (str): 'xy' (wall along X), 'zy' (wall along Z) or 'xz' (floor).
+            width (int): The width of the build in blocks; the height keeps the aspect ratio.
+            material_groups: Groups from colourables.json / pickers.json to pick blocks from.
+            dither (bool): Whether to apply ordered dithering.
+        """
+        materials = load_pixel_art_materials(tuple(material_groups))
+        if not materials:
+            print(f"Error: No materials with a known colour in groups {list(material_groups)}.")
+            return
+
+        try:
+            rgb, opaque = load_image_pixels(path, int(width))
+        except (ImportError, OSError, ValueError) as e:
+            print(f"Error: Could not load image '{path}': {e}")
+            return
+
+        index_grid = map_pixels_to_materials(rgb, materials, dither=bool(dither)).astype(np.int32)
+        index_grid[~opaque] = -1
+
+        origin = (int(origin_vec3.x), int(origin_vec3.y), int(origin_vec3.z))
+        boxes = image_runs_to_boxes(*find_row_runs(index_grid), index_grid.shape[0], origin, orientation)
+        # the runs of different pixels never overlap
+        return self._place_boxes([box[:6] + (materials[box[6]],) for box in boxes], disjoint=True)
+
+    def create_terrain(self, corner1_vec3, corner2_vec3, amplitude=16, scale=32, octaves=4, seed=None,
+                       surface_block='GRASS_BLOCK', subsurface_block='DIRT', base_block='STONE'):
+        """
+        Blockly action to generate a procedural landscape from multi-octave gradient noise.
+        The two corners span the XZ rectangle; the lower of their Y values is the base of the terrain.
+
+        Args:
+            corner1_vec3, corner2_vec3 (Vec3): Opposite corners of the area.
+            amplitude (int): The maximum height of the terrain above its base.
+            scale (float): The size in blocks of the largest hills.
+            octaves (int): The number of noise layers (more gives rougher terrain).
+            seed (int): Seed for reproducible terrain; None for a random landscape.
+            surface_block, subsurface_block, base_block (str): Materials of the layers of each column.
+        """
+        x1, x2 = sorted((int(corner1_vec3.x), int(corner2_vec3.x)))
+        z1, z2 = sorted((int(corner1_vec3.z), int(corner2_vec3.z)))
+        y = min(int(corner1_vec3.y), int(corner2_vec3.y))
+        seed = None if seed is None else int(seed)
+
+        heights = generate_terrain_heights(x1, z1, x2, z2, amplitude=float(amplitude), scale=float(scale),
+                                           octaves=int(octaves), seed=seed)
+        layers = ((surface_block, 1), (subsurface_block, DEFAULT_TERRAIN_LAYERS[1][1]), (base_block, None))
+        return self._place_boxes(generate_terrain_columns(x1, y, z1, heights, layers), disjoint=True)
+
+    def paste_schematic(self, path, origin_vec3, skip_air=True):
+        """
+        Pastes a Sponge schematic (.schem) or structure file (.nbt), one bulk placement per
+        material. Block states (stair facing etc.) are not kept; blocks are placed by material.
+
+        Args:
+            path (str): The path of the schematic file.
+            origin_vec3 (Vec3): The position of the schematic's lower corner.
+            skip_air (bool): If True, air in the schematic leaves the world untouched.
+
+        Returns:
+            The list of placement results, one per material.
+        """
+        try:
+            blocks, palette = load_schematic(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: Could not load schematic '{path}': {e}")
+            return
+
+        origin = (int(origin_vec3.x), int(origin_vec3.y), int(origin_vec3.z))
+        results = []
+        for material_id, material in enumerate(palette):
+            if skip_air and material in AIR_MATERIALS:
+                continue
+            coords = np.argwhere(blocks == material_id)
+            if len(coords):
+                results.append(self._place_blocks_from_coords(coords + origin, material))
+        return results
+
+    def export_schematic(self, path, corner1_vec3, corner2_vec3):
+        """
+        Saves a cuboid region of the world as a Sponge schematic, or as a structure file
+        if path ends in .nbt. The region is captured with get_blocks.
+
+        Args:
+            path (str): The path of the file to write.
+            corner1_vec3, corner2_vec3 (Vec3): Opposite corners of the region (inclusive).
+
+        Returns:
+            The path of the written file.
+        """
+        blocks, palette = self.get_blocks(corner1_vec3, corner2_vec3)
+        try:
+            return save_schematic(path, blocks, palette)
+        except OSError as e:
+            print(f"Error: Could not write schematic '{path}': {e}")
+
+    def copy_region(self, corner1_vec3, corner2_vec3):
+        """
+        Reads a cuboid region into the clipboard, for paste_region.
+
+        Args:
+            corner1_vec3, corner2_vec3 (Vec3): Opposite corners of the region (inclusive).
+
+        Returns:
+            A tuple (blocks, palette) as returned by get_blocks.
+        """
+        blocks, palette = self.get_blocks(corner1_vec3, corner2_vec3)
+        c1 = (int(corner1_vec3.x), int(corner1_vec3.y), int(corner1_vec3.z))
+        c2 = (int(corner2_vec3.x), int(corner2_vec3.y), int(corner2_vec3.z))
+        source = tuple(min(a, b) for a, b in zip(c1, c2)) + tuple(max(a, b) for a, b in zip(c1, c2))
+        self.clipboard = (blocks, palette, source)
+        return blocks, palette
+
+    def paste_region(self, origin_vec3, rotation=0, mirror=None, skip_air=False, server_side=False):
+        """
+        Pastes the clipboard of copy_region with its lower corner at origin, after mirroring
+        and rotating it. The clipboard is placed in bulk, one placement per material; block
+        states such as stair facing are not rotated.
+
+        Args:
+            origin_vec3 (Vec3): The position of the lower corner of the pasted region.
+            rotation (int): Degrees clockwise seen from above: 0, 90, 180 or 270.
+            mirror (str): None, 'x' or 'z': the axis to reverse before rotating.
+            skip_air (bool): If True, air in the clipboard leaves the world untouched.
+            server_side (bool): If True, copy the source region with /clone over RCON instead,
+                                block states included. This copies the region as it is in the
+                                world now, not as it was when copied to the clipboard. It needs
+                                RCON, no rotation or mirror, and a destination that does not
+                                overlap the source; otherwise the clipboard is pasted.
+
+        Returns:
+            The number of /clone commands, or the list of placement results per material.
+        """
+        if self.clipboard is None:
+            print("Error: Nothing to paste; copy a region first.")
+            return
+        if int(rotation) % 90:
+            print(f"Error: Rotation must be a multiple of 90 degrees, not {rotation}.")
+            return
+        blocks, palette, source = self.clipboard
+        quarter_turns = (int(rotation) // 90) % 4
+        origin = (int(origin_vec3.x), int(origin_vec3.y), int(origin_vec3.z))
+        destination = origin + tuple(o + n - 1 for o, n in zip(origin, blocks.shape))
+
+        if server_side:
+            # /clone reads the source while writing, so overlapping regions go through the clipboard
+            if (quarter_turns == 0 and not mirror and self.backend != 'fruitjuice'
+                    and self.rcon_backend.available and not boxes_overlap(source, destination)):
+                return self._clone_region(source, destination, skip_air)
+            print("Warning: A server-side paste needs RCON, no rotation or mirror, and a destination "
+                  "apart from the source; pasting the clipboard instead.")
+
+        try:
+            blocks = transform_blocks(blocks, quarter_turns, mirror)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        results = []
+        for material_id, material in enumerate(palette):
+            if skip_air and material in AIR_MATERIALS:
+                continue
+            coords = np.argwhere(blocks == material_id)
+            if len(coords):
+                results.append(self._place_blocks_from_coords(coords + origin, material))
+        return results
+
+    def _clone_region(self, source, destination, masked):
+        # the source must hold every earlier write, and the destination is written outside the pipeline
+        self._wait_for_writes()
+        if self.journal is not None:
+            voxels = box_voxels([destination])
+            self.journal.record(voxels, self._read_materials(voxels))
+        volume = int(box_volumes([destination]).sum())
+        self.progress.add_planned(volume)
+        commands = self.rcon_backend.clone(source, destination[:3], masked=masked)
+        # we do not know what the source holds now, so forget what we cached
+        self.world_cache.clear()
+        self.progress.add_placed(volume, 'rcon')
+        self.progress.report(force=True)
+        return commands
 
     def spawn_entity(self, position_vec3, entity_type):
         """
@@ -244,7 +1111,59 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
         # print(f"ACTION: Spawning entity '{entity_type}' (ID: {entity_id_int}) at position {position_vec3}")
 
         # Now call pyncraft with the correct integer ID 1 unit above the requested position for safety
-        self.mcplayer.pc.spawnEntity(position_vec3.x, position_vec3.y + 1, position_vec3.z, entity_id_int)
+        self._wait_for_writes()
+        with self._pc_lock:
+            self.pc.spawnEntity(position_vec3.x, position_vec3.y + 1, position_vec3.z, entity_id_int)
+
+    def spawn_entities(self, positions, entity_type, rate=ENTITY_SPAWN_RATE, batch_size=ENTITY_SPAWN_BATCH):
+        """
+        Spawns one entity of a type at each of many positions, e.g. a crowd or a formation.
+        Spawn requests are pipelined in batches of at most batch_size, and batches are paced
+        to `rate` entities per second so the server is not flooded.
+
+        Args:
+            positions: A list of Vec3 instances, or an (N, 3) array of coordinates.
+            entity_type (str): The Bukkit enum string (e.g. 'ZOMBIE').
+            rate (float): Entities per second, or None/'unlimited'.
+            batch_size (int): The maximum number of spawns sent at once.
+
+        Returns:
+            The list of the spawned entity ids (None where a spawn failed).
+        """
+        entity_id_int = self._get_entity_id_from_bukkit_name(entity_type)
+        if entity_id_int is None:
+            print(f"Warning: Could not find a numerical ID for entity type '{entity_type}'. Cannot spawn.")
+            return []
+
+        points = np.array([p.to_tuple() if hasattr(p, 'to_tuple') else tuple(p) for p in positions],
+                          dtype=np.float64).reshape(-1, 3)
+        if len(points) == 0:
+            return []
+
+        # entities must not spawn inside blocks we are still placing
+        self._wait_for_writes()
+        batch_size = max(1, int(batch_size))
+        rate = parse_placement_rate(rate)
+        scheduler = PlacementScheduler(rate, tick=batch_size / rate if rate else PLACEMENT_TICK)
+        cancel_event = getattr(self.mcplayer, 'cancel_event', None)
+
+        entity_ids = []
+        for start in range(0, len(points), batch_size):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            batch = points[start:start + batch_size]
+            scheduler.throttle(len(batch))
+            # 1 unit above the requested position for safety, like spawn_entity
+            lines = [b"world.spawnEntity(" + flatten_parameters_to_bytestring((x, y + 1, z, entity_id_int)) + b")\n"
+                     for x, y, z in batch.tolist()]
+            with self._pc_lock:
+                replies = send_pipelined_requests(self.pc.conn, lines)
+            entity_ids.extend(None if r is None else int(r) for r in replies)
+
+        failed = entity_ids.count(None)
+        if failed:
+            print(f"Warning: {failed} of {len(entity_ids)} '{entity_type}' spawns failed.")
+        return entity_ids
 
     def set_block(self, position_vec3, block_type):
         """
@@ -265,8 +1184,27 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
         # print(f"ACTION: Setting block at ({x},{y},{z}) to {parsed_block_type_id} "
         #       f"for player {getattr(self.mcplayer, 'name', 'N/A')}")
 
+        if self.write_buffer is not None:
+            return self._buffer_writes(np.array([[x, y, z]]), parsed_block_type_id)
+        if self._should_defer():
+            return self._submit((x, y, z, x, y, z), self._set_block, x, y, z, parsed_block_type_id)
+        return self._set_block(x, y, z, parsed_block_type_id)
+
+    def _set_block(self, x, y, z, block_type):
+        if self.journal is not None and (x, y, z) not in self.journal:
+            coords = np.array([[x, y, z]])
+            self.journal.record(coords, self._read_materials(coords))
+
+        if self.placed is not None:
+            self.placed.add([(x, y, z)], block_type)
+
         # This is where you would call the actual pyncraft or Minecraft API method
-        self.mcplayer.pc.setBlock(x, y, z, parsed_block_type_id)
+        self.scheduler.throttle(1)
+        self.fruitjuice_backend.set_block(x, y, z, block_type)
+        self.world_cache.apply_box((x, y, z, x, y, z), block_type)
+        self.progress.add_planned(1)
+        self.progress.add_placed(1, 'fruitjuice')
+        self._flush_writes()
 
     def get_block(self, position_vec3):
         """
@@ -277,13 +1215,51 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
         # print(f"ACTION: Getting block at ({x},{y},{z})")
 
         # pyncraft's getBlock() returns the numerical ID of the block.
-        block_type = self.mcplayer.pc.getBlock(x, y, z)
+        # the cache is kept up to date by our own writes, so only overlapping ones must finish
+        self._wait_for_writes((x, y, z, x, y, z), sync=False)
+        block_type = None
+        if self.world_cache.enabled:
+            block_type = self.world_cache.get_block(x, y, z, self._fetch_blocks)
+        if block_type is None:
+            self._sync_writes()
+            with self._pc_lock:
+                block_type = self.pc.getBlock(x, y, z)
 
         if block_type:
             return block_type
         else:
             return 'AIR' # A safe default if the ID is unknown
 
+    def get_blocks(self, corner1_vec3, corner2_vec3):
+        """
+        Reads every block of a cuboid region. Regions larger than READ_MAX_VOLUME blocks
+        are fetched as sub-cuboids, over several connections at once.
+
+        Args:
+            corner1_vec3, corner2_vec3 (Vec3): Opposite corners of the region (inclusive).
+
+        Returns:
+            A tuple (blocks, palette): a (dx, dy, dz) uint16 array indexed from the lower
+            corner, and the list of material names its values index. Blocks that could not
+            be read hold UNKNOWN_MATERIAL.
+        """
+        c1 = (int(corner1_vec3.x), int(corner1_vec3.y), int(corner1_vec3.z))
+        c2 = (int(corner2_vec3.x), int(corner2_vec3.y), int(corner2_vec3.z))
+        lo = tuple(min(a, b) for a, b in zip(c1, c2))
+        hi = tuple(max(a, b) for a, b in zip(c1, c2))
+
+        self._wait_for_writes(lo + hi)
+        blocks = np.full([h - l + 1 for l, h in zip(lo, hi)], UNKNOWN_MATERIAL, dtype=np.uint16)
+        sub_boxes = split_box(lo + hi, READ_MAX_VOLUME)
+        for sub_box, reply in zip(sub_boxes, self._fetch_many(sub_boxes)):
+            sub_blocks = parse_get_blocks_reply(reply, sub_box, self.palette)
+            if sub_blocks is None:
+                print(f"Warning: Could not read blocks in {sub_box}.")
+                continue
+            x1, y1, z1 = (sub_box[i] - lo[i] for i in range(3))
+            blocks[x1:x1 + sub_blocks.shape[0], y1:y1 + sub_blocks.shape[1], z1:z1 + sub_blocks.shape[2]] = sub_blocks
+        return blocks, list(self.palette.names)
+
     def get_height(self, position_vec3):
         """
         Gets the Y coordinate of the highest block at the X,Z of the given position.
@@ -295,10 +1271,37 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
         # print(f"ACTION: Getting height at (x={x}, z={z})")
 
         # Call the pyncraft method using the corrected API path
-        height = self.mcplayer.pc.getHeight(x, z)
+        self._wait_for_writes((x, -(1 << 31), z, x, (1 << 31) - 1, z), sync=False)
+        if self.world_cache.enabled:
+            height = self.world_cache.get_height(x, z, self._fetch_height)
+        else:
+            height = self._fetch_height(x, z)
 
         return height
 
+    def get_heights(self, x1, z1, x2, z2):
+        """
+        Gets the heights of all the columns of an XZ rectangle (corners inclusive), with
+        pipelined requests instead of one round-trip per column. Heights are cached for the
+        execution (see cache_max_age) and kept up to date by its own writes.
+
+        Returns:
+            A (dx, dz) int16 array indexed from (min x, min z); HEIGHT_UNKNOWN where a
+            column could not be read.
+        """
+        x1, x2 = sorted((int(x1), int(x2)))
+        z1, z2 = sorted((int(z1), int(z2)))
+        self._wait_for_writes((x1, -(1 << 31), z1, x2, (1 << 31) - 1, z2), sync=False)
+        if self.world_cache.enabled:
+            return self.world_cache.get_heights(x1, z1, x2, z2, self._fetch_heights)
+        columns = [(x, z) for x in range(x1, x2 + 1) for z in range(z1, z2 + 1)]
+        heights = [HEIGHT_UNKNOWN if h is None else h for h in self._fetch_heights(columns)]
+        return np.array(heights, dtype=np.int16).reshape(x2 - x1 + 1, z2 - z1 + 1)
+
+    def _fetch_heights(self, columns) -> list:
+        self._sync_writes()
+        return self.reader.get_heights(columns)
+
     def post_to_chat(self, message):
         """
         Posts a message to the in-game chat.
@@ -311,7 +1314,8 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
         # print(f"ACTION: Posting to chat: \"{message_str}\"")
 
         # Call the pyncraft method using the corrected API path
-        self.mcplayer.pc.postToChat(message_str)
+        with self._pc_lock:
+            self.pc.postToChat(message_str)
 
 
     def create_explosion(self, position_vec3, power):
@@ -331,4 +1335,6 @@ class MCActions(MCActionBase): # Inherits from MCActionBase
         # print(f"ACTION: Creating explosion at ({x},{y},{z}) with power {power_float}")
 
         # Call the pyncraft method using the corrected API path
-        self.mcplayer.pc.createExplosion(x, y, z, power_float)
\ No newline at end of file
+        self._wait_for_writes()
+        with self._pc_lock:
+            self.pc.createExplosion(x, y, z, power_float)
\ No newline at end of file
@@ -0,0 +1,195 @@
+import threading
+import time
+
+import numpy as np
+
+from mcshell.mcplacement import MaterialPalette, UNKNOWN_MATERIAL, parse_get_blocks_reply, boxes_overlap
+
+# Cached reads older than this many seconds are fetched again, since other players
+# (or the server itself) may have changed the world in the meantime.
+DEFAULT_CACHE_MAX_AGE = 5.0
+
+SECTION_SIZE = 16
+
+# Value of a column whose height could not be read.
+HEIGHT_UNKNOWN = np.iinfo(np.int16).min
+
+
+def section_key(x: int, y: int, z: int) -> tuple:
+    """The (chunk x, section y, chunk z) key of the 16x16x16 section holding a block."""
+    return x >> 4, y >> 4, z >> 4
+
+
+def section_box(key) -> tuple:
+    """The (x1, y1, z1, x2, y2, z2) box of a section."""
+    cx, sy, cz = key
+    return (cx * SECTION_SIZE, sy * SECTION_SIZE, cz * SECTION_SIZE,
+            cx * SECTION_SIZE + SECTION_SIZE - 1, sy * SECTION_SIZE + SECTION_SIZE - 1, cz * SECTION_SIZE + SECTION_SIZE - 1)
+
+
+class WorldCache:
+    """
+    A read-through cache of the world for one program execution.
+
+    Blocks are fetched a whole chunk section (16x16x16) at a time with world.getBlocks and
+    kept as uint16 palette ids; column heights are cached per column. The execution's own
+    writes update cached sections and invalidate the heights of the columns they touch; a
+    section written to while it is being fetched is not cached.
+    Entries older than max_age seconds are treated as misses, so changes made by other
+    players show up again (None keeps entries for the whole run, 0 disables the cache).
+    """
+
+    def __init__(self, palette: MaterialPalette = None, max_age=DEFAULT_CACHE_MAX_AGE):
+        self.palette = palette if palette is not None else MaterialPalette()
+        self.max_age = None if max_age is None else float(max_age)
+        self._sections = {}  # section key -> (fetch time, (16, 16, 16) uint16 array in x, y, z order)
+        self._heights = {}  # (chunk x, chunk z) -> {(x, z): (fetch time, height)}
+        self._fetching = {}  # section key -> whether it was written to while being fetched
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age is None or self.max_age > 0
+
+    def _fresh(self, fetched: float) -> bool:
+        return self.max_age is None or time.monotonic() - fetched <= self.max_age
+
+    # --- blocks ---
+
+    def get_block(self, x: int, y: int, z: int, fetch_section):
+        """
+        Returns the material at (x, y, z), or None if it cannot be read.
+
+        Args:
+            fetch_section: Called with a section box on a miss; returns the raw getBlocks
+                           reply for it (or None on failure).
+        """
+        key = section_key(x, y, z)
+        with self._lock:
+            entry = self._sections.get(key)
+        if entry is not None and self._fresh(entry[0]):
+            self.hits += 1
+            blocks = entry[1]
+        else:
+            self.misses += 1
+            box = section_box(key)
+            with self._lock:
+                self._fetching[key] = False
+            try:
+                blocks = parse_get_blocks_reply(fetch_section(box), box, self.palette)
+            finally:
+                with self._lock:
+                    written = self._fetching.pop(key, True)
+            if blocks is None:
+                return None
+            # a write to the section during the fetch may be missing from the reply, so it is
+            # not cached; the caller has waited for writes to (x, y, z) itself
+            if not written:
+                with self._lock:
+                    self._sections[key] = (time.monotonic(), blocks)
+        return self.palette.name(int(blocks[x & 15, y & 15, z & 15]))
+
+    # --- heights ---
+
+    def get_height(self, x: int, z: int, fetch_height):
+        """Returns the height of the (x, z) column, calling fetch_height(x, z) on a miss."""
+        chunk = (x >> 4, z >> 4)
+        with self._lock:
+            entry = self._heights.get(chunk, {}).get((x, z))
+        if entry is not None and self._fresh(entry[0]):
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        height = fetch_height(x, z)
+        with self._lock:
+            self._heights.setdefault(chunk, {})[(x, z)] = (time.monotonic(), height)
+        return height
+
+    def get_heights(self, x1: int, z1: int, x2: int, z2: int, fetch_heights) -> np.ndarray:
+        """
+        Returns the heights of the columns of an XZ rectangle as a (dx, dz) int16 array.
+
+        Args:
+            fetch_heights: Called with a list of (x, z) columns that are not cached (or stale);
+                           returns their heights in order (None for failed reads, which are
+                           reported as HEIGHT_UNKNOWN and not cached).
+        """
+        x1, x2 = sorted((int(x1), int(x2)))
+        z1, z2 = sorted((int(z1), int(z2)))
+        heights = np.full((x2 - x1 + 1, z2 - z1 + 1), HEIGHT_UNKNOWN, dtype=np.int16)
+        missing = []
+        with self._lock:
+            for x in range(x1, x2 + 1):
+                for z in range(z1, z2 + 1):
+                    entry = self._heights.get((x >> 4, z >> 4), {}).get((x, z))
+                    if entry is not None and self._fresh(entry[0]):
+                        heights[x - x1, z - z1] = entry[1]
+                    else:
+                        missing.append((x, z))
+        self.hits += heights.size - len(missing)
+        self.misses += len(missing)
+        if missing:
+            fetched = fetch_heights(missing)
+            now = time.monotonic()
+            with self._lock:
+                for (x, z), height in zip(missing, fetched):
+                    if height is None:
+                        continue
+                    heights[x - x1, z - z1] = height
+                    self._heights.setdefault((x >> 4, z >> 4), {})[(x, z)] = (now, height)
+        return heights
+
+    # --- own writes ---
+
+    def apply_box(self, box, material: str):
+        """Updates the cache for a write of material to an (x1, y1, z1, x2, y2, z2) box."""
+        x1, y1, z1, x2, y2, z2 = (int(v) for v in box[:6])
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        z1, z2 = sorted((z1, z2))
+        material_id = self.palette.intern(material)
+        with self._lock:
+            for key in self._fetching:
+                if boxes_overlap(section_box(key), (x1, y1, z1, x2, y2, z2)):
+                    self._fetching[key] = True
+            if self._sections:
+                for cx in range(x1 >> 4, (x2 >> 4) + 1):
+                    for sy in range(y1 >> 4, (y2 >> 4) + 1):
+                        for cz in range(z1 >> 4, (z2 >> 4) + 1):
+                            entry = self._sections.get((cx, sy, cz))
+                            if entry is None:
+                                continue
+                            ox, oy, oz = cx * SECTION_SIZE, sy * SECTION_SIZE, cz * SECTION_SIZE
+                            entry[1][max(x1 - ox, 0):min(x2 - ox, 15) + 1,
+                                     max(y1 - oy, 0):min(y2 - oy, 15) + 1,
+                                     max(z1 - oz, 0):min(z2 - oz, 15) + 1] = material_id
+            if self._heights:
+                for cx in range(x1 >> 4, (x2 >> 4) + 1):
+                    for cz in range(z1 >> 4, (z2 >> 4) + 1):
+                        columns = self._heights.get((cx, cz))
+                        if not columns:
+                            continue
+                        for column in [c for c in columns if x1 <= c[0] <= x2 and z1 <= c[1] <= z2]:
+                            del columns[column]
+
+    def clear(self):
+        with self._lock:
+            self._sections.clear()
+            self._heights.clear()
+
+    # --- statistics ---
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hit_rate, 3),
+                'sections': len(self._sections)}
+
+    def report(self) -> str:
+        return (f"World cache: {self.hits} hits, {self.misses} misses "
+                f"({self.hit_rate:.1%} hit rate, {len(self._sections)} sections cached).")
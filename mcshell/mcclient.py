@@ -36,6 +36,25 @@ class MCClient:
 
         return _response
 
+    def run_many(self, commands):
+        """
+        Runs a batch of rcon commands over a single connection.
+
+        Args:
+            commands: An iterable of complete command strings (e.g. 'fill 0 0 0 1 1 1 minecraft:stone').
+
+        Returns:
+            A list of the server's responses, in order.
+        """
+        if not self.password:
+            print('A password is required!')
+            return
+
+        with Client(self.host, self.rcon_port, passwd=self.password) as client:
+            _responses = [client.run(_command) for _command in commands]
+
+        return _responses
+
     @lru_cache(maxsize=1)
     def py_client(self,player_name=None):
         # if self.server_type != 'paper':
@@ -0,0 +1,205 @@
+import numpy as np
+from functools import lru_cache
+
+from mcshell.constants import *
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is only needed to build pixel art from image files.
+    Image = None
+
+# Approximate average texture colours (RGB) of full, opaque blocks that make
+# good "pixels". Only materials listed here can be chosen by the colour matcher.
+_DYE_COLOURS = ['WHITE', 'ORANGE', 'MAGENTA', 'LIGHT_BLUE', 'YELLOW', 'LIME', 'PINK', 'GRAY',
+                'LIGHT_GRAY', 'CYAN', 'PURPLE', 'BLUE', 'BROWN', 'GREEN', 'RED', 'BLACK']
+
+_COLOURABLE_RGB = {
+    'WOOL': [(234, 236, 237), (241, 118, 20), (190, 69, 180), (58, 175, 217), (249, 198, 40), (112, 185, 26),
+             (238, 141, 172), (63, 68, 72), (142, 142, 135), (21, 138, 145), (122, 42, 173), (53, 57, 157),
+             (114, 72, 41), (85, 110, 28), (161, 39, 35), (21, 21, 26)],
+    'CONCRETE': [(207, 213, 214), (224, 97, 1), (169, 48, 159), (36, 137, 199), (241, 175, 21), (94, 169, 24),
+                 (214, 101, 143), (55, 58, 62), (125, 125, 115), (21, 119, 136), (100, 32, 156), (45, 47, 143),
+                 (96, 60, 32), (73, 91, 36), (142, 33, 33), (8, 10, 15)],
+    'TERRACOTTA': [(210, 178, 161), (162, 84, 38), (150, 88, 109), (113, 109, 138), (186, 133, 35), (104, 118, 53),
+                   (162, 78, 79), (58, 42, 36), (135, 107, 98), (87, 91, 91), (118, 70, 86), (74, 60, 91),
+                   (77, 51, 36), (76, 83, 42), (143, 61, 47), (37, 23, 16)],
+}
+
+MC_MATERIAL_COLOURS = {
+    f"{_dye}_{_base}": _rgb
+    for _base, _rgbs in _COLOURABLE_RGB.items()
+    for _dye, _rgb in zip(_DYE_COLOURS, _rgbs)
+}
+MC_MATERIAL_COLOURS.update({
+    'TERRACOTTA': (152, 94, 68),
+    # world
+    'STONE': (126, 126, 126), 'GRANITE': (149, 103, 86), 'DIORITE': (189, 188, 189), 'ANDESITE': (136, 136, 137),
+    'DEEPSLATE': (80, 80, 82), 'CALCITE': (223, 224, 220), 'TUFF': (108, 109, 103), 'DIRT': (134, 96, 67),
+    'SAND': (219, 207, 163), 'RED_SAND': (191, 103, 33), 'GRAVEL': (132, 127, 127), 'CLAY': (160, 166, 179),
+    'SNOW_BLOCK': (249, 254, 254), 'OBSIDIAN': (15, 11, 25), 'PACKED_ICE': (142, 180, 250),
+    # wood_planks
+    'OAK_PLANKS': (162, 131, 79), 'SPRUCE_PLANKS': (115, 85, 49), 'BIRCH_PLANKS': (192, 175, 121),
+    'JUNGLE_PLANKS': (160, 115, 81), 'ACACIA_PLANKS': (168, 90, 50), 'DARK_OAK_PLANKS': (67, 43, 20),
+    'MANGROVE_PLANKS': (118, 54, 49), 'CHERRY_PLANKS': (226, 178, 172), 'CRIMSON_PLANKS': (101, 49, 71),
+    'WARPED_PLANKS': (43, 105, 99),
+})
+
+# Default material groups (keys of colourables.json and pickers.json) used for pixel art.
+DEFAULT_PIXEL_ART_GROUPS = ('WOOL', 'CONCRETE', 'TERRACOTTA')
+
+# Bits per channel of the colour lookup table: 5 bits -> 32x32x32 cells.
+_LUT_BITS = 5
+
+# 4x4 Bayer matrix for ordered dithering, normalised to [-0.5, 0.5).
+_BAYER_4X4 = (np.array([[0, 8, 2, 10],
+                        [12, 4, 14, 6],
+                        [3, 11, 1, 9],
+                        [15, 7, 13, 5]], dtype=np.float64) + 0.5) / 16.0 - 0.5
+
+
+def load_pixel_art_materials(groups=DEFAULT_PIXEL_ART_GROUPS) -> list[str]:
+    """
+    Collects the materials of the given groups from colourables.json and pickers.json,
+    keeping only those with a known colour. Falls back to the built-in colour table
+    if the material data files have not been generated yet.
+
+    Args:
+        groups: Names of colourable bases (e.g. 'WOOL') and/or picker groups (e.g. 'wood_planks').
+
+    Returns:
+        A sorted list of Bukkit material names.
+    """
+    available = {}
+    for path in (MC_COLOURABLE_MATERIALS_DATA_PATH, MC_PICKER_MATERIALS_DATA_PATH):
+        try:
+            with path.open('r') as f:
+                available.update(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+
+    materials = set()
+    for group in groups:
+        if group in available:
+            materials.update(available[group])
+        elif group in _COLOURABLE_RGB:
+            materials.update(f"{_dye}_{group}" for _dye in _DYE_COLOURS)
+    return sorted(m for m in materials if m in MC_MATERIAL_COLOURS)
+
+
+@lru_cache(maxsize=8)
+def _build_colour_lut(materials: tuple) -> np.ndarray:
+    """
+    Precomputes the nearest material for every cell of a quantised RGB cube, so that
+    matching an image is a single fancy-indexing operation.
+    """
+    palette = np.array([MC_MATERIAL_COLOURS[m] for m in materials], dtype=np.float64)
+    levels = 1 << _LUT_BITS
+    step = 256 / levels
+    centers = np.arange(levels) * step + step / 2
+    r, g, b = np.meshgrid(centers, centers, centers, indexing='ij')
+    cells = np.stack([r, g, b], axis=-1).reshape(-1, 3)
+
+    # Weighted euclidean distance, a cheap approximation of perceived colour difference.
+    weights = np.array([2.0, 4.0, 3.0])
+    nearest = np.empty(len(cells), dtype=np.uint16)
+    for start in range(0, len(cells), 4096):
+        diff = cells[start:start + 4096, None, :] - palette[None, :, :]
+        nearest[start:start + 4096] = np.argmin((diff ** 2 * weights).sum(axis=2), axis=1)
+    return nearest.reshape(levels, levels, levels)
+
+
+def map_pixels_to_materials(rgb: np.ndarray, materials: list[str], dither: bool = False,
+                            dither_strength: float = 32.0) -> np.ndarray:
+    """
+    Maps an (H, W, 3) uint8 RGB array to indices into `materials`.
+
+    Args:
+        rgb: The image pixels.
+        materials: The candidate materials, all of which must have an entry in MC_MATERIAL_COLOURS.
+        dither: If True, apply ordered (Bayer) dithering before the lookup.
+        dither_strength: The amplitude of the dithering offset, in RGB units.
+
+    Returns:
+        An (H, W) uint16 array of indices into `materials`.
+    """
+    lut = _build_colour_lut(tuple(materials))
+    pixels = rgb[..., :3].astype(np.float64)
+    if dither:
+        h, w = pixels.shape[:2]
+        threshold = np.tile(_BAYER_4X4, (h // 4 + 1, w // 4 + 1))[:h, :w]
+        pixels = pixels + threshold[..., None] * dither_strength
+    cells = np.clip(pixels, 0, 255).astype(np.uint8) >> (8 - _LUT_BITS)
+    return lut[cells[..., 0], cells[..., 1], cells[..., 2]]
+
+
+def find_row_runs(index_grid: np.ndarray):
+    """
+    Finds the horizontal runs of equal values in each row of a 2D integer array.
+    Negative values mark empty cells and are not reported.
+
+    Returns:
+        A tuple of arrays (rows, col_starts, col_ends, values); col_ends are inclusive.
+    """
+    h, w = index_grid.shape
+    if h == 0 or w == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    starts = np.ones((h, w), dtype=bool)
+    starts[:, 1:] = index_grid[:, 1:] != index_grid[:, :-1]
+    ends = np.ones((h, w), dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+
+    rows, col_starts = np.nonzero(starts)
+    _, col_ends = np.nonzero(ends)
+    values = index_grid[rows, col_starts]
+    keep = values >= 0
+    return rows[keep], col_starts[keep], col_ends[keep], values[keep]
+
+
+def load_image_pixels(path, width: int):
+    """
+    Loads an image and resamples it to `width` pixels wide, preserving the aspect ratio.
+
+    Returns:
+        A tuple (rgb, opaque) of an (H, W, 3) uint8 array and an (H, W) boolean mask.
+    """
+    if Image is None:
+        raise ImportError("Pillow is required to build images. Install it with: pip install pillow")
+    with Image.open(path) as img:
+        img = img.convert('RGBA')
+        height = max(1, int(round(width * img.height / img.width)))
+        img = img.resize((width, height), Image.BOX)
+        pixels = np.asarray(img)
+    return pixels[..., :3], pixels[..., 3] >= 128
+
+
+def image_runs_to_boxes(rows, col_starts, col_ends, values, height, origin, orientation):
+    """
+    Converts row runs of a (height, W) image grid into world-space boxes.
+    The image's bottom-left pixel is placed at origin; row 0 is the top of the image.
+
+    orientation:
+        'xy': a wall along +X (the image faces the -Z direction).
+        'zy': a wall along +Z (the image faces the +X direction).
+        'xz': a floor along +X, with the top of the image towards -Z.
+
+    Returns:
+        A list of (x1, y1, z1, x2, y2, z2, value) tuples.
+    """
+    ox, oy, oz = origin
+    up = height - 1 - rows
+    if orientation == 'xy':
+        x1, x2 = ox + col_starts, ox + col_ends
+        y1 = y2 = oy + up
+        z1 = z2 = np.full_like(rows, oz)
+    elif orientation == 'zy':
+        z1, z2 = oz + col_starts, oz + col_ends
+        y1 = y2 = oy + up
+        x1 = x2 = np.full_like(rows, ox)
+    elif orientation == 'xz':
+        x1, x2 = ox + col_starts, ox + col_ends
+        z1 = z2 = oz - up
+        y1 = y2 = np.full_like(rows, oy)
+    else:
+        raise ValueError(f"Unknown orientation '{orientation}'. Use 'xy', 'zy' or 'xz'.")
+    return list(zip(*(a.tolist() for a in (x1, y1, z1, x2, y2, z2, values))))
@@ -0,0 +1,427 @@
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyncraft.connection import Connection
+from pyncraft.util import flatten_parameters_to_bytestring
+
+from mcshell.constants import *
+
+# Flush the write buffer when it holds this many protocol lines...
+PIPELINE_FLUSH_LINES = 512
+# ... or when its oldest line has waited this long (seconds).
+PIPELINE_FLUSH_INTERVAL = 0.005
+
+# Number of connections used to read large regions in parallel.
+PARALLEL_READ_WORKERS = 4
+
+# Number of connections the powers of the control panel shard block writes over...
+PLACEMENT_CONNECTIONS = 4
+# ... by square XZ regions of this many blocks (a multiple of the chunk size).
+SHARD_REGION_SIZE = 32
+
+# A request that always gets an answer and has no side effects. Its reply marks
+# the point up to which the server has processed everything we sent before it.
+_SYNC_REQUEST = b"world.getPlayerIds()\n"
+_SYNC_NO_PLAYERS_REPLY = "Fail,There are no players in the server."
+
+
+class PipelinedConnection:
+    """
+    A fire-and-forget connection to the FruitJuice plugin for block writes.
+
+    Protocol lines are encoded into one buffer and sent with a single sendall
+    every PIPELINE_FLUSH_LINES lines or PIPELINE_FLUSH_INTERVAL seconds, instead
+    of one socket write per block. Writes get no reply on success, so the
+    connection never waits for the server; error replies are drained by a
+    background thread and collected in self.errors.
+
+    It exposes the setBlock/setBlocks surface of pyncraft's Minecraft class, so
+    it can stand in for MCPlayer.pc wherever only writes are needed.
+    """
+
+    def __init__(self, host=MC_SERVER_HOST, port=FJ_PLUGIN_PORT,
+                 flush_lines=PIPELINE_FLUSH_LINES, flush_interval=PIPELINE_FLUSH_INTERVAL, sock=None):
+        """
+        Args:
+            sock: An already connected socket to use instead of connecting to host:port.
+        """
+        self.socket = sock if sock is not None else socket.create_connection((host, port))
+        if self.socket.family in (socket.AF_INET, socket.AF_INET6):
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.fd = self.socket.makefile("r", encoding="utf-8")
+
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._buffered_lines = 0
+        self._closed = threading.Event()
+        self._has_data = threading.Event()
+
+        self.lines_sent = 0
+        self.errors = []
+        self._pending_syncs = 0
+        self._sync_lock = threading.Lock()
+        self._sync_replies = queue.Queue()
+
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    # --- pyncraft-compatible write surface ---
+
+    def setBlock(self, x, y, z, block):
+        self.send_line(b"world.setBlock(%d,%d,%d,%s)\n" % (x, y, z, block.encode()))
+
+    def setBlocks(self, x1, y1, z1, x2, y2, z2, block):
+        self.send_line(b"world.setBlocks(%d,%d,%d,%d,%d,%d,%s)\n" % (x1, y1, z1, x2, y2, z2, block.encode()))
+
+    def set_block_encoded(self, x, y, z, suffix: bytes):
+        """setBlock with a pre-encoded material suffix, e.g. b",STONE)\\n" (see MaterialPalette)."""
+        self.send_line(b"world.setBlock(%d,%d,%d" % (x, y, z) + suffix)
+
+    def set_blocks_encoded(self, x1, y1, z1, x2, y2, z2, suffix: bytes):
+        self.send_line(b"world.setBlocks(%d,%d,%d,%d,%d,%d" % (x1, y1, z1, x2, y2, z2) + suffix)
+
+    def send(self, f, *data):
+        """Queues a command without waiting for a reply, like pyncraft's Connection.send."""
+        self.send_line(b"".join([f, b"(", flatten_parameters_to_bytestring(data), b")\n"]))
+
+    # --- buffering ---
+
+    def send_line(self, line: bytes):
+        with self._lock:
+            self._buffer += line
+            self._buffered_lines += 1
+            if self._buffered_lines >= self.flush_lines:
+                self._flush_locked()
+            else:
+                self._has_data.set()
+
+    def flush(self):
+        """Sends everything buffered so far."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            self.socket.sendall(self._buffer)
+            self.lines_sent += self._buffered_lines
+            self._buffer = bytearray()
+            self._buffered_lines = 0
+        self._has_data.clear()
+
+    def _flush_periodically(self):
+        while not self._closed.is_set():
+            if not self._has_data.wait(timeout=0.5):
+                continue
+            # give the buffer a moment to fill before sending it
+            if self._closed.wait(timeout=self.flush_interval):
+                break
+            try:
+                self.flush()
+            except OSError:
+                break
+
+    # --- replies ---
+
+    def _read_replies(self):
+        while not self._closed.is_set():
+            try:
+                line = self.fd.readline()
+            except (OSError, ValueError):
+                break
+            if line == "":
+                break
+            line = line.rstrip("\n")
+            with self._sync_lock:
+                is_sync_reply = self._pending_syncs > 0 and (
+                    not line.startswith("Fail") or line == _SYNC_NO_PLAYERS_REPLY)
+                if is_sync_reply:
+                    self._pending_syncs -= 1
+            if is_sync_reply:
+                self._sync_replies.put(line)
+            else:
+                self.errors.append(line)
+
+    def sync(self, timeout: float = 30.0) -> bool:
+        """
+        Flushes the buffer and waits until the server has processed every line sent so far.
+        Use it before reading blocks through another connection.
+
+        Returns:
+            False if the server did not answer within timeout seconds.
+        """
+        with self._lock:
+            with self._sync_lock:
+                self._pending_syncs += 1
+            self._buffer += _SYNC_REQUEST
+            self._buffered_lines += 1
+            self._flush_locked()
+        try:
+            self._sync_replies.get(timeout=timeout)
+            return True
+        except queue.Empty:
+            print(f"Warning: FruitJuice did not confirm pipelined writes within {timeout}s.")
+            return False
+
+    def report_errors(self, limit: int = 5):
+        """Prints and clears the error replies collected so far."""
+        errors, self.errors = self.errors, []
+        if errors:
+            print(f"Warning: {len(errors)} pipelined write(s) failed. First errors:")
+            for error in errors[:limit]:
+                print(f"  {error}")
+        return len(errors)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        try:
+            self.sync(timeout=10.0)
+        except OSError:
+            pass
+        self._closed.set()
+        self._has_data.set()
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+
+class ShardedConnection:
+    """
+    A pool of PipelinedConnections that block writes are spread over, so that several
+    TCP streams and server threads share the work.
+
+    Every block belongs to one XZ region of SHARD_REGION_SIZE blocks, and every region to
+    one connection; boxes are split at region borders. All writes to a block therefore go
+    through the same connection and keep their order, while writes to different regions
+    need no ordering between connections.
+
+    It has the write surface of PipelinedConnection; flush, sync and close apply to every
+    connection of the pool.
+    """
+
+    def __init__(self, host=MC_SERVER_HOST, port=FJ_PLUGIN_PORT, connections=PLACEMENT_CONNECTIONS,
+                 region_size=SHARD_REGION_SIZE, shard_factory=None, **kwargs):
+        """
+        Args:
+            shard_factory: Called without arguments to open each connection of the pool; by
+                           default a PipelinedConnection to host:port, with kwargs.
+        """
+        if shard_factory is None:
+            shard_factory = lambda: PipelinedConnection(host, port, **kwargs)
+        self.shards = []
+        try:
+            for _ in range(max(1, int(connections))):
+                self.shards.append(shard_factory())
+        except OSError:
+            for shard in self.shards:
+                shard.close()
+            raise
+        self.region_size = int(region_size)
+        # per connection: the block writes sent, and the time spent with writes in flight,
+        # from the first write after a sync to the sync that confirms it
+        self.writes = [0] * len(self.shards)
+        self.active_time = [0.0] * len(self.shards)
+        self._busy_since = [None] * len(self.shards)
+
+    def _shard(self, rx: int, rz: int) -> PipelinedConnection:
+        # spread neighbouring regions over different connections
+        i = ((rx * 73856093) ^ (rz * 19349663)) % len(self.shards)
+        self.writes[i] += 1
+        if self._busy_since[i] is None:
+            self._busy_since[i] = time.monotonic()
+        return self.shards[i]
+
+    def _split(self, x1, z1, x2, z2):
+        """Yields (connection, x1, z1, x2, z2) for the parts of an XZ rectangle in each region."""
+        x1, x2 = sorted((x1, x2))
+        z1, z2 = sorted((z1, z2))
+        size = self.region_size
+        for rx in range(x1 // size, x2 // size + 1):
+            for rz in range(z1 // size, z2 // size + 1):
+                yield (self._shard(rx, rz), max(x1, rx * size), max(z1, rz * size),
+                       min(x2, rx * size + size - 1), min(z2, rz * size + size - 1))
+
+    # --- pyncraft-compatible write surface ---
+
+    def setBlock(self, x, y, z, block):
+        self._shard(x // self.region_size, z // self.region_size).setBlock(x, y, z, block)
+
+    def setBlocks(self, x1, y1, z1, x2, y2, z2, block):
+        for shard, sx1, sz1, sx2, sz2 in self._split(x1, z1, x2, z2):
+            shard.setBlocks(sx1, y1, sz1, sx2, y2, sz2, block)
+
+    def set_block_encoded(self, x, y, z, suffix: bytes):
+        self._shard(x // self.region_size, z // self.region_size).set_block_encoded(x, y, z, suffix)
+
+    def set_blocks_encoded(self, x1, y1, z1, x2, y2, z2, suffix: bytes):
+        for shard, sx1, sz1, sx2, sz2 in self._split(x1, z1, x2, z2):
+            shard.set_blocks_encoded(sx1, y1, sz1, sx2, y2, sz2, suffix)
+
+    def send(self, f, *data):
+        """Queues a command that is not a block write, always on the first connection."""
+        self.shards[0].send(f, *data)
+
+    # --- pool ---
+
+    @property
+    def lines_sent(self) -> int:
+        return sum(shard.lines_sent for shard in self.shards)
+
+    @property
+    def errors(self) -> list:
+        return [error for shard in self.shards for error in shard.errors]
+
+    def flush(self):
+        for shard in self.shards:
+            shard.flush()
+
+    def sync(self, timeout: float = 30.0) -> bool:
+        """Waits until the server has processed every line sent so far on every connection."""
+        synced = True
+        for i, shard in enumerate(self.shards):
+            if not shard.sync(timeout):
+                synced = False
+            elif self._busy_since[i] is not None:
+                self.active_time[i] += time.monotonic() - self._busy_since[i]
+                self._busy_since[i] = None
+        return synced
+
+    def report_errors(self, limit: int = 5):
+        return sum(shard.report_errors(limit) for shard in self.shards)
+
+    def rates(self) -> list:
+        """The write rate of each connection in lines/s over its active time (None if it had none)."""
+        return [writes / active if active > 0 else None for writes, active in zip(self.writes, self.active_time)]
+
+    def report(self) -> str:
+        """
+        The writes and write rate of each connection over the time it had writes in flight,
+        and their sum, which shows how throughput scales with the number of connections.
+        """
+        rates = self.rates()
+        per_shard = ", ".join(f"{writes}" if rate is None else f"{writes} at {rate:.0f}/s"
+                              for writes, rate in zip(self.writes, rates))
+        report = f"Sharded writes: {len(self.shards)} connections sent {sum(self.writes)} writes ({per_shard})"
+        if any(rate is not None for rate in rates):
+            report += f", {sum(rate for rate in rates if rate is not None):.0f} writes/s combined"
+        return report + "."
+
+    def close(self):
+        try:
+            self.sync(timeout=10.0)
+        except OSError:
+            pass
+        for shard in self.shards:
+            shard.close()
+
+
+def send_pipelined_requests(conn: Connection, lines) -> list:
+    """
+    Sends request lines over a pyncraft Connection in a single write, then reads one reply
+    per line; FruitJuice answers in order. The connection must not be used by anyone else
+    meanwhile.
+
+    Returns:
+        The replies, in order, with None for failed requests.
+    """
+    lines = list(lines)
+    conn.socket.sendall(b"".join(lines))
+    replies = []
+    for _ in lines:
+        reply = conn.fd.readline()
+        if reply == "":
+            raise ConnectionError("FruitJuice closed the connection")
+        reply = reply.rstrip("\n")
+        replies.append(None if reply.startswith("Fail") else reply)
+    return replies
+
+
+class ParallelReader:
+    """
+    Reads several cuboids at once with world.getBlocks, each worker thread over its own
+    FruitJuice connection, since one connection can only have one request in flight.
+    """
+
+    def __init__(self, host=MC_SERVER_HOST, port=FJ_PLUGIN_PORT, workers=PARALLEL_READ_WORKERS):
+        self.host = host
+        self.port = port
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fruitjuice-read')
+
+    def _connection(self) -> Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = Connection(self.host, self.port)
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _close_connection(conn: Connection):
+        for closeable in (conn.fd, conn.socket):
+            try:
+                closeable.close()
+            except OSError:
+                pass
+
+    def _drop_connection(self):
+        """Closes this thread's connection after an error; the next request opens a new one."""
+        conn, self._local.conn = getattr(self._local, 'conn', None), None
+        if conn is None:
+            return
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        self._close_connection(conn)
+
+    def _get_blocks(self, box):
+        try:
+            return self._connection().sendReceive(b"world.getBlocks", *box)
+        except Exception as e:
+            print(f"Warning: Could not read blocks in {tuple(box)}: {e}")
+            # the connection may still hold a late reply, which would answer the next request
+            self._drop_connection()
+            return None
+
+    def get_blocks(self, boxes) -> list:
+        """Returns the raw getBlocks replies for the boxes, in order (None for failed reads)."""
+        return list(self._executor.map(self._get_blocks, boxes))
+
+    def _get_heights(self, columns):
+        # all requests go out in one write; FruitJuice answers them in order
+        try:
+            replies = send_pipelined_requests(self._connection(),
+                                              (b"world.getHeight(%d,%d)\n" % (x, z) for x, z in columns))
+            return [None if r is None else int(r) for r in replies]
+        except Exception as e:
+            print(f"Warning: Could not read {len(columns)} column heights: {e}")
+            self._drop_connection()
+            return [None] * len(columns)
+
+    def get_heights(self, columns, batch: int = 1024) -> list:
+        """
+        Returns the heights of (x, z) columns, in order (None for failed reads). The requests
+        are pipelined: each worker sends a batch of them at once and then reads the replies.
+        """
+        columns = list(columns)
+        batches = [columns[i:i + batch] for i in range(0, len(columns), batch)]
+        return [h for heights in self._executor.map(self._get_heights, batches) for h in heights]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                self._close_connection(conn)
+            self._connections = []
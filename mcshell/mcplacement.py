@@ -0,0 +1,731 @@
+import threading
+import time
+import numpy as np
+from typing import Optional
+
+# Largest bounding box (in voxels) that is rasterized to find boxes. Sparser or
+# larger shapes are sent block by block.
+MAX_DECOMPOSITION_GRID_VOLUME = 1 << 26
+
+
+def coords_to_array(coords, offset=(0, 0, 0)) -> np.ndarray:
+    """
+    Converts a list of (x, y, z) tuples (or an (N, 3) array) to an (N, 3) int64 array,
+    shifted by offset.
+    """
+    arr = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    return np.floor(arr).astype(np.int64) + np.asarray(offset, dtype=np.int64)
+
+
+def decompose_into_boxes(coords: np.ndarray, min_volume: int = 2):
+    """
+    Greedily covers a voxel set with axis-aligned boxes, so that solid regions can be
+    sent with one setBlocks call instead of one setBlock call per voxel.
+
+    Starting from the lowest unvisited voxel (in x, y, z order), each box is grown along
+    Z, then X, then Y for as long as the new slab is completely filled.
+
+    Args:
+        coords: An (N, 3) integer array of voxel coordinates (duplicates are allowed).
+        min_volume: Boxes smaller than this are returned as single voxels instead.
+
+    Returns:
+        A tuple (boxes, singles): an (B, 6) int64 array of inclusive (x1, y1, z1, x2, y2, z2)
+        corners and an (M, 3) int64 array of the voxels not covered by any box.
+    """
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    no_boxes = np.empty((0, 6), dtype=np.int64)
+    if len(coords) == 0:
+        return no_boxes, coords
+
+    lo = coords.min(axis=0)
+    shape = tuple((coords.max(axis=0) - lo + 1).tolist())
+    if np.prod(shape, dtype=np.float64) > MAX_DECOMPOSITION_GRID_VOLUME:
+        return no_boxes, np.unique(coords, axis=0)
+
+    grid = np.zeros(shape, dtype=bool)
+    local = coords - lo
+    grid[local[:, 0], local[:, 1], local[:, 2]] = True
+    flat = grid.reshape(-1)  # a view: clearing boxes in grid updates flat
+
+    boxes, singles = [], []
+    pos = 0
+    while pos < flat.size:
+        step = int(np.argmax(flat[pos:]))
+        if not flat[pos + step]:
+            break
+        pos += step
+        x0, y0, z0 = np.unravel_index(pos, shape)
+
+        # grow along Z
+        run = grid[x0, y0, z0:]
+        z1 = z0 + (int(np.argmin(run)) if not run.all() else len(run)) - 1
+        # grow along X
+        rows = grid[x0:, y0, z0:z1 + 1].all(axis=1)
+        x1 = x0 + (int(np.argmin(rows)) if not rows.all() else len(rows)) - 1
+        # grow along Y
+        slabs = grid[x0:x1 + 1, y0:, z0:z1 + 1].all(axis=(0, 2))
+        y1 = y0 + (int(np.argmin(slabs)) if not slabs.all() else len(slabs)) - 1
+
+        grid[x0:x1 + 1, y0:y1 + 1, z0:z1 + 1] = False
+        if (x1 - x0 + 1) * (y1 - y0 + 1) * (z1 - z0 + 1) >= min_volume:
+            boxes.append((x0, y0, z0, x1, y1, z1))
+        else:
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    for z in range(z0, z1 + 1):
+                        singles.append((x, y, z))
+
+    boxes = np.array(boxes, dtype=np.int64).reshape(-1, 6) + np.concatenate([lo, lo])
+    singles = np.array(singles, dtype=np.int64).reshape(-1, 3) + lo
+    return boxes, singles
+
+
+def box_volumes(boxes: np.ndarray) -> np.ndarray:
+    """Returns the number of voxels in each (x1, y1, z1, x2, y2, z2) box."""
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 6)
+    return np.prod(np.abs(boxes[:, 3:] - boxes[:, :3]) + 1, axis=1)
+
+
+# --- Material palette ---
+
+# Palette id of a voxel whose material is unknown, e.g. in a region that could not be read.
+UNKNOWN_MATERIAL = 0xFFFF
+
+
+class MaterialPalette:
+    """
+    Interns Bukkit material names as small integer ids, so that the placement pipeline can
+    carry uint16 arrays instead of one string per voxel. The FruitJuice protocol suffix of
+    each material (",STONE)\n") is encoded once, when the material is first seen.
+
+    A palette is shared by the program thread and the placement worker, so new materials
+    are added under a lock.
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self._ids = {}
+        self._suffixes = []
+        self._lock = threading.Lock()
+        for name in names:
+            self.intern(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def intern(self, name: str) -> int:
+        """Returns the id of a material, adding it to the palette if needed."""
+        material_id = self._ids.get(name)
+        if material_id is None:
+            with self._lock:
+                material_id = self._ids.get(name)
+                if material_id is None:
+                    if len(self.names) >= UNKNOWN_MATERIAL:
+                        raise ValueError("The material palette is full.")
+                    self.names.append(name)
+                    self._suffixes.append(b"," + name.encode() + b")\n")
+                    # published last, so an id found without the lock always has its name and suffix
+                    material_id = self._ids[name] = len(self.names) - 1
+        return material_id
+
+    def intern_many(self, names) -> np.ndarray:
+        """Returns a uint16 array of the ids of names; None becomes UNKNOWN_MATERIAL."""
+        return np.fromiter((UNKNOWN_MATERIAL if name is None else self.intern(name) for name in names),
+                           dtype=np.uint16, count=len(names))
+
+    def name(self, material_id: int) -> Optional[str]:
+        return None if material_id == UNKNOWN_MATERIAL else self.names[material_id]
+
+    def suffix(self, material_id: int) -> bytes:
+        """The encoded end of a setBlock/setBlocks line for this material."""
+        return self._suffixes[material_id]
+
+
+# --- Diffing against the world ---
+
+# Largest cuboid read with one world.getBlocks request; larger regions are read in pieces.
+READ_MAX_VOLUME = 1 << 15
+
+
+def parse_get_blocks_reply(reply: str, box, palette: Optional[MaterialPalette] = None) -> Optional[np.ndarray]:
+    """
+    Parses FruitJuice's reply to world.getBlocks(x1, y1, z1, x2, y2, z2).
+
+    The plugin lists the materials with Y as the outermost loop, then X, then Z, each
+    from the lower to the higher corner.
+
+    Returns:
+        A (dx, dy, dz) array indexed from the lower corner: uint16 palette ids if a palette
+        is given, material names otherwise. None if the reply is an error or has the
+        wrong number of blocks.
+    """
+    x1, y1, z1, x2, y2, z2 = (int(v) for v in box[:6])
+    dx, dy, dz = abs(x2 - x1) + 1, abs(y2 - y1) + 1, abs(z2 - z1) + 1
+    if reply is None or reply.startswith('Fail'):
+        return None
+    names = reply.strip().split(',')
+    if len(names) != dx * dy * dz:
+        return None
+    if palette is not None:
+        # a region holds few distinct materials, so intern each of them once
+        unique_names, inverse = np.unique(np.array(names, dtype=object), return_inverse=True)
+        materials = palette.intern_many(unique_names.tolist())[inverse]
+    else:
+        materials = np.array(names, dtype=object)
+    return materials.reshape(dy, dx, dz).transpose(1, 0, 2)
+
+
+def occupied_read_boxes(coords: np.ndarray, max_volume: int = READ_MAX_VOLUME) -> list:
+    """
+    Splits the bounding box of a voxel set into cuboids of at most max_volume voxels and
+    keeps those containing at least one voxel, so that sparse shapes do not read empty space.
+    """
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    if len(coords) == 0:
+        return []
+    lo, hi = coords.min(axis=0), coords.max(axis=0)
+    read_boxes = np.array(split_box((*lo.tolist(), *hi.tolist()), max_volume), dtype=np.int64)
+    # split_box tiles the bounding box on a regular grid, so each voxel's tile follows from its offset
+    tile = read_boxes[0, 3:] - read_boxes[0, :3] + 1
+    tile_index = (coords - lo) // tile
+    n_tiles = (hi - lo) // tile + 1
+    occupied = np.unique(np.ravel_multi_index(tile_index.T, n_tiles))
+    # split_box emits tiles in x, y, z order, the same order as ravel_multi_index
+    return read_boxes[occupied].tolist()
+
+
+def lookup_materials(coords: np.ndarray, read_box, current: Optional[np.ndarray], out: np.ndarray):
+    """
+    Copies the materials of the voxels in coords that lie inside read_box from `current`
+    (the parsed getBlocks reply for read_box) into `out`, an array of the same dtype.
+    """
+    if current is None:
+        return
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    lo = np.array(read_box[:3], dtype=np.int64)
+    hi = np.array(read_box[3:6], dtype=np.int64)
+    inside = np.all((coords >= lo) & (coords <= hi), axis=1)
+    local = coords[inside] - lo
+    out[inside] = current[local[:, 0], local[:, 1], local[:, 2]]
+
+
+def boxes_bounds(boxes) -> tuple:
+    """Returns the (x1, y1, z1, x2, y2, z2) bounding box of (x1, y1, z1, x2, y2, z2, ...) boxes."""
+    corners = np.array([box[:6] for box in boxes], dtype=np.int64).reshape(-1, 6)
+    lo = np.minimum(corners[:, :3], corners[:, 3:]).min(axis=0)
+    hi = np.maximum(corners[:, :3], corners[:, 3:]).max(axis=0)
+    return (*lo.tolist(), *hi.tolist())
+
+
+def boxes_overlap(a, b) -> bool:
+    """Whether two (x1, y1, z1, x2, y2, z2) boxes with sorted corners share a voxel."""
+    return all(a[i] <= b[i + 3] and b[i] <= a[i + 3] for i in range(3))
+
+
+def box_voxels(boxes) -> np.ndarray:
+    """Expands (x1, y1, z1, x2, y2, z2, ...) boxes into an (N, 3) int64 array of their voxels."""
+    corners = np.array([box[:6] for box in boxes], dtype=np.int64).reshape(-1, 6)
+    lo = np.minimum(corners[:, :3], corners[:, 3:])
+    size = np.abs(corners[:, 3:] - corners[:, :3]) + 1
+    volume = size.prod(axis=1)
+    # the index of every voxel within its own box, enumerated in x, y, z order
+    starts = np.repeat(np.cumsum(volume) - volume, volume)
+    local = np.arange(volume.sum(), dtype=np.int64) - starts
+    sy, sz = np.repeat(size[:, 1], volume), np.repeat(size[:, 2], volume)
+    offsets = np.stack([local // (sy * sz), (local // sz) % sy, local % sz], axis=1)
+    return np.repeat(lo, volume, axis=0) + offsets
+
+
+# --- Chunk ordering ---
+
+# Batches with at least this many writes are sorted by chunk before they are sent.
+CHUNK_ORDER_MIN_BATCH = 256
+
+# Bit layout of a chunk ordering key, from the most to the least significant bits:
+# chunk x (22 bits) | chunk z (22 bits) | section y (8 bits) | local y, z, x (4 bits each).
+# 22 bits cover the +/-30,000,000 block world border.
+_CHUNK_BITS = 22
+_SECTION_BITS = 8
+
+
+def chunk_order_keys(coords) -> np.ndarray:
+    """
+    Packs (N, 3) block coordinates into uint64 keys that sort by (chunk x, chunk z,
+    section y) and then by the block's index within the 16x16x16 section.
+    """
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    x, y, z = coords[:, 0], coords[:, 1], coords[:, 2]
+    chunk_x = (x >> 4) + (1 << (_CHUNK_BITS - 1))
+    chunk_z = (z >> 4) + (1 << (_CHUNK_BITS - 1))
+    section_y = (y >> 4) + (1 << (_SECTION_BITS - 1))
+    local = ((y & 15) << 8) | ((z & 15) << 4) | (x & 15)
+    keys = (chunk_x.astype(np.uint64) << np.uint64(_CHUNK_BITS + _SECTION_BITS + 12))
+    keys |= chunk_z.astype(np.uint64) << np.uint64(_SECTION_BITS + 12)
+    keys |= section_y.astype(np.uint64) << np.uint64(12)
+    keys |= local.astype(np.uint64)
+    return keys
+
+
+def chunk_order(coords) -> np.ndarray:
+    """
+    Returns the permutation that sorts (N, 3) coordinates chunk by chunk, so the server
+    loads and relights each chunk once instead of every time a write comes back to it.
+    Writes that share a key keep their original order.
+    """
+    return np.argsort(chunk_order_keys(coords), kind='stable')
+
+
+# Writes whose distance to the focus falls in the same band of this many blocks
+# are sent chunk by chunk.
+PROXIMITY_BAND = 16
+
+
+def proximity_order(corners1, corners2, focus, band: int = PROXIMITY_BAND) -> np.ndarray:
+    """
+    Returns the permutation that sorts boxes, given as (N, 3) arrays of opposite corners,
+    nearest first: by the distance from focus to the nearest block of each box, in bands
+    of `band` blocks, and within a band chunk by chunk (see chunk_order).
+    """
+    corners1 = np.asarray(corners1, dtype=np.int64).reshape(-1, 3)
+    corners2 = np.asarray(corners2, dtype=np.int64).reshape(-1, 3)
+    lo, hi = np.minimum(corners1, corners2), np.maximum(corners1, corners2)
+    focus = np.asarray(focus, dtype=np.float64).reshape(1, 3)
+    offsets = np.clip(focus, lo, hi) - focus
+    bands = (np.sqrt((offsets * offsets).sum(axis=1)) // band).astype(np.int64)
+    # lexsort is stable and sorts by its last key first
+    return np.lexsort((chunk_order_keys(lo), bands))
+
+
+# --- Write buffering ---
+
+# A write buffer is flushed once it holds this many voxel writes.
+WRITE_BUFFER_MAX_VOXELS = 1 << 21
+
+# Bit layout of a packed coordinate key: x (26 bits) | y (12 bits) | z (26 bits).
+_PACK_XZ_BITS = 26
+_PACK_Y_BITS = 12
+
+
+def pack_coords(coords) -> np.ndarray:
+    """Packs (N, 3) block coordinates into uint64 keys, one per voxel."""
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+    x = (coords[:, 0] + (1 << (_PACK_XZ_BITS - 1))).astype(np.uint64)
+    y = (coords[:, 1] + (1 << (_PACK_Y_BITS - 1))).astype(np.uint64)
+    z = (coords[:, 2] + (1 << (_PACK_XZ_BITS - 1))).astype(np.uint64)
+    return (x << np.uint64(_PACK_XZ_BITS + _PACK_Y_BITS)) | (y << np.uint64(_PACK_XZ_BITS)) | z
+
+
+def unpack_coords(keys) -> np.ndarray:
+    """Inverse of pack_coords; returns an (N, 3) int64 array."""
+    keys = np.asarray(keys, dtype=np.uint64)
+    xz_mask = np.uint64((1 << _PACK_XZ_BITS) - 1)
+    y_mask = np.uint64((1 << _PACK_Y_BITS) - 1)
+    x = (keys >> np.uint64(_PACK_XZ_BITS + _PACK_Y_BITS)).astype(np.int64) - (1 << (_PACK_XZ_BITS - 1))
+    y = ((keys >> np.uint64(_PACK_XZ_BITS)) & y_mask).astype(np.int64) - (1 << (_PACK_Y_BITS - 1))
+    z = (keys & xz_mask).astype(np.int64) - (1 << (_PACK_XZ_BITS - 1))
+    return np.stack([x, y, z], axis=1)
+
+
+class WriteBuffer:
+    """
+    Collects the block writes of one program execution so that only the final material
+    of each voxel is sent: overlapping shapes, or a shell followed by a carve, cost one
+    write per voxel instead of one per call.
+    """
+
+    def __init__(self, max_voxels: int = WRITE_BUFFER_MAX_VOXELS, palette: Optional[MaterialPalette] = None):
+        self.max_voxels = max_voxels
+        self.palette = palette if palette is not None else MaterialPalette()
+        self._keys = []
+        self._materials = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def full(self) -> bool:
+        return self._size >= self.max_voxels
+
+    def add(self, coords, material: str):
+        """Buffers writes of material to the (N, 3) coords; later writes win over earlier ones."""
+        keys = pack_coords(coords)
+        if len(keys) == 0:
+            return
+        self._keys.append(keys)
+        self._materials.append(np.full(len(keys), self.palette.intern(material), dtype=np.uint16))
+        self._size += len(keys)
+
+    def drain(self):
+        """
+        Empties the buffer.
+
+        Returns:
+            A tuple (writes, groups): the number of writes received, and a list of
+            (material, (N, 3) coords) pairs holding the last material written to each voxel.
+        """
+        if not self._keys:
+            return 0, []
+        keys = np.concatenate(self._keys)
+        materials = np.concatenate(self._materials)
+        self._keys, self._materials, self._size = [], [], 0
+
+        # the first occurrence in the reversed arrays is the last write to each voxel
+        unique_keys, first_reversed = np.unique(keys[::-1], return_index=True)
+        final = materials[len(keys) - 1 - first_reversed]
+        groups = [(self.palette.name(material_id), unpack_coords(unique_keys[final == material_id]))
+                  for material_id in np.unique(final)]
+        return len(keys), groups
+
+
+# --- Placement backends ---
+
+# The vanilla /fill command refuses to change more than this many blocks at once.
+RCON_FILL_MAX_VOLUME = 32768
+
+# With the 'auto' backend, boxes at least this large are sent as /fill over RCON.
+RCON_MIN_BOX_VOLUME = 4096
+
+
+def split_box(box, max_volume: int) -> list:
+    """
+    Splits an (x1, y1, z1, x2, y2, z2) box into sub-boxes of at most max_volume voxels.
+    The box is cut into horizontal slabs first, then along X and Z if a single layer is too big.
+    """
+    x1, y1, z1, x2, y2, z2 = (int(v) for v in box[:6])
+    lo = (min(x1, x2), min(y1, y2), min(z1, z2))
+    hi = (max(x1, x2), max(y1, y2), max(z1, z2))
+    size = [h - l + 1 for l, h in zip(lo, hi)]
+
+    chunk = list(size)
+    for axis in (1, 0, 2):
+        volume = chunk[0] * chunk[1] * chunk[2]
+        if volume <= max_volume:
+            break
+        others = volume // chunk[axis]
+        chunk[axis] = max(1, max_volume // others)
+
+    sub_boxes = []
+    for sx in range(lo[0], hi[0] + 1, chunk[0]):
+        for sy in range(lo[1], hi[1] + 1, chunk[1]):
+            for sz in range(lo[2], hi[2] + 1, chunk[2]):
+                sub_boxes.append((sx, sy, sz,
+                                  min(sx + chunk[0] - 1, hi[0]),
+                                  min(sy + chunk[1] - 1, hi[1]),
+                                  min(sz + chunk[2] - 1, hi[2])))
+    return sub_boxes
+
+
+def bukkit_to_minecraft_id(material: str) -> str:
+    """Converts a Bukkit material name (e.g. 'OAK_PLANKS') to a namespaced ID ('minecraft:oak_planks')."""
+    return f"minecraft:{material.lower()}"
+
+
+class FruitJuiceBackend:
+    """
+    Places blocks through the FruitJuice plugin, with setBlock and setBlocks calls.
+    With a palette and a writer that accepts encoded lines (PipelinedConnection), the
+    material part of each line is taken from the palette instead of being encoded per call.
+    """
+    name = 'fruitjuice'
+
+    def __init__(self, pc, palette: Optional[MaterialPalette] = None):
+        self.pc = pc
+        self.palette = palette
+        self.encoded = palette is not None and hasattr(pc, 'set_blocks_encoded')
+
+    def set_block(self, x, y, z, material):
+        if self.encoded:
+            self.pc.set_block_encoded(x, y, z, self.palette.suffix(self.palette.intern(material)))
+        else:
+            self.pc.setBlock(x, y, z, material)
+        return 1
+
+    def set_boxes(self, boxes, material):
+        """Sends each (x1, y1, z1, x2, y2, z2) box as one message; returns the number of messages."""
+        if self.encoded:
+            suffix = self.palette.suffix(self.palette.intern(material))
+            for x1, y1, z1, x2, y2, z2 in boxes:
+                if (x1, y1, z1) == (x2, y2, z2):
+                    self.pc.set_block_encoded(x1, y1, z1, suffix)
+                else:
+                    self.pc.set_blocks_encoded(x1, y1, z1, x2, y2, z2, suffix)
+            return len(boxes)
+
+        for x1, y1, z1, x2, y2, z2 in boxes:
+            if (x1, y1, z1) == (x2, y2, z2):
+                self.pc.setBlock(x1, y1, z1, material)
+            else:
+                self.pc.setBlocks(x1, y1, z1, x2, y2, z2, material)
+        return len(boxes)
+
+
+class RconBackend:
+    """
+    Places blocks with the server-side /fill command over RCON. Boxes larger than the
+    /fill limit are split, and each batch of commands shares one RCON connection.
+    """
+    name = 'rcon'
+
+    def __init__(self, client, max_volume: int = RCON_FILL_MAX_VOLUME):
+        self.client = client
+        self.max_volume = max_volume
+
+    @property
+    def available(self) -> bool:
+        return bool(getattr(self.client, 'password', None))
+
+    def set_block(self, x, y, z, material):
+        return self.set_boxes([(x, y, z, x, y, z)], material)
+
+    def set_boxes(self, boxes, material):
+        """Sends the boxes as /fill commands; returns the number of commands."""
+        return self.place_boxes([tuple(box[:6]) + (material,) for box in boxes])
+
+    def place_boxes(self, boxes):
+        """
+        Sends (x1, y1, z1, x2, y2, z2, material) boxes as /fill commands, in order, so that
+        later boxes win where they overlap; returns the number of commands.
+        """
+        commands = [f"fill {sx1} {sy1} {sz1} {sx2} {sy2} {sz2} {bukkit_to_minecraft_id(box[6])}"
+                    for box in boxes
+                    for sx1, sy1, sz1, sx2, sy2, sz2 in split_box(box, self.max_volume)]
+        if not commands:
+            return 0
+        responses = self.client.run_many(commands) or []
+        for command, response in zip(commands, responses):
+            # a successful fill answers "Successfully filled N block(s)"
+            if response and 'filled' not in response.lower():
+                print(f"Warning: '{command}' failed: {response}")
+        return len(commands)
+
+    def clone(self, box, destination, masked: bool = False):
+        """
+        Copies an (x1, y1, z1, x2, y2, z2) box server-side with /clone, so that its lower corner
+        lands on destination. With masked, air in the source does not overwrite the destination.
+        Boxes larger than the /clone limit are split; returns the number of commands.
+        """
+        lo = [min(box[i], box[i + 3]) for i in range(3)]
+        mode = 'masked' if masked else 'replace'
+        commands = []
+        for sx1, sy1, sz1, sx2, sy2, sz2 in split_box(box, self.max_volume):
+            dx, dy, dz = (d + s - l for d, s, l in zip(destination, (sx1, sy1, sz1), lo))
+            commands.append(f"clone {sx1} {sy1} {sz1} {sx2} {sy2} {sz2} {dx} {dy} {dz} {mode} force")
+        responses = self.client.run_many(commands) or []
+        for command, response in zip(commands, responses):
+            # a successful clone answers "Successfully cloned N block(s)"
+            if response and 'cloned' not in response.lower():
+                print(f"Warning: '{command}' failed: {response}")
+        return len(commands)
+
+
+# --- Region transforms ---
+
+def transform_blocks(blocks: np.ndarray, rotation: int = 0, mirror: Optional[str] = None) -> np.ndarray:
+    """
+    Mirrors and then rotates a (dx, dy, dz) block array about the vertical axis.
+
+    Args:
+        rotation: Quarter turns clockwise, seen from above (+X towards +Z).
+        mirror: None, 'x' to reverse the X axis or 'z' to reverse the Z axis.
+
+    Returns:
+        A view of the transformed array; a rotation by an odd number of quarter turns
+        swaps the dx and dz sizes.
+    """
+    if mirror == 'x':
+        blocks = blocks[::-1, :, :]
+    elif mirror == 'z':
+        blocks = blocks[:, :, ::-1]
+    elif mirror is not None:
+        raise ValueError(f"Unknown mirror axis '{mirror}'. Use 'x' or 'z'.")
+    return np.rot90(blocks, k=int(rotation), axes=(0, 2))
+
+
+# --- Placement pacing ---
+
+# Default placement rate of MCActions, in blocks per second (one block every 10 ms).
+DEFAULT_PLACEMENT_RATE = 100.0
+
+# Writes are released in batches of one server tick's worth of blocks.
+PLACEMENT_TICK = 0.05
+
+# A box larger than the bucket is charged at most this many seconds of placement.
+PLACEMENT_MAX_DEBT = 1.0
+
+
+def parse_placement_rate(value) -> Optional[float]:
+    """
+    Converts a rate from the control panel or a keyword argument into blocks per second.
+    None, '', 'unlimited' and non-positive numbers mean no limit (None).
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('', 'unlimited', 'none', 'max'):
+            return None
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid placement rate '{value}'; placing blocks without a limit.")
+        return None
+    return rate if rate > 0 else None
+
+
+# --- Verification ---
+
+# Blocks found missing after placement are re-sent at most this many times.
+VERIFY_RETRIES = 2
+
+# A sampled verification reads at least this many blocks.
+VERIFY_MIN_SAMPLE = 1024
+
+
+def parse_verify(value) -> float:
+    """
+    Converts a verify option into the fraction of placed blocks to read back: 0 turns
+    verification off, 1 reads every block, and a fraction in between reads a random sample
+    first. None, '', 'off' and False mean 0; True, 'on' (a checked box) and 'full' mean 1.
+    """
+    if value is None or value is False:
+        return 0.0
+    if value is True:
+        return 1.0
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('', 'off', 'false', 'none', 'no'):
+            return 0.0
+        if value in ('on', 'true', 'full', 'yes'):
+            return 1.0
+    try:
+        return min(max(float(value), 0.0), 1.0)
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid verify option '{value}'; verifying every block.")
+        return 1.0
+
+
+class PlacementScheduler:
+    """
+    Paces block placement with a token bucket, in blocks per second.
+
+    The bucket holds at most one tick's worth of blocks, so writes go out in batches of
+    about blocks_per_second * PLACEMENT_TICK blocks, one batch per tick. A box costs its
+    volume; a box larger than the bucket is sent at once and the debt is paid off by the
+    following waits. The debt is capped at max_debt seconds of placement, so that one huge
+    box does not stall the writes after it for minutes.
+    """
+
+    def __init__(self, blocks_per_second: Optional[float] = DEFAULT_PLACEMENT_RATE,
+                 tick: float = PLACEMENT_TICK, before_wait=None, max_debt: float = PLACEMENT_MAX_DEBT):
+        """
+        Args:
+            blocks_per_second: The placement rate, or None for no limit.
+            tick: The batching interval in seconds.
+            before_wait: Called before each wait, e.g. to flush buffered writes so the
+                         batch shows up in the world during the pause.
+            max_debt: The longest wait (seconds, besides one tick) a single box can cause.
+        """
+        self.blocks_per_second = parse_placement_rate(blocks_per_second)
+        self.tick = tick
+        self.max_debt = max_debt
+        self.before_wait = before_wait
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.blocks_per_second is None
+
+    @property
+    def capacity(self) -> float:
+        if self.unlimited:
+            return float('inf')
+        return max(1.0, self.blocks_per_second * self.tick)
+
+    def throttle(self, blocks: int = 1):
+        """Accounts for `blocks` placed blocks, waiting first if the bucket is empty."""
+        if self.unlimited:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.blocks_per_second)
+        self._last = now
+        if self._tokens <= 0:
+            wait = -self._tokens / self.blocks_per_second + self.tick
+            if self.before_wait:
+                self.before_wait()
+            time.sleep(wait)
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.blocks_per_second)
+            self._last = now
+        self._tokens = max(self._tokens - blocks, -self.max_debt * self.blocks_per_second)
+
+
+# --- Progress telemetry ---
+
+# Progress updates are reported at most this often (seconds).
+PROGRESS_INTERVAL = 0.25
+
+
+class PlacementProgress:
+    """
+    Counts the blocks queued and placed by an MCActions instance, and reports throughput
+    and an ETA to a callback at most once every PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, on_update=None, interval: float = PROGRESS_INTERVAL, clock=time.monotonic):
+        """
+        Args:
+            on_update: Called with the snapshot() dict; it runs in the placing thread, so it
+                       should return quickly.
+            interval: The minimum time between two calls of on_update.
+            clock: Returns the current time in seconds.
+        """
+        self.on_update = on_update
+        self.interval = interval
+        self.clock = clock
+        self.planned = 0
+        self.placed = 0
+        self.backend = None
+        self._start = None
+        self._last_report = None
+
+    def add_planned(self, blocks: int):
+        if self._start is None:
+            self._start = self.clock()
+        self.planned += int(blocks)
+
+    def add_placed(self, blocks: int, backend: str):
+        self.placed += int(blocks)
+        self.backend = backend
+        self.report()
+
+    def snapshot(self) -> dict:
+        elapsed = self.clock() - self._start if self._start is not None else 0.0
+        rate = self.placed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.planned - self.placed)
+        return {
+            'placed': self.placed,
+            'remaining': remaining,
+            'blocks_per_second': round(rate, 1),
+            'eta': round(remaining / rate, 1) if rate > 0 else None,
+            'elapsed': round(elapsed, 1),
+            'backend': self.backend,
+        }
+
+    def report(self, force: bool = False):
+        """Calls on_update with a snapshot, unless one was sent less than `interval` seconds ago."""
+        if self.on_update is None:
+            return
+        now = self.clock()
+        if not force and self._last_report is not None and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        try:
+            self.on_update(self.snapshot())
+        except Exception as e:
+            print(f"Warning: Progress update failed: {e}")
@@ -0,0 +1,456 @@
+import gzip
+import itertools
+import struct
+import uuid
+
+from mcshell.constants import *
+from mcshell.mcplacement import UNKNOWN_MATERIAL, box_voxels, pack_coords
+
+# NBT tag types
+TAG_END, TAG_BYTE, TAG_SHORT, TAG_INT, TAG_LONG, TAG_FLOAT, TAG_DOUBLE = range(7)
+TAG_BYTE_ARRAY, TAG_STRING, TAG_LIST, TAG_COMPOUND, TAG_INT_ARRAY, TAG_LONG_ARRAY = range(7, 13)
+
+_SCALAR_FORMATS = {TAG_BYTE: '>b', TAG_SHORT: '>h', TAG_INT: '>i', TAG_LONG: '>q', TAG_FLOAT: '>f', TAG_DOUBLE: '>d'}
+_ARRAY_DTYPES = {TAG_BYTE_ARRAY: '>i1', TAG_INT_ARRAY: '>i4', TAG_LONG_ARRAY: '>i8'}
+
+# Materials that are not pasted when skip_air is set.
+AIR_MATERIALS = ('AIR', 'CAVE_AIR', 'VOID_AIR')
+
+# Data version written into exported files (Minecraft 1.21.4).
+SCHEMATIC_DATA_VERSION = 4189
+
+# The structure backend writes templates of at most this many blocks along each axis...
+STRUCTURE_TILE_SIZE = 48
+# ... under this namespace, i.e. into <world>/generated/<namespace>/structures.
+STRUCTURE_NAMESPACE = 'mcshell'
+
+
+# --- NBT ---
+
+class _NBTReader:
+    """Decodes NBT from a file object, e.g. a gzip stream, without loading it all first."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def _read(self, n: int) -> bytes:
+        data = self.f.read(n)
+        if len(data) != n:
+            raise ValueError("Unexpected end of NBT data")
+        return data
+
+    def _scalar(self, tag_type):
+        fmt = _SCALAR_FORMATS[tag_type]
+        return struct.unpack(fmt, self._read(struct.calcsize(fmt)))[0]
+
+    def _string(self) -> str:
+        length = struct.unpack('>H', self._read(2))[0]
+        return self._read(length).decode('utf-8')
+
+    def payload(self, tag_type):
+        if tag_type in _SCALAR_FORMATS:
+            return self._scalar(tag_type)
+        if tag_type == TAG_STRING:
+            return self._string()
+        if tag_type in _ARRAY_DTYPES:
+            length = self._scalar(TAG_INT)
+            dtype = np.dtype(_ARRAY_DTYPES[tag_type])
+            return np.frombuffer(self._read(length * dtype.itemsize), dtype=dtype)
+        if tag_type == TAG_LIST:
+            item_type = self._scalar(TAG_BYTE)
+            length = self._scalar(TAG_INT)
+            return [self.payload(item_type) for _ in range(length)]
+        if tag_type == TAG_COMPOUND:
+            compound = {}
+            while True:
+                item_type = self._scalar(TAG_BYTE)
+                if item_type == TAG_END:
+                    return compound
+                name = self._string()
+                compound[name] = self.payload(item_type)
+        raise ValueError(f"Unknown NBT tag type {tag_type}")
+
+    def root(self):
+        """Reads the root tag; returns (name, value)."""
+        tag_type = self._scalar(TAG_BYTE)
+        if tag_type != TAG_COMPOUND:
+            raise ValueError("NBT data does not start with a compound tag")
+        return self._string(), self.payload(tag_type)
+
+
+def read_nbt(path):
+    """
+    Reads a (usually gzip-compressed) NBT file.
+
+    Returns:
+        A tuple (name, value) of the root compound. Compounds are dicts, lists are lists and
+        byte/int/long arrays are big-endian NumPy arrays.
+    """
+    with open(path, 'rb') as raw:
+        gzipped = raw.read(2) == b'\x1f\x8b'
+    opener = gzip.open if gzipped else open
+    with opener(path, 'rb') as f:
+        return _NBTReader(f).root()
+
+
+class _NBTWriter:
+    """Encodes typed NBT values: each value is a (tag type, payload) pair."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def _string(self, value: str):
+        data = value.encode('utf-8')
+        self.f.write(struct.pack('>H', len(data)) + data)
+
+    def payload(self, tag_type, value):
+        if tag_type in _SCALAR_FORMATS:
+            self.f.write(struct.pack(_SCALAR_FORMATS[tag_type], value))
+        elif tag_type == TAG_STRING:
+            self._string(value)
+        elif tag_type in _ARRAY_DTYPES:
+            array = np.asarray(value).astype(_ARRAY_DTYPES[tag_type])
+            self.f.write(struct.pack('>i', len(array)) + array.tobytes())
+        elif tag_type == TAG_LIST:
+            item_type, items = value
+            self.f.write(struct.pack('>bi', item_type if len(items) else TAG_END, len(items)))
+            if isinstance(items, np.ndarray):
+                # a record array of payloads that are already encoded
+                self.f.write(items.tobytes())
+                return
+            for item in items:
+                self.payload(item_type, item)
+        elif tag_type == TAG_COMPOUND:
+            for name, (item_type, item) in value.items():
+                self.f.write(struct.pack('>b', item_type))
+                self._string(name)
+                self.payload(item_type, item)
+            self.f.write(struct.pack('>b', TAG_END))
+        else:
+            raise ValueError(f"Unknown NBT tag type {tag_type}")
+
+
+def write_nbt(path, name: str, compound: dict, compresslevel: int = 6):
+    """Writes a gzip-compressed NBT file whose root compound holds typed (tag type, value) items."""
+    with gzip.open(path, 'wb', compresslevel=compresslevel) as f:
+        writer = _NBTWriter(f)
+        f.write(struct.pack('>b', TAG_COMPOUND))
+        writer._string(name)
+        writer.payload(TAG_COMPOUND, compound)
+
+
+# --- structure files ---
+
+# One entry of a structure file's 'blocks' list: {pos: [x, y, z], state: palette index}.
+# Every entry has the same size, so a whole list is encoded at once as a record array.
+_STRUCTURE_BLOCK = np.dtype([
+    ('pos_type', '>i1'), ('pos_name_length', '>u2'), ('pos_name', 'S3'),
+    ('pos_item_type', '>i1'), ('pos_length', '>i4'), ('pos', '>i4', (3,)),
+    ('state_type', '>i1'), ('state_name_length', '>u2'), ('state_name', 'S5'), ('state', '>i4'),
+    ('end', '>i1'),
+])
+
+
+def encode_structure_blocks(positions, states) -> np.ndarray:
+    """Encodes (N, 3) positions and (N,) palette indices as the NBT payloads of a 'blocks' list."""
+    positions = np.asarray(positions).reshape(-1, 3)
+    records = np.zeros(len(positions), dtype=_STRUCTURE_BLOCK)
+    records['pos_type'], records['pos_name_length'], records['pos_name'] = TAG_LIST, 3, b'pos'
+    records['pos_item_type'], records['pos_length'], records['pos'] = TAG_INT, 3, positions
+    records['state_type'], records['state_name_length'], records['state_name'] = TAG_INT, 5, b'state'
+    records['state'] = states
+    records['end'] = TAG_END
+    return records
+
+
+def write_structure(path, positions, states, block_states: list, size=None,
+                    data_version: int = SCHEMATIC_DATA_VERSION, compresslevel: int = 6):
+    """
+    Writes a structure file (.nbt) that sets the blocks at (N, 3) non-negative positions to
+    block_states[states]; every other position of the structure is left untouched when
+    it is placed. size defaults to the extent of the positions.
+    """
+    positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3)
+    if size is None:
+        size = positions.max(axis=0) + 1 if len(positions) else (0, 0, 0)
+    write_nbt(path, '', {
+        'DataVersion': (TAG_INT, int(data_version)),
+        'size': (TAG_LIST, (TAG_INT, [int(v) for v in size])),
+        'palette': (TAG_LIST, (TAG_COMPOUND, [{'Name': (TAG_STRING, s)} for s in block_states])),
+        'blocks': (TAG_LIST, (TAG_COMPOUND, encode_structure_blocks(positions, states))),
+        'entities': (TAG_LIST, (TAG_COMPOUND, [])),
+    }, compresslevel=compresslevel)
+    return path
+
+
+# --- block names ---
+
+def block_state_to_material(state: str) -> str:
+    """
+    Converts a namespaced block state ('minecraft:oak_stairs[facing=east]') to a Bukkit
+    material name ('OAK_STAIRS'). Block state properties are dropped, since blocks are
+    placed by material.
+    """
+    name = state.split('[', 1)[0]
+    return name.split(':', 1)[-1].upper()
+
+
+def material_to_block_state(material: Optional[str]) -> str:
+    if material is None:
+        return 'minecraft:air'
+    return f"minecraft:{material.lower()}"
+
+
+# --- varints (Sponge BlockData) ---
+
+def decode_varints(data: np.ndarray, count: int) -> np.ndarray:
+    data = np.asarray(data).astype(np.uint8)
+    if len(data) == count and not (data & 0x80).any():
+        # every palette index fits in one byte
+        return data.astype(np.int64)
+    values = np.empty(count, dtype=np.int64)
+    i = 0
+    for n in range(count):
+        value, shift = 0, 0
+        while True:
+            byte = int(data[i])
+            i += 1
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        values[n] = value
+    return values
+
+
+def encode_varints(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0 or values.max() < 0x80:
+        return values.astype(np.uint8)
+    out = bytearray()
+    for value in values.tolist():
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return np.frombuffer(bytes(out), dtype=np.uint8)
+
+
+# --- schematics ---
+
+def _intern(palette: list, index: dict, material: str) -> int:
+    material_id = index.get(material)
+    if material_id is None:
+        material_id = index[material] = len(palette)
+        palette.append(material)
+    return material_id
+
+
+def _load_sponge(root: dict):
+    schematic = root.get('Schematic', root)  # version 3 nests everything in 'Schematic'
+    width, height, length = (int(schematic[k]) & 0xFFFF for k in ('Width', 'Height', 'Length'))
+    container = schematic.get('Blocks', schematic)
+    state_palette = container['Palette']
+    data = container.get('Data', container.get('BlockData'))
+
+    palette, index = [], {}
+    remap = np.zeros(max(state_palette.values()) + 1, dtype=np.uint16)
+    for state, state_id in state_palette.items():
+        remap[state_id] = _intern(palette, index, block_state_to_material(state))
+
+    # blocks are stored with x varying fastest, then z, then y
+    values = decode_varints(data, width * height * length)
+    blocks = remap[values].reshape(height, length, width).transpose(2, 0, 1)
+    return np.ascontiguousarray(blocks), palette
+
+
+def _load_structure(root: dict):
+    size = [int(v) for v in root['size']]
+    state_palette = root['palette'] if 'palette' in root else root['palettes'][0]
+
+    palette, index = [], {}
+    remap = np.array([_intern(palette, index, block_state_to_material(state['Name']))
+                      for state in state_palette], dtype=np.uint16)
+    # positions missing from a structure are left untouched when it is placed
+    blocks = np.full(size, UNKNOWN_MATERIAL, dtype=np.uint16)
+    if root['blocks']:
+        positions = np.array([block['pos'] for block in root['blocks']], dtype=np.int64)
+        states = np.array([block['state'] for block in root['blocks']], dtype=np.int64)
+        blocks[positions[:, 0], positions[:, 1], positions[:, 2]] = remap[states]
+    return blocks, palette
+
+
+def load_schematic(path):
+    """
+    Loads a Sponge schematic (.schem, versions 2 and 3) or a structure file (.nbt).
+
+    Returns:
+        A tuple (blocks, palette): a (dx, dy, dz) uint16 array and the list of Bukkit material
+        names it indexes. Positions a structure file leaves untouched hold UNKNOWN_MATERIAL.
+    """
+    _, root = read_nbt(path)
+    if 'Schematic' in root or 'Palette' in root:
+        return _load_sponge(root)
+    if 'blocks' in root and 'size' in root:
+        return _load_structure(root)
+    raise ValueError(f"{path} is neither a Sponge schematic nor a structure file")
+
+
+def save_schematic(path, blocks: np.ndarray, palette: list):
+    """
+    Saves a (dx, dy, dz) array of palette ids as a Sponge v2 schematic (.schem) or, for
+    an .nbt path, as a structure file. UNKNOWN_MATERIAL is saved as air (.schem) or left
+    out (.nbt).
+    """
+    path = pathlib.Path(path)
+    blocks = np.asarray(blocks, dtype=np.uint16)
+    dx, dy, dz = blocks.shape
+    used = [int(v) for v in np.unique(blocks)]
+    states = [material_to_block_state(None if v == UNKNOWN_MATERIAL else palette[v]) for v in used]
+
+    if path.suffix == '.nbt':
+        remap = np.zeros(max(used) + 1, dtype=np.int64)
+        remap[used] = np.arange(len(used))
+        positions = np.argwhere(blocks != UNKNOWN_MATERIAL)
+        return write_structure(path, positions, remap[blocks[tuple(positions.T)]], states, size=(dx, dy, dz))
+
+    # Sponge: merge ids that map to the same state (e.g. UNKNOWN_MATERIAL and AIR)
+    state_ids, remap = {}, np.zeros(max(used) + 1, dtype=np.int64)
+    for v, state in zip(used, states):
+        remap[v] = state_ids.setdefault(state, len(state_ids))
+    data = encode_varints(remap[blocks.transpose(1, 2, 0).reshape(-1)])
+    write_nbt(path, 'Schematic', {
+        'Version': (TAG_INT, 2),
+        'DataVersion': (TAG_INT, SCHEMATIC_DATA_VERSION),
+        'Width': (TAG_SHORT, np.int16(np.uint16(dx))),
+        'Height': (TAG_SHORT, np.int16(np.uint16(dy))),
+        'Length': (TAG_SHORT, np.int16(np.uint16(dz))),
+        'PaletteMax': (TAG_INT, len(state_ids)),
+        'Palette': (TAG_COMPOUND, {state: (TAG_INT, i) for state, i in state_ids.items()}),
+        'BlockData': (TAG_BYTE_ARRAY, data.astype(np.int8)),
+    })
+    return path
+
+
+# --- structure template placement ---
+
+class StructureTemplateBackend:
+    """
+    Places blocks by having the server load them as structure templates. The voxels are
+    cut into STRUCTURE_TILE_SIZE tiles, each tile is written as a structure file into the
+    world's generated/<namespace>/structures directory, and placed with one
+    /place template command over RCON. Positions a tile does not list keep their block.
+
+    Boxes are clipped to the tiles they touch and expanded one tile at a time, so a large
+    placement never holds more than a tile's worth of voxels in memory.
+
+    The server caches a template by name the first time it is placed and keeps it until
+    it stops; placing the same name again would use the cached copy, not the new file. So
+    every tile gets a fresh name, and each placed tile stays in the server's memory (about
+    the size of its block list) until the server restarts. The files themselves are
+    deleted once placed. This backend suits bulk builds, not many small placements.
+    """
+    name = 'structure'
+
+    def __init__(self, client, world_path, namespace: str = STRUCTURE_NAMESPACE,
+                 tile_size: int = STRUCTURE_TILE_SIZE, data_version: int = SCHEMATIC_DATA_VERSION):
+        self.client = client
+        self.world_path = pathlib.Path(world_path) if world_path else None
+        self.namespace = namespace
+        self.tile_size = int(tile_size)
+        self.data_version = data_version
+
+    @property
+    def structures_path(self) -> Optional[pathlib.Path]:
+        if self.world_path is None:
+            return None
+        return self.world_path / 'generated' / self.namespace / 'structures'
+
+    @property
+    def available(self) -> bool:
+        return (bool(getattr(self.client, 'password', None))
+                and self.world_path is not None and self.world_path.is_dir())
+
+    def set_block(self, x, y, z, material):
+        return self.set_boxes([(x, y, z, x, y, z)], material)
+
+    def set_boxes(self, boxes, material):
+        return self.place_boxes([tuple(box[:6]) + (material,) for box in boxes])
+
+    def place_boxes(self, boxes):
+        """Places (x1, y1, z1, x2, y2, z2, material) boxes; later boxes win where they overlap."""
+        if not boxes:
+            return 0
+        material_ids = {}
+        box_ids = np.array([material_ids.setdefault(box[6], len(material_ids)) for box in boxes], dtype=np.int64)
+        corners = np.array([box[:6] for box in boxes], dtype=np.int64).reshape(-1, 6)
+        lo, hi = np.minimum(corners[:, :3], corners[:, 3:]), np.maximum(corners[:, :3], corners[:, 3:])
+
+        # the boxes touching each tile, in call order
+        tile_boxes = {}
+        for i, (first, last) in enumerate(zip((lo // self.tile_size).tolist(), (hi // self.tile_size).tolist())):
+            for tile in itertools.product(*(range(a, b + 1) for a, b in zip(first, last))):
+                tile_boxes.setdefault(tile, []).append(i)
+
+        def tiles():
+            for tile in sorted(tile_boxes):
+                indices = tile_boxes[tile]
+                tile_lo = np.array(tile, dtype=np.int64) * self.tile_size
+                clipped = np.hstack([np.maximum(lo[indices], tile_lo),
+                                     np.minimum(hi[indices], tile_lo + self.tile_size - 1)])
+                volumes = (clipped[:, 3:] - clipped[:, :3] + 1).prod(axis=1)
+                yield box_voxels(clipped), np.repeat(box_ids[indices], volumes)
+
+        return self._place_tiles(tiles(), list(material_ids))
+
+    def place_voxels(self, coords, material_ids, materials: list) -> int:
+        """
+        Places the (N, 3) coords, each set to materials[material_ids]; the last write to a
+        coordinate wins. Returns the number of /place template commands sent.
+        """
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        material_ids = np.asarray(material_ids, dtype=np.int64)
+        if len(coords) == 0:
+            return 0
+        tiles = coords // self.tile_size
+        # lexsort is stable, so writes to a coordinate stay in order
+        order = np.lexsort((tiles[:, 2], tiles[:, 1], tiles[:, 0]))
+        coords, material_ids, tiles = coords[order], material_ids[order], tiles[order]
+        starts = np.flatnonzero(np.r_[True, (tiles[1:] != tiles[:-1]).any(axis=1)])
+        return self._place_tiles(((coords[start:stop], material_ids[start:stop])
+                                  for start, stop in zip(starts, np.r_[starts[1:], len(coords)])), materials)
+
+    def _place_tiles(self, tiles, materials: list) -> int:
+        """
+        Writes each (coords, material_ids) tile of an iterable as a structure file, then
+        places them all with /place template. Returns the number of commands sent.
+        """
+        block_states = [material_to_block_state(m) for m in materials]
+        directory = self.structures_path
+        directory.mkdir(parents=True, exist_ok=True)
+        prefix = uuid.uuid4().hex[:12]
+        paths, commands = [], []
+        try:
+            for i, (coords, material_ids) in enumerate(tiles):
+                # keep the last write to each coordinate
+                _, last = np.unique(pack_coords(coords)[::-1], return_index=True)
+                keep = len(coords) - 1 - last
+                coords, material_ids = coords[keep], material_ids[keep]
+                lo = coords.min(axis=0)
+                used, states = np.unique(material_ids, return_inverse=True)
+                name = f"{prefix}_{i}"
+                paths.append(write_structure(directory / f"{name}.nbt", coords - lo, states,
+                                             [block_states[u] for u in used], data_version=self.data_version,
+                                             compresslevel=1))  # read once by the server, then deleted
+                commands.append(f"place template {self.namespace}:{name} {lo[0]} {lo[1]} {lo[2]}")
+
+            responses = self.client.run_many(commands) or []
+            for command, response in zip(commands, responses):
+                # a successful placement answers 'Loaded structure "..." at x, y, z'
+                if response and 'loaded structure' not in response.lower():
+                    print(f"Warning: '{command}' failed: {response}")
+        finally:
+            # the server has its own copy of every loaded template
+            for path in paths:
+                path.unlink(missing_ok=True)
+        return len(commands)
@@ -9,6 +9,9 @@ from flask_socketio import SocketIO
 
 
 from mcshell.mcactions import MCActions
+from mcshell.mcundo import undo_journal_path, is_valid_execution_id
+from mcshell.mcworld import InMemoryWorld
+from mcshell.mcpipeline import PLACEMENT_CONNECTIONS
 from mcshell.mcplayer import MCPlayer
 from mcshell.constants import *
 from mcshell.mcrepo import JsonFileRepository
@@ -50,9 +53,19 @@ socketio = SocketIO(
 # Value: {'thread': ThreadObject, 'cancel_event': EventObject}
 RUNNING_POWERS = {}
 
+# Placement progress of each running power, keyed by execution_id
+POWER_PROGRESS = {}
+
+# Fields of an execute_power request that are passed to MCActions instead of the power
+PLACEMENT_OPTIONS = ('blocks_per_second', 'backend', 'connections', 'placement_order', 'verify', 'dry_run',
+                     'buffered')
+
 # --- Server Control ---
-def start_app_server(server_data,mc_name,ipy_shell):
-    """Starts the main Flask-SocketIO application server in a separate thread."""
+def start_app_server(server_data,mc_name,ipy_shell,world_path=None):
+    """
+    Starts the main Flask-SocketIO application server in a separate thread.
+    world_path is the data directory of the world of a locally managed Paper server, if any.
+    """
     # Attach the server_data dict to the Flask app's config object.
     # This makes the data available anywhere we have access to the app context.
     # --- Inject the AUTHORITATIVE data into the Flask app config ---
@@ -60,6 +73,7 @@ def start_app_server(server_data,mc_name,ipy_shell):
     app.config['MCSHELL_SERVER_DATA'] = server_data
     app.config['MINECRAFT_PLAYER_NAME'] = mc_name
     app.config['IPYTHON_SHELL'] = ipy_shell
+    app.config['MC_WORLD_DATA_PATH'] = world_path
 
     # --- Instantiate the chosen repository ---
     # You can later make this configurable (e.g., via an environment variable)
@@ -159,9 +173,12 @@ def get_code_with_dependencies(power_repo, power_id_or_name, processed_names=Non
 
     return all_method_definitions
 
-def execute_power_in_thread(power_id,execution_id, python_code, player_name, server_data, runtime_params, cancel_event):
+def execute_power_in_thread(power_id,execution_id, python_code, player_name, server_data, runtime_params, cancel_event,
+                            placement_options=None):
     """
     This is the new, shared worker function. It runs in a background thread.
+    placement_options are keyword arguments for MCActions (e.g. blocks_per_second); with
+    dry_run set, the power builds in an InMemoryWorld instead of the server.
     """
     print(f"THREAD {execution_id}: Started for player '{player_name}' with params: {runtime_params}")
     # --- Send the initial 'running' status with ALL required fields ---
@@ -172,11 +189,26 @@ def execute_power_in_thread(power_id,execution_id, python_code, player_name, ser
         'message': ''
     })
 
+    action_implementer = None
     try:
         # We need the app context for config
         with app.app_context():
             mc_player = MCPlayer(player_name, **server_data,cancel_event=cancel_event)
-            action_implementer = MCActions(mc_player)
+            def emit_progress(snapshot):
+                socketio.emit('power_progress', {'id': power_id, 'execution_id': execution_id, **snapshot})
+
+            # placement runs on a worker, so the program can compute its next shape meanwhile
+            # (with the buffered option, overlapping writes are merged and sent at the end instead)
+            placement_options = dict(placement_options or {})
+            # the player watches the build, so the part nearest them goes first
+            placement_options.setdefault('placement_order', 'proximity')
+            placement_options.setdefault('connections', PLACEMENT_CONNECTIONS)
+            world = InMemoryWorld() if placement_options.pop('dry_run', None) else None
+            action_implementer = MCActions(mc_player, execution_id=None if world else execution_id,
+                                           progress_callback=emit_progress, asynchronous=True,
+                                           world=world, world_path=app.config.get('MC_WORLD_DATA_PATH'),
+                                           **placement_options)
+            POWER_PROGRESS[execution_id] = action_implementer.progress
 
             execution_scope = {
                 # 'np': np, 'math': math, 'Vec3': Vec3, 'Matrix3': Matrix3
@@ -195,6 +227,8 @@ def execute_power_in_thread(power_id,execution_id, python_code, player_name, ser
             except PowerCancelledException:
                 #we raise an exception only when polling for a sword strike
                 pass
+            # make sure every pipelined write has reached the server before reporting
+            action_implementer.close()
             if cancel_event.is_set():
                 print(f"Thread {execution_id}: Execution was cancelled.")
                 # --- Send the 'cancelled' status with ALL required fields ---
@@ -207,12 +241,15 @@ def execute_power_in_thread(power_id,execution_id, python_code, player_name, ser
                 return
 
         print(f"Thread {execution_id}: Execution completed successfully.")
+        message = world.report() if world else 'Completed successfully.'
+        if action_implementer.verification:
+            message += ' ' + action_implementer.verification['summary']
         # --- Send the 'finished' status with ALL required fields ---
         socketio.emit('power_status', {
             'id': power_id,
             'execution_id': execution_id,
             'status': 'finished',
-            'message': 'Completed successfully.'
+            'message': message
         })
     except Exception as e:
         # Report any errors that occur during execution
@@ -226,9 +263,17 @@ def execute_power_in_thread(power_id,execution_id, python_code, player_name, ser
             'message': str(e)
         })
     finally:
-        # Clean up the power from our tracking dictionary
-        if execution_id in RUNNING_POWERS:
-            del RUNNING_POWERS[execution_id]
+        try:
+            # after an error the writes so far are still applied and journaled; this does
+            # nothing if the power already closed above
+            if action_implementer:
+                action_implementer.close()
+        except Exception as e:
+            print(f"Thread {execution_id}: Error while closing: {e}")
+        finally:
+            # Clean up the power from our tracking dictionary, whatever close() did
+            RUNNING_POWERS.pop(execution_id, None)
+            POWER_PROGRESS.pop(execution_id, None)
 
 # --- Endpoints ---
 @app.route('/api/execute_power', methods=['POST'])
@@ -237,6 +282,8 @@ def execute_power():
     data = request.get_json() if request.is_json else request.form
     power_id = data.get('power_id')
     runtime_params = {k: v for k, v in data.items() if k != 'power_id'}
+    # settings of the control panel that configure placement rather than the power itself
+    placement_options = {k: runtime_params.pop(k) for k in PLACEMENT_OPTIONS if k in runtime_params}
 
     player_name = current_app.config.get('MINECRAFT_PLAYER_NAME')
     server_data = current_app.config.get('MCSHELL_SERVER_DATA')
@@ -286,7 +333,8 @@ class BlocklyProgramRunner:
     cancel_event = Event()
 
     thread = Thread(target=execute_power_in_thread, args=(
-        power_id, execution_id, python_code, player_name, server_data, runtime_params, cancel_event
+        power_id, execution_id, python_code, player_name, server_data, runtime_params, cancel_event,
+        placement_options
     ))
     thread.daemon = True
     thread.start()
@@ -326,6 +374,40 @@ def cancel_power():
     if not power_id:
         return jsonify({"error": "Invalid or unknown execution_id"}), 404
 
+def undo_power_in_thread(execution_id, player_name, server_data):
+    """Restores the blocks changed by an execution from its undo journal. Runs in a background thread."""
+    action_implementer = None
+    try:
+        with app.app_context():
+            mc_player = MCPlayer(player_name, **server_data)
+            action_implementer = MCActions(mc_player, blocks_per_second=None)
+            action_implementer.undo(execution_id)
+    except Exception as e:
+        print(f"Undo of {execution_id} failed: {e}")
+    finally:
+        if action_implementer:
+            action_implementer.close()
+
+@app.route('/api/undo_power', methods=['POST'])
+def undo_power():
+    """Restores the blocks changed by a finished power execution."""
+    data = request.get_json() if request.is_json else request.form.to_dict()
+    execution_id = data.get('execution_id')
+
+    if not is_valid_execution_id(execution_id):
+        return jsonify({"error": "Invalid execution_id"}), 400
+    if not undo_journal_path(execution_id).exists():
+        return jsonify({"error": "No undo journal for this execution_id"}), 404
+    if execution_id in RUNNING_POWERS:
+        return jsonify({"error": "The power is still running"}), 409
+
+    player_name = current_app.config.get('MINECRAFT_PLAYER_NAME')
+    server_data = current_app.config.get('MCSHELL_SERVER_DATA')
+    thread = Thread(target=undo_power_in_thread, args=(execution_id, player_name, server_data))
+    thread.daemon = True
+    thread.start()
+    return jsonify({"status": "undo_started", "execution_id": execution_id})
+
 @app.route('/api/block_materials')
 def get_block_materials():
     """
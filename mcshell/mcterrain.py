@@ -0,0 +1,139 @@
+import numpy as np
+
+# Default layers of a terrain column, from the surface down. A depth of None
+# means the layer fills the rest of the column.
+DEFAULT_TERRAIN_LAYERS = (('GRASS_BLOCK', 1), ('DIRT', 3), ('STONE', None))
+
+
+def _fade(t):
+    """Perlin's quintic smoothstep, 6t^5 - 15t^4 + 10t^3."""
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def gradient_noise_2d(x: np.ndarray, z: np.ndarray, seed=None) -> np.ndarray:
+    """
+    Evaluates 2D gradient (Perlin) noise at every point of broadcastable x and z arrays.
+
+    Args:
+        x, z: Sample coordinates, in lattice units.
+        seed: Seed (int or np.random.SeedSequence) for the permutation and gradient tables.
+
+    Returns:
+        An array of noise values, roughly in [-1, 1].
+    """
+    rng = np.random.default_rng(seed)
+    perm = rng.permutation(256)
+    perm = np.concatenate([perm, perm])
+    angles = rng.uniform(0.0, 2.0 * np.pi, 256)
+    grad_x, grad_z = np.cos(angles), np.sin(angles)
+
+    x, z = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(z, dtype=np.float64))
+    x0, z0 = np.floor(x), np.floor(z)
+    xf, zf = x - x0, z - z0
+    xi, zi = x0.astype(np.int64) & 255, z0.astype(np.int64) & 255
+
+    def _corner(ix, iz, dx, dz):
+        h = perm[perm[ix] + iz]
+        return grad_x[h] * dx + grad_z[h] * dz
+
+    n00 = _corner(xi, zi, xf, zf)
+    n10 = _corner(xi + 1, zi, xf - 1, zf)
+    n01 = _corner(xi, zi + 1, xf, zf - 1)
+    n11 = _corner(xi + 1, zi + 1, xf - 1, zf - 1)
+
+    u, v = _fade(xf), _fade(zf)
+    nx0 = n00 + u * (n10 - n00)
+    nx1 = n01 + u * (n11 - n01)
+    # Unit gradients in 2D bound the noise by sqrt(2)/2; rescale to about [-1, 1].
+    return (nx0 + v * (nx1 - nx0)) * np.sqrt(2.0)
+
+
+def fractal_noise_2d(x1: int, z1: int, x2: int, z2: int, scale: float = 32.0, octaves: int = 4,
+                     persistence: float = 0.5, lacunarity: float = 2.0, seed=None) -> np.ndarray:
+    """
+    Sums several octaves of gradient noise over the integer XZ rectangle [x1, x2] x [z1, z2].
+
+    Args:
+        scale: The size in blocks of the largest features.
+        octaves: The number of noise layers to add.
+        persistence: The amplitude ratio between successive octaves.
+        lacunarity: The frequency ratio between successive octaves.
+        seed: Seed for reproducible results; each octave gets an independent child seed.
+
+    Returns:
+        A (dx, dz) float array with values roughly in [-1, 1].
+    """
+    xs = np.arange(min(x1, x2), max(x1, x2) + 1, dtype=np.float64)[:, None]
+    zs = np.arange(min(z1, z2), max(z1, z2) + 1, dtype=np.float64)[None, :]
+
+    octave_seeds = np.random.SeedSequence(seed).spawn(max(1, int(octaves)))
+    total = np.zeros((xs.shape[0], zs.shape[1]))
+    amplitude, frequency, norm = 1.0, 1.0 / max(float(scale), 1e-9), 0.0
+    for octave_seed in octave_seeds:
+        total += amplitude * gradient_noise_2d(xs * frequency, zs * frequency, seed=octave_seed)
+        norm += amplitude
+        amplitude *= persistence
+        frequency *= lacunarity
+    return total / norm
+
+
+def generate_terrain_heights(x1: int, z1: int, x2: int, z2: int, amplitude: float = 16.0,
+                             scale: float = 32.0, octaves: int = 4, seed=None) -> np.ndarray:
+    """
+    Generates a heightmap over an XZ rectangle.
+
+    Returns:
+        A (dx, dz) int32 array of column heights in [1, amplitude + 1].
+    """
+    noise = fractal_noise_2d(x1, z1, x2, z2, scale=scale, octaves=octaves, seed=seed)
+    heights = np.rint((np.clip(noise, -1.0, 1.0) + 1.0) / 2.0 * float(amplitude)).astype(np.int32)
+    return heights + 1
+
+
+def generate_terrain_layers(heights: np.ndarray, layers=DEFAULT_TERRAIN_LAYERS):
+    """
+    Splits every terrain column into its material layers.
+
+    Args:
+        heights: A (dx, dz) array of column heights, measured from the base of the terrain.
+        layers: (material, depth) pairs from the surface down; a depth of None fills the rest.
+
+    Returns:
+        A tuple (bottoms, tops, materials) where bottoms and tops are (L, dx, dz) int32 arrays
+        of the inclusive layer extents relative to the base (empty layers have top < bottom),
+        and materials is the list of the L layer materials.
+    """
+    heights = np.asarray(heights, dtype=np.int32)
+    bottoms, tops = [], []
+    top = heights - 1
+    for material, depth in layers:
+        if depth is None:
+            bottom = np.zeros_like(heights)
+        else:
+            bottom = np.maximum(top - int(depth) + 1, 0)
+        bottoms.append(bottom)
+        tops.append(top.copy())
+        top = bottom - 1
+    return np.stack(bottoms), np.stack(tops), [material for material, _ in layers]
+
+
+def generate_terrain_columns(x1: int, y: int, z1: int, heights: np.ndarray, layers=DEFAULT_TERRAIN_LAYERS):
+    """
+    Converts a heightmap into vertical runs of blocks for bulk placement.
+
+    Args:
+        x1, y, z1: The world position of the heightmap's [0, 0] column base.
+        heights: A (dx, dz) array of column heights.
+        layers: (material, depth) pairs from the surface down.
+
+    Returns:
+        A list of (x, y1, z, x, y2, z, material) tuples, one per non-empty layer of every column.
+    """
+    bottoms, tops, materials = generate_terrain_layers(heights, layers)
+    runs = []
+    for bottom, top, material in zip(bottoms, tops, materials):
+        ix, iz = np.nonzero(top >= bottom)
+        xs, zs = (ix + x1).tolist(), (iz + z1).tolist()
+        y1s, y2s = (bottom[ix, iz] + y).tolist(), (top[ix, iz] + y).tolist()
+        runs.extend((x, y1, z, x, y2, z, material) for x, y1, z, y2 in zip(xs, y1s, zs, y2s))
+    return runs
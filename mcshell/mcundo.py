@@ -0,0 +1,171 @@
+import io
+import zlib
+
+from mcshell.constants import *
+from mcshell.mcplacement import MaterialPalette, UNKNOWN_MATERIAL, pack_coords
+
+try:
+    import zstandard
+except ImportError:  # zstandard only makes journals smaller; zlib is always available.
+    zstandard = None
+
+# File header: a magic string and one byte naming the compression codec.
+_JOURNAL_MAGIC = b"MCUNDO1"
+_CODEC_ZLIB = b"z"
+_CODEC_ZSTD = b"s"
+
+
+def _compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return _CODEC_ZSTD + zstandard.ZstdCompressor(level=10).compress(data)
+    return _CODEC_ZLIB + zlib.compress(data, 6)
+
+
+def _decompress(data: bytes) -> bytes:
+    codec, payload = data[:1], data[1:]
+    if codec == _CODEC_ZSTD:
+        if zstandard is None:
+            raise ImportError("This undo journal is zstd-compressed. Install it with: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == _CODEC_ZLIB:
+        return zlib.decompress(payload)
+    raise ValueError(f"Unknown undo journal codec {codec!r}")
+
+
+# Execution ids are uuid4 strings, or debug_<hex> for debug runs of the shell.
+_EXECUTION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def is_valid_execution_id(execution_id) -> bool:
+    """Whether execution_id can name an undo journal; ids that could be paths are refused."""
+    return isinstance(execution_id, str) and _EXECUTION_ID_PATTERN.fullmatch(execution_id) is not None
+
+
+# Recorded keys are merged into one sorted array once there are this many runs of them...
+_JOURNAL_MAX_RUNS = 8
+# ... or once they reach this fraction of the merged keys.
+_JOURNAL_MERGE_FRACTION = 0.25
+
+
+def _sorted_contains(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Which of keys are in the sorted array sorted_keys, as a boolean mask."""
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[positions] == keys
+
+
+def undo_journal_path(execution_id: str, directory=None) -> pathlib.Path:
+    """
+    Raises:
+        ValueError: If execution_id is not a valid execution id.
+    """
+    if not is_valid_execution_id(execution_id):
+        raise ValueError(f"Invalid execution ID: {execution_id!r}")
+    return pathlib.Path(directory or MC_UNDO_DIR).joinpath(f"{execution_id}.undo")
+
+
+class UndoJournal:
+    """
+    Records the block that was at each coordinate before a power first wrote to it.
+
+    Entries are kept as int32 (N, 3) coordinate arrays and uint16 ids of a MaterialPalette
+    (usually the one shared with MCActions); only the first write to a coordinate is kept,
+    since that is the state an undo must restore. The journaled coordinates are tracked as
+    sorted packed keys (see pack_coords): one merged array, plus the runs recorded since.
+    """
+
+    def __init__(self, execution_id: str, directory=None, palette: Optional[MaterialPalette] = None):
+        self.execution_id = execution_id
+        self.path = undo_journal_path(execution_id, directory)
+        self.palette = palette if palette is not None else MaterialPalette()
+        self._coords = []
+        self._indices = []
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._runs = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, xyz):
+        return bool(self._journaled(pack_coords([xyz]))[0])
+
+    def _journaled(self, keys) -> np.ndarray:
+        """Which of the packed keys are already in the journal, as a boolean mask."""
+        mask = _sorted_contains(self._keys, keys)
+        for run in self._runs:
+            mask |= _sorted_contains(run, keys)
+        return mask
+
+    def _add_keys(self, keys):
+        """Adds sorted, new packed keys, merging the runs now and then to keep lookups fast."""
+        self._runs.append(keys)
+        if len(self._runs) > _JOURNAL_MAX_RUNS:
+            self._runs = [np.sort(np.concatenate(self._runs))]
+        if sum(len(run) for run in self._runs) >= _JOURNAL_MERGE_FRACTION * len(self._keys):
+            self._keys = np.sort(np.concatenate([self._keys] + self._runs))
+            self._runs = []
+
+    def record(self, coords, material_ids):
+        """
+        Records the previous materials (palette ids) of the (N, 3) coords. Coordinates that
+        are already in the journal, and entries with UNKNOWN_MATERIAL, are ignored.
+        """
+        coords = np.asarray(coords, dtype=np.int32).reshape(-1, 3)
+        material_ids = np.asarray(material_ids, dtype=np.uint16)
+        known = np.flatnonzero(material_ids != UNKNOWN_MATERIAL)
+        # the first entry of each coordinate in this call, then only the new ones
+        keys, first = np.unique(pack_coords(coords[known]), return_index=True)
+        new = ~self._journaled(keys)
+        if not new.any():
+            return
+        keep = known[np.sort(first[new])]
+        self._coords.append(coords[keep])
+        self._indices.append(material_ids[keep])
+        self._add_keys(keys[new])
+        self._size += len(keep)
+
+    def arrays(self):
+        """Returns the journal as (coords (N, 3) int32, indices (N,) uint16, palette)."""
+        if not self._coords:
+            return np.empty((0, 3), dtype=np.int32), np.empty(0, dtype=np.uint16), list(self.palette.names)
+        return np.concatenate(self._coords), np.concatenate(self._indices), list(self.palette.names)
+
+    def save(self) -> Optional[pathlib.Path]:
+        """Writes the journal to its file; nothing is written for an empty journal."""
+        if not self._size:
+            return None
+        coords, indices, palette = self.arrays()
+        buffer = io.BytesIO()
+        np.savez(buffer, coords=coords, indices=indices, palette=np.array(palette, dtype=np.str_))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_bytes(_JOURNAL_MAGIC + _compress(buffer.getvalue()))
+        return self.path
+
+
+def load_undo_journal(execution_id: str, directory=None):
+    """
+    Loads the undo journal of an execution.
+
+    Returns:
+        A tuple (coords (N, 3) int32, indices (N,) uint16, palette list of material names).
+
+    Raises:
+        FileNotFoundError: If the execution has no journal.
+        ValueError: If execution_id is invalid, or its file is not an undo journal.
+    """
+    data = undo_journal_path(execution_id, directory).read_bytes()
+    if not data.startswith(_JOURNAL_MAGIC):
+        raise ValueError(f"{execution_id} is not an undo journal")
+    with np.load(io.BytesIO(_decompress(data[len(_JOURNAL_MAGIC):]))) as arrays:
+        return arrays['coords'], arrays['indices'], arrays['palette'].tolist()
+
+
+def list_undo_journals(directory=None) -> list[str]:
+    """Returns the execution ids that have an undo journal, most recent first."""
+    directory = pathlib.Path(directory or MC_UNDO_DIR)
+    if not directory.exists():
+        return []
+    paths = sorted(directory.glob('*.undo'), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [p.stem for p in paths]
@@ -604,3 +604,127 @@ def generate_digital_line_coordinates(p1: tuple[int, int, int], p2: tuple[int, i
             coords.append((x1, y1, z1))
 
     return coords
+
+
+# --- Convex Hull ---
+
+def get_convex_hull_planes(points) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the face planes of the convex hull of a point cloud using an
+    incremental hull construction.
+
+    Args:
+        points: An (N, 3) array-like of points. At least 4 non-coplanar points are required.
+
+    Returns:
+        A tuple (normals, offsets) where normals is an (F, 3) array of outward unit
+        normals and offsets an (F,) array, such that a point P lies inside the hull
+        when normals @ P <= offsets for every face. Returns two empty arrays if the
+        points are degenerate (collinear or coplanar).
+    """
+    pts = np.unique(np.asarray(points, dtype=np.float64).reshape(-1, 3), axis=0)
+    empty = (np.empty((0, 3)), np.empty((0,)))
+    if len(pts) < 4:
+        return empty
+
+    eps = 1e-9 * max(1.0, float(np.abs(pts).max()))
+
+    # --- Initial tetrahedron from extreme points ---
+    i0 = int(np.argmin(pts[:, 0]))
+    i1 = int(np.argmax(np.linalg.norm(pts - pts[i0], axis=1)))
+    line_dir = pts[i1] - pts[i0]
+    if np.linalg.norm(line_dir) < eps:
+        return empty
+    i2 = int(np.argmax(np.linalg.norm(np.cross(pts - pts[i0], line_dir), axis=1)))
+    plane_normal = np.cross(line_dir, pts[i2] - pts[i0])
+    if np.linalg.norm(plane_normal) < eps:
+        return empty
+    plane_dists = (pts - pts[i0]) @ plane_normal
+    i3 = int(np.argmax(np.abs(plane_dists)))
+    if abs(plane_dists[i3]) < eps * np.linalg.norm(plane_normal):
+        return empty
+
+    # Orient the base so that the fourth vertex lies behind it.
+    if plane_dists[i3] > 0:
+        i1, i2 = i2, i1
+    faces = [(i0, i1, i2), (i0, i3, i1), (i1, i3, i2), (i2, i3, i0)]
+
+    def _face_planes(face_list):
+        f = np.array(face_list)
+        a, b, c = pts[f[:, 0]], pts[f[:, 1]], pts[f[:, 2]]
+        n = np.cross(b - a, c - a)
+        n /= np.linalg.norm(n, axis=1)[:, None]
+        return n, np.einsum('ij,ij->i', n, a)
+
+    normals, offsets = _face_planes(faces)
+    initial = {i0, i1, i2, i3}
+
+    # --- Add the remaining points one at a time ---
+    for p_idx in range(len(pts)):
+        if p_idx in initial:
+            continue
+        visible = normals @ pts[p_idx] - offsets > eps
+        if not visible.any():
+            continue # Point is inside the current hull
+
+        visible_faces = [faces[i] for i in np.flatnonzero(visible)]
+        visible_edges = {(f[k], f[(k + 1) % 3]) for f in visible_faces for k in range(3)}
+        horizon = [(u, v) for (u, v) in visible_edges if (v, u) not in visible_edges]
+
+        new_faces = [(u, v, p_idx) for (u, v) in horizon]
+        new_normals, new_offsets = _face_planes(new_faces)
+
+        faces = [f for f, vis in zip(faces, visible) if not vis] + new_faces
+        normals = np.vstack([normals[~visible], new_normals])
+        offsets = np.concatenate([offsets[~visible], new_offsets])
+
+    # Coplanar faces (e.g. the two triangles of a square face) give identical planes.
+    planes = np.unique(np.round(np.column_stack([normals, offsets]), 9), axis=0)
+    return planes[:, :3], planes[:, 3]
+
+
+def generate_digital_convex_hull_coordinates(points: list[tuple[float, float, float]], hollow: bool = False):
+    """
+    Generates integer XYZ coordinates for the voxels whose centers lie inside the
+    convex hull of an arbitrary point cloud (pyramids, prisms, crystals, ...).
+
+    The hull is computed once and every candidate voxel in the bounding box is
+    tested against its face planes in a single vectorized pass.
+
+    Args:
+        points: The (x, y, z) points spanning the hull. At least 4 non-coplanar points are required.
+        hollow: If True, only the voxels on the surface of the hull are kept, i.e. those
+                with at least one face-adjacent neighbour outside the hull.
+
+    Returns:
+        list: A sorted list of (x, y, z) tuples.
+    """
+    normals, offsets = get_convex_hull_planes(points)
+    if len(normals) == 0:
+        print("Error: Convex hull requires at least 4 non-coplanar points.")
+        return []
+
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    # Pad the box by one voxel so the hollow test can look at every neighbour.
+    min_bb = np.floor(pts.min(axis=0)).astype(int) - 1
+    max_bb = np.ceil(pts.max(axis=0)).astype(int) + 1
+    shape = tuple(max_bb - min_bb + 1)
+
+    # Voxel center coordinates along each axis, shaped to broadcast over the box.
+    cx = (np.arange(min_bb[0], max_bb[0] + 1) + 0.5)[:, None, None]
+    cy = (np.arange(min_bb[1], max_bb[1] + 1) + 0.5)[None, :, None]
+    cz = (np.arange(min_bb[2], max_bb[2] + 1) + 0.5)[None, None, :]
+
+    inside = np.ones(shape, dtype=bool)
+    for (nx, ny, nz), d in zip(normals, offsets):
+        inside &= ((nx * cx + ny * cy) + nz * cz) <= d + 1e-6
+
+    if hollow:
+        interior = inside.copy()
+        interior[1:-1, 1:-1, 1:-1] &= (inside[:-2, 1:-1, 1:-1] & inside[2:, 1:-1, 1:-1] &
+                                       inside[1:-1, :-2, 1:-1] & inside[1:-1, 2:, 1:-1] &
+                                       inside[1:-1, 1:-1, :-2] & inside[1:-1, 1:-1, 2:])
+        inside &= ~interior
+
+    coords = np.argwhere(inside) + min_bb
+    return [tuple(c) for c in coords.tolist()]
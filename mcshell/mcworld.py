@@ -0,0 +1,236 @@
+import threading
+
+from pyncraft.util import flatten_parameters_to_bytestring
+
+from mcshell.constants import *
+from mcshell.mcplacement import MaterialPalette
+
+# Build limits of an overworld.
+WORLD_MIN_Y = -64
+WORLD_MAX_Y = 319
+
+SECTION_SIZE = 16
+
+
+class InMemoryWorld:
+    """
+    A Minecraft world kept in memory, for dry runs and benchmarks without a server.
+
+    It exposes the surface MCActions uses of pyncraft's Minecraft class (setBlock, setBlocks,
+    getBlock, getHeight, spawnEntity, postToChat, createExplosion and conn) and of
+    ParallelReader (get_blocks, get_heights). Blocks are stored as 16x16x16 sections of
+    palette ids, created when first written; the rest of the world is air, or ground_block
+    below ground_level.
+
+    Every call is counted, so that a dry run can report what it would have sent.
+    """
+
+    def __init__(self, ground_level: Optional[int] = None, ground_block: str = 'STONE'):
+        self.palette = MaterialPalette(['AIR'])
+        self.ground_level = ground_level
+        self.ground_id = self.palette.intern(ground_block)
+        self.sections = {}  # (cx, cy, cz) -> (16, 16, 16) uint16 array indexed [x, y, z]
+        self._defaults = {}
+        self._lock = threading.RLock()
+        self.conn = InMemoryConnection(self)
+
+        self.writes = 0
+        self.voxels_written = 0
+        self.reads = 0
+        self.entities = []  # (x, y, z, entity id) of spawned entities
+        self.chat = []
+
+    # --- sections ---
+
+    def _default_section(self, cy: int) -> np.ndarray:
+        section = self._defaults.get(cy)
+        if section is None:
+            section = np.zeros((SECTION_SIZE,) * 3, dtype=np.uint16)
+            if self.ground_level is not None:
+                section[:, :max(0, min(SECTION_SIZE, self.ground_level - cy * SECTION_SIZE)), :] = self.ground_id
+            section.flags.writeable = False
+            self._defaults[cy] = section
+        return section
+
+    def _section(self, key, create=False) -> np.ndarray:
+        section = self.sections.get(key)
+        if section is None:
+            section = self._default_section(key[1])
+            if create:
+                section = self.sections[key] = section.copy()
+        return section
+
+    def _section_slices(self, box):
+        """Yields (section key, local slices, slices into the box) of the sections a box covers."""
+        x1, y1, z1, x2, y2, z2 = box
+        for cx in range(x1 >> 4, (x2 >> 4) + 1):
+            for cy in range(y1 >> 4, (y2 >> 4) + 1):
+                for cz in range(z1 >> 4, (z2 >> 4) + 1):
+                    local, inner = [], []
+                    for c, lo, hi in ((cx, x1, x2), (cy, y1, y2), (cz, z1, z2)):
+                        start, stop = max(lo, c * SECTION_SIZE), min(hi, c * SECTION_SIZE + SECTION_SIZE - 1)
+                        local.append(slice(start - c * SECTION_SIZE, stop - c * SECTION_SIZE + 1))
+                        inner.append(slice(start - lo, stop - lo + 1))
+                    yield (cx, cy, cz), tuple(local), tuple(inner)
+
+    @staticmethod
+    def _clip(box):
+        x1, y1, z1, x2, y2, z2 = (int(v) for v in box)
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        z1, z2 = sorted((z1, z2))
+        return x1, max(y1, WORLD_MIN_Y), z1, x2, min(y2, WORLD_MAX_Y), z2
+
+    def fill(self, box, material: str) -> int:
+        """Sets every block of an (x1, y1, z1, x2, y2, z2) box; returns the number of blocks set."""
+        x1, y1, z1, x2, y2, z2 = self._clip(box)
+        if y2 < y1:
+            return 0
+        with self._lock:
+            material_id = self.palette.intern(material)
+            for key, local, _ in self._section_slices((x1, y1, z1, x2, y2, z2)):
+                self._section(key, create=True)[local] = material_id
+        return (x2 - x1 + 1) * (y2 - y1 + 1) * (z2 - z1 + 1)
+
+    def region(self, box) -> np.ndarray:
+        """Returns the palette ids of an (x1, y1, z1, x2, y2, z2) box as a (dx, dy, dz) array."""
+        clipped = self._clip(box)
+        y1, y2 = sorted((int(box[1]), int(box[4])))
+        blocks = np.zeros((clipped[3] - clipped[0] + 1, y2 - y1 + 1, clipped[5] - clipped[2] + 1), dtype=np.uint16)
+        if clipped[4] < clipped[1]:
+            return blocks
+        dy = clipped[1] - y1
+        with self._lock:
+            for key, local, inner in self._section_slices(clipped):
+                inner = (inner[0], slice(inner[1].start + dy, inner[1].stop + dy), inner[2])
+                blocks[inner] = self._section(key)[local]
+        return blocks
+
+    def height(self, x: int, z: int) -> int:
+        """The Y of the highest non-air block of a column, or WORLD_MIN_Y if it is all air."""
+        cx, cz, lx, lz = x >> 4, z >> 4, x & 15, z & 15
+        with self._lock:
+            cys = [key[1] for key in self.sections if key[0] == cx and key[2] == cz]
+            if self.ground_level is not None:
+                cys.append((self.ground_level - 1) >> 4)
+            for cy in range(max(cys, default=WORLD_MIN_Y >> 4), (WORLD_MIN_Y >> 4) - 1, -1):
+                solid = np.flatnonzero(self._section((cx, cy, cz))[lx, :, lz])
+                if len(solid):
+                    return cy * SECTION_SIZE + int(solid[-1])
+        return WORLD_MIN_Y
+
+    # --- pyncraft-compatible surface ---
+
+    def setBlock(self, x, y, z, block, *args):
+        self.writes += 1
+        self.voxels_written += self.fill((x, y, z, x, y, z), block)
+
+    def setBlocks(self, x1, y1, z1, x2, y2, z2, block):
+        self.writes += 1
+        self.voxels_written += self.fill((x1, y1, z1, x2, y2, z2), block)
+
+    def getBlock(self, x, y, z) -> str:
+        self.reads += 1
+        return self.palette.names[int(self.region((x, y, z, x, y, z))[0, 0, 0])]
+
+    def getHeight(self, x, z) -> int:
+        self.reads += 1
+        return self.height(int(x), int(z))
+
+    def spawnEntity(self, x, y, z, entityID) -> int:
+        with self._lock:
+            self.entities.append((x, y, z, int(entityID)))
+            return len(self.entities)
+
+    def postToChat(self, *msg):
+        self.chat.append(" ".join(str(m) for m in msg))
+
+    def createExplosion(self, x, y, z, power=4):
+        pass
+
+    # --- ParallelReader-compatible surface ---
+
+    def getBlocks(self, x1, y1, z1, x2, y2, z2) -> str:
+        """The world.getBlocks reply for a box: material names with y outermost, then x, then z."""
+        self.reads += 1
+        names = np.array(self.palette.names, dtype=object)
+        blocks = self.region((x1, y1, z1, x2, y2, z2))
+        return ",".join(names[blocks.transpose(1, 0, 2).reshape(-1)])
+
+    def get_blocks(self, boxes) -> list:
+        return [self.getBlocks(*box) for box in boxes]
+
+    def get_heights(self, columns, batch: int = 1024) -> list:
+        return [self.getHeight(x, z) for x, z in columns]
+
+    def close(self):
+        pass
+
+    # --- statistics ---
+
+    def stats(self) -> dict:
+        return {'writes': self.writes, 'voxels_written': self.voxels_written, 'reads': self.reads,
+                'entities': len(self.entities), 'sections': len(self.sections)}
+
+    def report(self) -> str:
+        return (f"Dry run: {self.writes} writes of {self.voxels_written} blocks, {self.reads} reads, "
+                f"{len(self.entities)} entities spawned, {len(self.sections)} sections touched.")
+
+
+class InMemoryConnection:
+    """
+    Answers FruitJuice protocol lines from an InMemoryWorld, with the parts of pyncraft's
+    Connection that MCActions uses: sendReceive and send, and socket.sendall/fd.readline
+    for pipelined requests.
+    """
+
+    _REQUESTS = {
+        'world.getBlock': lambda w, *a: w.getBlock(*map(int, a)),
+        'world.getBlocks': lambda w, *a: w.getBlocks(*map(int, a)),
+        'world.getHeight': lambda w, *a: w.getHeight(*map(int, a)),
+        'world.spawnEntity': lambda w, x, y, z, e: w.spawnEntity(float(x), float(y), float(z), int(e)),
+        'world.getPlayerIds': lambda w: '',
+    }
+    _COMMANDS = {
+        'world.setBlock': lambda w, x, y, z, b, *a: w.setBlock(int(x), int(y), int(z), b),
+        'world.setBlocks': lambda w, *a: w.setBlocks(*map(int, a[:6]), a[6]),
+        'chat.post': lambda w, *a: w.postToChat(",".join(a)),
+        'world.createExplosion': lambda w, *a: None,
+    }
+
+    def __init__(self, world: InMemoryWorld):
+        self.world = world
+        self.socket = self.fd = self
+        self._replies = []
+
+    def handle(self, line: str) -> Optional[str]:
+        """Runs one protocol line; returns its reply, or None for commands that get no reply."""
+        name, _, args = line.strip().partition('(')
+        args = args[:-1].split(',') if args[:-1] else []
+        if name in self._COMMANDS:
+            self._COMMANDS[name](self.world, *args)
+            return None
+        if name in self._REQUESTS:
+            try:
+                return str(self._REQUESTS[name](self.world, *args))
+            except (TypeError, ValueError) as e:
+                return f"Fail,{e}"
+        return f"Fail,Unknown command {name}"
+
+    def _line(self, f, data) -> str:
+        return (f + b"(" + flatten_parameters_to_bytestring(data) + b")").decode()
+
+    def send(self, f, *data):
+        self.handle(self._line(f, data))
+
+    def sendReceive(self, f, *data) -> str:
+        return self.handle(self._line(f, data))
+
+    def sendall(self, data: bytes):
+        for line in data.decode().splitlines():
+            reply = self.handle(line)
+            if reply is not None:
+                self._replies.append(reply + "\n")
+
+    def readline(self) -> str:
+        return self._replies.pop(0) if self._replies else ""
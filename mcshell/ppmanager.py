@@ -17,6 +17,11 @@ class PaperServerManager:
         self.world_manifest = json.load(self.world_directory.joinpath('world_manifest.json').open('br'))
         self.jar_path = self.world_directory.parent.joinpath(self.world_manifest.get('server_jar_path'))
 
+    @property
+    def world_data_path(self) -> Path:
+        """The directory the server keeps the world's data (region files, generated structures) in."""
+        return self.world_directory / self.world_manifest.get('world_data_path', 'world')
+
     def _run_initialization(self):
         """
         Runs the server once with --initSettings to generate config files, then exits.
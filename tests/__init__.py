@@ -39,8 +39,12 @@ def debug_on(*exceptions):
     return decorator
 
 
-from tests.mcactions import TestMCActions
+from tests.mcactions import TestMCActions, TestMCActionsInMemory
 from tests.mcplayer import TestMCPLayer
+from tests.mcvoxel import TestMCVoxel
+from tests.mcplacement import TestMCPlacement
+from tests.mcimage import TestMCImage
+from tests.mcterrain import TestMCTerrain
 
 if __name__ == '__main__':
     _tl = unittest.TestLoader()
@@ -1,4 +1,11 @@
+import tempfile
+import threading
+from unittest import mock
+
 from tests import *
+from mcshell.mcworld import InMemoryWorld
+from mcshell.mcundo import UndoJournal
+from mcshell.mcplacement import PROXIMITY_BAND
 
 
 class TestMCActions(unittest.TestCase):
@@ -13,5 +20,395 @@ class TestMCActions(unittest.TestCase):
     def test_base_init(self):
         self.assertIsNotNone(self.mca)
 
+
+class _WorldPlayer(MCPlayer):
+    """An MCPlayer whose FruitJuice connection and RCON /fill commands both go to an InMemoryWorld."""
+
+    def __init__(self, world, password='secret'):
+        super().__init__(TEST_PLAYER_NAME, password=password)
+        self.world = world
+        self.commands = []
+
+    @property
+    def pc(self):
+        return self.world
+
+    def run_many(self, commands):
+        replies = []
+        for command in commands:
+            self.commands.append(command)
+            name, *args = command.split()
+            if name == 'fill':
+                self.world.fill([int(v) for v in args[:6]], args[6].split(':')[1].upper())
+                replies.append("Successfully filled")
+            elif name == 'clone':
+                x1, y1, z1, x2, y2, z2, dx, dy, dz = (int(v) for v in args[:9])
+                blocks = self.world.region((x1, y1, z1, x2, y2, z2))
+                for (i, j, k), material_id in np.ndenumerate(blocks):
+                    self.world.fill((dx + i, dy + j, dz + k) * 2, self.world.palette.names[material_id])
+                replies.append("Successfully cloned")
+            else:
+                replies.append(f"Unknown command {name}")
+        return replies
+
+
+class _GatedWorld(InMemoryWorld):
+    """An InMemoryWorld whose box writes wait for a gate to open, and refuse the material 'BAD'."""
+
+    def __init__(self):
+        super().__init__(ground_level=0)
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+
+    def setBlocks(self, x1, y1, z1, x2, y2, z2, block):
+        self.entered.set()
+        self.gate.wait(timeout=5.0)
+        if block == 'BAD':
+            raise RuntimeError("refused BAD")
+        super().setBlocks(x1, y1, z1, x2, y2, z2, block)
+
+
+class _LowSpawnWorld(InMemoryWorld):
+    """An InMemoryWorld that refuses to spawn entities above the build limit."""
+
+    def spawnEntity(self, x, y, z, entityID):
+        if y > 320:
+            raise ValueError("Above the build limit")
+        return super().spawnEntity(x, y, z, entityID)
+
+
+class _LossyWorld(InMemoryWorld):
+    """An InMemoryWorld that silently drops every Nth block write, like an overloaded server."""
+
+    def __init__(self, every):
+        super().__init__(ground_level=64)
+        self.every = every
+        self.attempts = 0
+
+    def setBlock(self, x, y, z, block, *args):
+        self.attempts += 1
+        if self.attempts % self.every:
+            super().setBlock(x, y, z, block, *args)
+
+    def setBlocks(self, x1, y1, z1, x2, y2, z2, block):
+        self.attempts += 1
+        if self.attempts % self.every:
+            super().setBlocks(x1, y1, z1, x2, y2, z2, block)
+
+
+class _PipelinedWorld(InMemoryWorld):
+    """An InMemoryWorld standing in for a pipelined connection and a ParallelReader."""
+
+    def flush(self):
+        pass
+
+    def sync(self, timeout=None):
+        return True
+
+    def report_errors(self):
+        pass
+
+
+class _WatchedPlayer(MCPlayer):
+    """An MCPlayer that records the threads using its pyncraft connection."""
+
+    def __init__(self):
+        super().__init__(TEST_PLAYER_NAME)
+        self.threads = []
+
+    @property
+    def pc(self):
+        self.threads.append(threading.get_ident())
+        return mock.Mock()
+
+    @property
+    def position(self):
+        self.threads.append(threading.get_ident())
+        return Vec3(200, 64, 0)
+
+
+class TestMCActionsInMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.world = InMemoryWorld(ground_level=0)
+        self.player = _WorldPlayer(self.world)
+
+    def test_mixed_backends_keep_call_order(self):
+        mca = MCActionBase(self.player, backend='auto', rcon_min_box_volume=8, transport='direct',
+                           blocks_per_second=None, cache_max_age=0)
+        mca._place_boxes([(0, 0, 0, 3, 3, 3, 'STONE'), (1, 1, 1, 1, 1, 1, 'GLASS'),
+                          (5, 0, 0, 5, 0, 0, 'GLASS'), (4, 0, 0, 6, 1, 1, 'DIRT')])
+        # the small box after the /fill wins, and the /fill after the small box wins
+        self.assertEqual(self.world.getBlock(1, 1, 1), 'GLASS')
+        self.assertEqual(self.world.getBlock(5, 0, 0), 'DIRT')
+        self.assertEqual(len(self.player.commands), 2)
+
+    def test_asynchronous_reads_wait_for_overlapping_writes(self):
+        world = _GatedWorld()
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, asynchronous=True, blocks_per_second=None)
+        try:
+            future = mca._place_boxes([(0, 64, 0, 3, 67, 3)], 'STONE')
+            # a read elsewhere does not wait for the pending placement
+            self.assertEqual(mca.get_block(Vec3(100, 65, 100)), 'AIR')
+            self.assertFalse(future.done())
+            threading.Timer(0.1, world.gate.set).start()
+            # a read inside it does
+            self.assertEqual(mca.get_block(Vec3(1, 65, 1)), 'STONE')
+            self.assertTrue(future.done())
+        finally:
+            world.gate.set()
+            mca.close()
+
+    def test_asynchronous_errors_are_raised_on_wait(self):
+        world = _GatedWorld()
+        world.gate.set()
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, asynchronous=True, blocks_per_second=None)
+        try:
+            mca._place_boxes([(0, 64, 0, 3, 67, 3)], 'BAD')
+            with self.assertRaisesRegex(RuntimeError, 'refused BAD'):
+                mca.wait()
+        finally:
+            mca.close()
+
+    def test_worker_never_uses_the_player_connection(self):
+        world = _PipelinedWorld(ground_level=64)
+        player = _WatchedPlayer()
+        mca = MCActions(player, asynchronous=True, blocks_per_second=None, placement_order='proximity')
+        mca._pipeline = mca._reader = world
+        with tempfile.TemporaryDirectory() as directory:
+            mca.journal = UndoJournal('watched', directory, palette=mca.palette)
+            # the journal reads the world before writing, and a large batch is ordered by proximity
+            future = mca._place_boxes([(x, 70, 0, x, 70, 0) for x in range(0, 600, 2)], 'STONE')
+            future.result(timeout=5.0)
+            mca.journal = None
+        self.assertEqual(mca.focus, (200, 64, 0))
+        self.assertEqual(set(player.threads), {threading.get_ident()})
+        self.assertEqual(world.getBlock(598, 70, 0), 'STONE')
+        mca.close()
+
+    def test_large_box_lists_keep_call_order(self):
+        world = InMemoryWorld(ground_level=64)
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, blocks_per_second=None)
+        # enough boxes to be worth reordering, but the later GLASS box must still win
+        boxes = [(x, 70, 100, x, 70, 100, 'DIRT') for x in range(0, 600, 2)]
+        boxes += [(20, 70, 0, 40, 70, 0, 'STONE'), (0, 70, 0, 30, 70, 0, 'GLASS')]
+        mca._place_boxes(boxes)
+        mca.close()
+        self.assertEqual((world.getBlock(25, 70, 0), world.getBlock(35, 70, 0)), ('GLASS', 'STONE'))
+
+    def test_verify_resends_missing_blocks(self):
+        world = _LossyWorld(every=3)
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, blocks_per_second=None, verify='on')
+        # separate blocks, one write each: writes 3, 6, ..., 300 are lost
+        mca._place_blocks_from_coords([(x, 70, 0) for x in range(0, 600, 2)], 'STONE')
+        result = mca.verify_placement()
+        # the 100 lost blocks are re-sent, and writes keep getting lost: 33 in the first
+        # retry, 11 in the second and last
+        self.assertEqual((result['blocks'], result['checked'], result['missing'], result['failed']),
+                         (300, 300, 100, 11))
+        self.assertEqual(world.attempts, 300 + 100 + 33)
+        self.assertEqual(sum(world.getBlock(x, 70, 0) != 'STONE' for x in range(0, 600, 2)), 11)
+        self.assertEqual(result['summary'], "Verified 300 blocks: 96.3% in place after re-sending 100 missing blocks.")
+        # the re-sent blocks are not checked again
+        self.assertIsNone(mca.verify_placement())
+        mca.close()
+
+    def test_verify_samples(self):
+        world = _LossyWorld(every=1)
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, blocks_per_second=None, verify='0.25')
+        mca._place_boxes([(0, 70, 0, 49, 70, 99)], 'GLASS')
+        world.every = 1 << 30
+        # the sample finds missing blocks, so every block is checked
+        result = mca.verify_placement()
+        self.assertEqual((result['checked'], result['missing'], result['failed']), (5000, 5000, 0))
+        mca._place_boxes([(0, 71, 0, 49, 71, 99)], 'GLASS')
+        result = mca.verify_placement()
+        self.assertEqual((result['checked'], result['missing']), (1250, 0))
+        self.assertEqual(result['summary'], "Verified a sample of 1250 of 5000 blocks: all in place.")
+        mca.close()
+
+    def test_diff_sends_only_changed_blocks(self):
+        world = InMemoryWorld(ground_level=64)
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, blocks_per_second=None)
+        mca.create_digital_ball(Vec3(0, 80, 0), 4, 'STONE')
+        writes = world.writes
+        self.assertGreater(writes, 0)
+        # the same build again sends nothing
+        mca.diff = True
+        self.assertEqual(mca.create_digital_ball(Vec3(0, 80, 0), 4, 'STONE'), 0)
+        self.assertEqual(world.writes, writes)
+        # a block changed since is sent, and only that one
+        world.setBlock(0, 80, 0, 'AIR')
+        writes, voxels = world.writes, world.voxels_written
+        mca.create_digital_ball(Vec3(0, 80, 0), 4, 'STONE')
+        self.assertEqual((world.writes - writes, world.voxels_written - voxels), (1, 1))
+        self.assertEqual(world.getBlock(0, 80, 0), 'STONE')
+        mca.close()
+
+    def test_close_runs_once(self):
+        world = InMemoryWorld(ground_level=64)
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, buffered=True, blocks_per_second=None)
+        with tempfile.TemporaryDirectory() as directory:
+            mca.journal = UndoJournal('closing', directory, palette=mca.palette)
+            mca._place_blocks_from_coords([(0, 70, 0), (1, 70, 0)], 'STONE')
+            with mock.patch.object(mca.journal, 'save', wraps=mca.journal.save) as save:
+                mca.close()
+                mca.close()
+            self.assertEqual(save.call_count, 1)
+        self.assertEqual(world.getBlock(1, 70, 0), 'STONE')
+
+    def test_close_cancels_queued_placements(self):
+        world = _GatedWorld()
+        cancel_event = threading.Event()
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME, cancel_event=cancel_event), world=world,
+                        asynchronous=True, blocks_per_second=None)
+        running = mca._place_boxes([(0, 64, 0, 3, 67, 3)], 'STONE')
+        self.assertTrue(world.entered.wait(timeout=5.0))
+        queued = mca._place_boxes([(10, 64, 0, 13, 67, 3)], 'GLASS')
+        cancel_event.set()
+        threading.Timer(0.1, world.gate.set).start()
+        mca.close()
+        # the running placement finishes, the queued one never starts
+        self.assertTrue(running.done() and not running.cancelled())
+        self.assertTrue(queued.cancelled())
+        self.assertEqual((world.getBlock(1, 65, 1), world.getBlock(11, 65, 1)), ('STONE', 'AIR'))
+
+    def test_buffered_writes_keep_call_options(self):
+        world = InMemoryWorld(ground_level=64)
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, buffered=True, blocks_per_second=None)
+        with tempfile.TemporaryDirectory() as directory:
+            mca.journal = UndoJournal('buffered', directory, palette=mca.palette)
+            mca._place_blocks_from_coords([(0, 70, 0), (1, 70, 0)], 'STONE')
+            self.assertEqual(world.writes, 0)
+            # record=False cannot be buffered: the buffer is sent first, then this call
+            mca._place_blocks_from_coords([(0, 70, 0), (5, 70, 5)], 'GLASS', record=False)
+            self.assertEqual([world.getBlock(x, 70, z) for x, z in ((0, 0), (1, 0), (5, 5))],
+                             ['GLASS', 'STONE', 'GLASS'])
+            self.assertEqual(len(mca.journal), 2)
+            self.assertNotIn((5, 70, 5), mca.journal)
+            mca.journal = None
+            mca.close()
+
+    def test_buffered_writes_follow_proximity_order_across_materials(self):
+        world = InMemoryWorld(ground_level=64)
+        sent = []
+        set_block = world.setBlock
+
+        def recording_set_block(x, y, z, block):
+            sent.append((x, block))
+            set_block(x, y, z, block)
+
+        world.setBlock = recording_set_block
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, buffered=True, blocks_per_second=None,
+                        placement_order='proximity', focus_vec3=Vec3(1200, 70, 0))
+        # separate blocks, alternating between two materials and moving away from the focus
+        for x in range(0, 1200, 2):
+            mca._place_blocks_from_coords([(x, 70, 0)], 'STONE' if x % 4 else 'GLASS')
+        mca.close()
+        self.assertEqual(len(sent), 600)
+        # nearest first, whatever the material
+        bands = [(1200 - x) // PROXIMITY_BAND for x, _ in sent]
+        self.assertEqual(bands, sorted(bands))
+        self.assertEqual({block for _, block in sent[:8]}, {'STONE', 'GLASS'})
+
+    def test_get_blocks_reads_large_regions_in_pieces(self):
+        world = InMemoryWorld(ground_level=64)
+        world.fill((-5, 60, -5, 20, 70, 3), 'GLASS')
+        world.fill((10, 66, -40, 12, 90, 40), 'DIRT')
+        requests = []
+        get_blocks = world.get_blocks
+
+        def recording_get_blocks(boxes):
+            requests.extend(boxes)
+            return get_blocks(boxes)
+
+        world.get_blocks = recording_get_blocks
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world)
+        try:
+            blocks, palette = mca.get_blocks(Vec3(30, 55, 40), Vec3(-10, 80, -40))
+        finally:
+            mca.close()
+        self.assertEqual(blocks.shape, (41, 26, 81))
+        self.assertGreater(len(requests), 1)
+        self.assertTrue(all((b[3] - b[0] + 1) * (b[4] - b[1] + 1) * (b[5] - b[2] + 1) <= READ_MAX_VOLUME
+                            for b in requests))
+        # the pieces are put back where they belong
+        expected = np.array(world.palette.names, dtype=object)[world.region((-10, 55, -40, 30, 80, 40))]
+        self.assertTrue(np.array_equal(np.array(palette, dtype=object)[blocks], expected))
+
+    def test_get_heights(self):
+        world = InMemoryWorld(ground_level=64)
+        world.fill((0, 64, 0, 2, 70, 0), 'STONE')
+        world.fill((1, 50, 3, 1, 63, 3), 'AIR')
+        expected = [[world.height(x, z) for z in range(-1, 5)] for x in range(-2, 4)]
+        self.assertEqual(expected[2][1], 70)
+        self.assertEqual(expected[3][4], 49)
+        for cache_max_age in (None, 0):
+            mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, cache_max_age=cache_max_age)
+            try:
+                self.assertEqual(mca.get_heights(3, 4, -2, -1).tolist(), expected)
+                # our own writes show up in later reads
+                mca.set_block(Vec3(-2, 80, -1), 'GLASS')
+                self.assertEqual(mca.get_heights(-2, -1, -2, -1).tolist(), [[80]])
+                self.assertEqual(mca.get_height(Vec3(-2, 0, -1)), 80)
+            finally:
+                mca.close()
+            world.fill((-2, 80, -1, -2, 80, -1), 'AIR')
+
+    def test_spawn_entities(self):
+        world = _LowSpawnWorld()
+        batches = []
+        sendall = world.conn.sendall
+
+        def recording_sendall(data):
+            batches.append(data.count(b"\n"))
+            sendall(data)
+
+        world.conn.sendall = recording_sendall
+        positions = [Vec3(x, 400 if x % 5 == 4 else 64, 0) for x in range(25)]
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world)
+        try:
+            start = time.monotonic()
+            entity_ids = mca.spawn_entities(positions, 'ZOMBIE', rate=200, batch_size=10)
+            elapsed = time.monotonic() - start
+            self.assertEqual(mca.spawn_entities(positions, 'NOT_AN_ENTITY'), [])
+        finally:
+            mca.close()
+        self.assertEqual(batches, [10, 10, 5])
+        # one batch per tick of batch_size / rate seconds, after the first
+        self.assertGreater(elapsed, 0.09)
+        self.assertEqual(len(entity_ids), 25)
+        self.assertEqual([i for i, entity_id in enumerate(entity_ids) if entity_id is None], [4, 9, 14, 19, 24])
+        self.assertEqual([y for _, y, _, _ in world.entities], [65.0] * 20)
+
+    def test_in_memory_world_is_not_paced(self):
+        world = InMemoryWorld()
+        mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, blocks_per_second=10)
+        try:
+            self.assertTrue(mca.scheduler.unlimited)
+            start = time.monotonic()
+            mca.create_digital_line(Vec3(0, 64, 0), Vec3(500, 64, 300), 'STONE')
+            self.assertLess(time.monotonic() - start, 5.0)
+        finally:
+            mca.close()
+        self.assertGreater(world.voxels_written, 500)
+
+    def test_paste_region_pastes_the_clipboard(self):
+        mca = MCActions(self.player, blocks_per_second=None, cache_max_age=0)
+        mca.transport = 'direct'
+        self.world.fill((0, 64, 0, 2, 65, 2), 'STONE')
+        mca.copy_region(Vec3(0, 64, 0), Vec3(2, 65, 2))
+        # the source changes after the copy
+        self.world.fill((0, 64, 0, 2, 65, 2), 'DIRT')
+        mca.paste_region(Vec3(10, 64, 0))
+        self.assertEqual(self.world.getBlock(11, 65, 1), 'STONE')
+        self.assertEqual(self.player.commands, [])
+        # a server-side paste copies the source as it is now
+        mca.paste_region(Vec3(20, 64, 0), server_side=True)
+        self.assertEqual(self.world.getBlock(21, 65, 1), 'DIRT')
+        self.assertEqual([c.split()[0] for c in self.player.commands], ['clone'])
+        mca.close()
+
+
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
@@ -0,0 +1,32 @@
+from tests import *
+from mcshell.mcimage import *
+
+
+class TestMCImage(unittest.TestCase):
+
+    def test_colour_matching(self):
+        materials = ['WHITE_WOOL', 'BLACK_WOOL', 'RED_WOOL', 'BLUE_WOOL']
+        # the materials' own colours, then colours near them
+        rgb = np.array([[[234, 236, 237], [21, 21, 26], [161, 39, 35], [53, 57, 157]],
+                        [[255, 255, 255], [0, 0, 0], [200, 20, 20], [20, 20, 200]]], dtype=np.uint8)
+        indices = map_pixels_to_materials(rgb, materials)
+        self.assertEqual(indices.dtype, np.uint16)
+        self.assertEqual(indices.tolist(), [[0, 1, 2, 3], [0, 1, 2, 3]])
+        # dithering without strength changes nothing
+        self.assertTrue(np.array_equal(map_pixels_to_materials(rgb, materials, dither=True, dither_strength=0), indices))
+
+    def test_row_runs_to_boxes(self):
+        grid = np.array([[0, 0, -1, 2],
+                         [1, 1, 1, -1]])
+        runs = find_row_runs(grid)
+        self.assertEqual([a.tolist() for a in runs], [[0, 0, 1], [0, 3, 0], [1, 3, 2], [0, 2, 1]])
+        # row 0 is the top of the image, so it lands one block above the origin
+        self.assertEqual(image_runs_to_boxes(*runs, 2, (10, 64, -3), 'xy'),
+                         [(10, 65, -3, 11, 65, -3, 0), (13, 65, -3, 13, 65, -3, 2), (10, 64, -3, 12, 64, -3, 1)])
+        self.assertEqual(image_runs_to_boxes(*runs, 2, (10, 64, -3), 'xz')[0], (10, 64, -4, 11, 64, -4, 0))
+        with self.assertRaises(ValueError):
+            image_runs_to_boxes(*runs, 2, (0, 0, 0), 'yx')
+
+
+if __name__ == '__main__':
+    unittest.main()
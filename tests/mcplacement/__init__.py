@@ -0,0 +1,490 @@
+import contextlib
+import io
+import socket
+import socketserver
+import tempfile
+import textwrap
+import threading
+from unittest import mock
+
+from tests import *
+from mcshell.mcplacement import *
+from mcshell.mcundo import UndoJournal, load_undo_journal, undo_journal_path
+from mcshell.mccache import WorldCache
+from mcshell.mcschematic import load_schematic, save_schematic, StructureTemplateBackend
+from mcshell.mcworld import InMemoryWorld
+from mcshell.mcpipeline import PipelinedConnection, ShardedConnection, ParallelReader
+
+
+def _expand_boxes(boxes):
+    voxels = []
+    for x1, y1, z1, x2, y2, z2 in boxes.tolist():
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                for z in range(z1, z2 + 1):
+                    voxels.append((x, y, z))
+    return voxels
+
+
+class TestMCPlacement(unittest.TestCase):
+
+    def test_solid_cube_is_one_box(self):
+        coords = [(x, y, z) for x in range(50) for y in range(50) for z in range(50)]
+        boxes, singles = decompose_into_boxes(coords_to_array(coords, offset=(10, 60, -5)))
+        self.assertEqual(boxes.tolist(), [[10, 60, -5, 59, 109, 44]])
+        self.assertEqual(len(singles), 0)
+
+    def test_decomposition_covers_shape_exactly(self):
+        coords = generate_digital_ball_coordinates((0.0, 0.0, 0.0), 8.0, inner_radius=4.0)
+        boxes, singles = decompose_into_boxes(coords_to_array(coords))
+        covered = _expand_boxes(boxes) + [tuple(v) for v in singles.tolist()]
+        # boxes never overlap, and together with the singles give back the shape
+        self.assertEqual(len(covered), len(set(covered)))
+        self.assertEqual(set(covered), set(coords))
+        self.assertLess(len(boxes) + len(singles), len(coords))
+        self.assertTrue(np.all(box_volumes(boxes) >= 2))
+
+    def test_empty(self):
+        boxes, singles = decompose_into_boxes(coords_to_array([]))
+        self.assertEqual(boxes.shape, (0, 6))
+        self.assertEqual(singles.shape, (0, 3))
+
+    def test_get_blocks_reply_order(self):
+        # FruitJuice lists blocks y-major, then x, then z
+        box = (5, 10, 20, 6, 11, 22)
+        names = [f"B{y}{x}{z}" for y in range(2) for x in range(2) for z in range(3)]
+        current = parse_get_blocks_reply(','.join(names), box)
+        self.assertEqual(current.shape, (2, 2, 3))
+        self.assertEqual(current[1, 0, 2], 'B012')
+        self.assertIsNone(parse_get_blocks_reply('Fail,bad', box))
+
+        coords = np.array([[6, 10, 22], [5, 11, 20], [9, 9, 9]])
+        out = np.full(len(coords), None, dtype=object)
+        lookup_materials(coords, box, current, out)
+        self.assertEqual(out.tolist(), ['B012', 'B100', None])
+
+        palette = MaterialPalette(['AIR'])
+        ids = parse_get_blocks_reply(','.join(names), box, palette)
+        self.assertEqual(ids.dtype, np.uint16)
+        self.assertEqual(palette.name(ids[1, 0, 2]), 'B012')
+        self.assertEqual(palette.suffix(palette.intern('AIR')), b",AIR)\n")
+
+    def test_palette_interns_concurrently(self):
+        palette = MaterialPalette(['AIR'])
+        names = [f'MATERIAL_{i}' for i in range(20000)]
+        barrier = threading.Barrier(8)
+
+        def intern(seed):
+            order = np.random.default_rng(seed).permutation(len(names))
+            barrier.wait()
+            palette.intern_many([names[i] for i in order])
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=intern, args=(seed,)) for seed in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        # every material got exactly one id, with its own name and suffix
+        self.assertEqual(len(palette), len(names) + 1)
+        for name in names:
+            material_id = palette.intern(name)
+            self.assertEqual(palette.name(material_id), name)
+            self.assertEqual(palette.suffix(material_id), b"," + name.encode() + b")\n")
+
+    def test_placement_rate(self):
+        self.assertIsNone(parse_placement_rate('unlimited'))
+        self.assertIsNone(parse_placement_rate('0'))
+        self.assertEqual(parse_placement_rate('250'), 250.0)
+        scheduler = PlacementScheduler(None)
+        self.assertTrue(scheduler.unlimited)
+        self.assertEqual(PlacementScheduler(1000, tick=0.05).capacity, 50.0)
+        self.assertEqual(PlacementScheduler().blocks_per_second, 100.0)
+
+    def test_placement_debt_is_capped(self):
+        flushes = []
+        scheduler = PlacementScheduler(100, tick=0.05, before_wait=lambda: flushes.append(1))
+        with mock.patch('time.sleep') as sleep:
+            scheduler.throttle(1000000)  # a huge box is sent at once...
+            sleep.assert_not_called()
+            scheduler.throttle(1)  # ... and what follows waits about max_debt, not hours
+        wait = sleep.call_args[0][0]
+        self.assertLessEqual(wait, PLACEMENT_MAX_DEBT + 0.05 + 1e-6)
+        self.assertGreater(wait, PLACEMENT_MAX_DEBT - 0.1)
+        self.assertEqual(flushes, [1])
+
+    def test_placement_progress(self):
+        now, updates = [0.0], []
+        progress = PlacementProgress(updates.append, interval=0.25, clock=lambda: now[0])
+        progress.add_planned(1000)
+        now[0] = 1.0
+        progress.add_placed(100, 'fruitjuice')
+        self.assertEqual(updates, [{'placed': 100, 'remaining': 900, 'blocks_per_second': 100.0,
+                                    'eta': 9.0, 'elapsed': 1.0, 'backend': 'fruitjuice'}])
+        now[0] = 1.1
+        progress.add_placed(100, 'fruitjuice')  # too soon after the last update
+        self.assertEqual(len(updates), 1)
+        now[0] = 1.3
+        progress.add_placed(100, 'rcon')
+        self.assertEqual(updates[-1], {'placed': 300, 'remaining': 700, 'blocks_per_second': 230.8,
+                                       'eta': 3.0, 'elapsed': 1.3, 'backend': 'rcon'})
+        progress.report(force=True)
+        self.assertEqual(len(updates), 3)
+        # a failing callback does not stop placement
+        progress.on_update = lambda snapshot: 1 / 0
+        progress.report(force=True)
+
+    def test_power_progress_events(self):
+        from mcshell import mcserver
+        python_code = textwrap.dedent("""
+            from mcshell.constants import *
+
+            class BlocklyProgramRunner:
+                def __init__(self, action_implementer, cancel_event=None, runtime_params={}):
+                    self.action_implementer = action_implementer
+
+                def run_program(self):
+                    self.action_implementer.create_digital_ball(Vec3(0, 80, 0), 4, 'STONE')
+                    self.action_implementer.create_digital_ball(Vec3(20, 80, 0), 4, 'GLASS')
+            """)
+        output = io.StringIO()
+        with mock.patch.object(mcserver.socketio, 'emit') as emit, contextlib.redirect_stdout(output):
+            mcserver.execute_power_in_thread('power', 'run', python_code, TEST_PLAYER_NAME, MC_SERVER_DATA, {},
+                                             threading.Event(), {'dry_run': 'on', 'blocks_per_second': None,
+                                                                 'placement_order': 'chunk', 'verify': 'on'})
+        # the actions are closed once
+        self.assertEqual(output.getvalue().count('Dry run:'), 1)
+        events = [(name, data) for (name, data), _ in emit.call_args_list]
+        self.assertEqual(events[0][1]['status'], 'running')
+        self.assertEqual(events[-1][1]['status'], 'finished')
+        self.assertTrue(events[-1][1]['message'].startswith('Dry run'))
+        # the verification summary is added to the status message
+        self.assertTrue(events[-1][1]['message'].endswith(' Verified 560 blocks: all in place.'))
+        progress = [data for name, data in events if name == 'power_progress']
+        self.assertTrue(progress)
+        self.assertTrue(all(p['id'] == 'power' and p['execution_id'] == 'run' for p in progress))
+        self.assertEqual((progress[-1]['placed'], progress[-1]['remaining']), (560, 0))
+        self.assertNotIn('run', mcserver.POWER_PROGRESS)
+
+    def test_chunk_order(self):
+        coords = np.array([[17, 0, 0], [-1, 70, 3], [0, 5, 0], [0, -60, 0], [15, 0, 15], [16, 0, -16]])
+        order = chunk_order(coords)
+        self.assertEqual(order.tolist(), [1, 3, 4, 2, 5, 0])
+
+    def test_proximity_order(self):
+        corners = np.array([[100, 0, 0], [0, 0, 0], [40, 0, 0], [-20, 0, 0], [17, 0, 0], [0, 0, -500]])
+        # nearest band first; the two blocks 17 and 20 away share a band and go chunk by chunk
+        self.assertEqual(proximity_order(corners, corners, (0, 0, 0)).tolist(), [1, 3, 4, 2, 0, 5])
+        # a box is as near as its nearest block
+        order = proximity_order([[50, 0, 0], [-30, 0, -5]], [[60, 0, 0], [30, 0, 5]], (45, 0, 0))
+        self.assertEqual(order.tolist(), [1, 0])
+
+    def test_write_buffer_last_writer_wins(self):
+        buffer = WriteBuffer()
+        buffer.add(box_voxels([(0, 60, 0, 3, 63, 3)]), 'STONE')
+        buffer.add(box_voxels([(1, 61, 1, 2, 62, 2)]), 'AIR')
+        buffer.add(np.array([[-5, -64, 7]]), 'DIRT')
+        writes, groups = buffer.drain()
+        self.assertEqual(writes, 64 + 8 + 1)
+        self.assertEqual(len(buffer), 0)
+        groups = {material: {tuple(v) for v in coords.tolist()} for material, coords in groups}
+        self.assertEqual(len(groups['STONE']), 56)
+        self.assertEqual(groups['AIR'], {(x, y, z) for x in (1, 2) for y in (61, 62) for z in (1, 2)})
+        self.assertEqual(groups['DIRT'], {(-5, -64, 7)})
+
+    def test_world_cache(self):
+        requests = []
+
+        def fetch_section(box):
+            requests.append(box)
+            return ','.join(['STONE'] * 4096)
+
+        cache = WorldCache(max_age=None)
+        self.assertEqual(cache.get_block(1, 70, -1, fetch_section), 'STONE')
+        self.assertEqual(requests, [(0, 64, -16, 15, 79, -1)])
+        # same section: served locally, and updated by our own writes
+        cache.apply_box((0, 70, -3, 2, 70, -1), 'GLASS')
+        self.assertEqual(cache.get_block(1, 70, -1, fetch_section), 'GLASS')
+        self.assertEqual(cache.get_block(15, 64, -16, fetch_section), 'STONE')
+        self.assertEqual(len(requests), 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        heights = iter([80, 90])
+        self.assertEqual(cache.get_height(3, 4, lambda x, z: next(heights)), 80)
+        self.assertEqual(cache.get_height(3, 4, lambda x, z: next(heights)), 80)
+        cache.apply_box((3, 85, 4, 3, 90, 4), 'STONE')
+        self.assertEqual(cache.get_height(3, 4, lambda x, z: next(heights)), 90)
+
+    def test_world_cache_skips_sections_written_while_fetched(self):
+        cache = WorldCache(max_age=None)
+        replies = iter([','.join(['STONE'] * 4096), ','.join(['GLASS'] * 4096)])
+
+        def fetch_section(box):
+            # the placement worker writes to another block of the section meanwhile
+            cache.apply_box((2, 70, 2, 2, 70, 2), 'GLASS')
+            return next(replies)
+
+        self.assertEqual(cache.get_block(1, 70, 1, fetch_section), 'STONE')
+        # the section was not cached with the block it read before the write
+        self.assertEqual(cache.get_block(2, 70, 2, fetch_section), 'GLASS')
+        self.assertEqual(cache.misses, 2)
+
+    def test_undo_journal_keeps_first_state(self):
+        with tempfile.TemporaryDirectory() as directory:
+            palette = MaterialPalette()
+            journal = UndoJournal('test-run', directory, palette=palette)
+            journal.record(np.array([[1, 2, 3], [4, 5, 6]]), palette.intern_many(['AIR', 'STONE']))
+            journal.record(np.array([[1, 2, 3], [7, 8, 9]]), palette.intern_many(['DIRT', None]))
+            journal.save()
+            coords, indices, palette = load_undo_journal('test-run', directory)
+        self.assertEqual(coords.dtype, np.int32)
+        self.assertEqual(indices.dtype, np.uint16)
+        self.assertEqual(coords.tolist(), [[1, 2, 3], [4, 5, 6]])
+        self.assertEqual([palette[i] for i in indices], ['AIR', 'STONE'])
+
+    def test_undo_journal_many_records(self):
+        with tempfile.TemporaryDirectory() as directory:
+            palette = MaterialPalette()
+            journal = UndoJournal('many', directory, palette=palette)
+            stone, dirt = palette.intern_many(['STONE', 'DIRT'])
+            # single blocks, enough to merge the recorded runs several times
+            for x in range(200):
+                journal.record([(x, 64, 0)], [stone])
+            journal.record(box_voxels([(0, 64, 0, 299, 64, 1)]), np.full(600, dirt))
+            self.assertEqual(len(journal), 600)
+            self.assertIn((199, 64, 0), journal)
+            self.assertNotIn((0, 65, 0), journal)
+            coords, indices, _ = journal.arrays()
+        journaled = dict(zip(map(tuple, coords.tolist()), indices.tolist()))
+        self.assertEqual(len(journaled), 600)
+        self.assertEqual((journaled[(199, 64, 0)], journaled[(200, 64, 0)], journaled[(0, 64, 1)]),
+                         (stone, dirt, dirt))
+
+    def test_undo_restores_journaled_materials_only(self):
+        world = InMemoryWorld(ground_level=64)
+        with tempfile.TemporaryDirectory() as directory, mock.patch('mcshell.mcundo.MC_UNDO_DIR', directory):
+            mca = MCActions(MCPlayer(TEST_PLAYER_NAME), world=world, blocks_per_second=None)
+            palette = mca.palette
+            palette.intern_many(['GLASS', 'DIRT', 'GOLD_BLOCK'])
+            journal = UndoJournal('restore', palette=palette)
+            journal.record([(0, 70, 0), (1, 70, 0)], palette.intern_many(['DIRT', 'DIRT']))
+            journal.save()
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(mca.undo('restore'), 2)
+            mca.close()
+            self.assertFalse(undo_journal_path('restore').exists())
+        self.assertEqual((world.getBlock(0, 70, 0), world.getBlock(1, 70, 0)), ('DIRT', 'DIRT'))
+        self.assertNotIn("nothing to place", output.getvalue())
+
+    def test_undo_journal_ids_are_not_paths(self):
+        self.assertEqual(undo_journal_path('debug_1a2b3c', '/tmp').name, 'debug_1a2b3c.undo')
+        for execution_id in ('../../etc/passwd', 'a/b', '', None, '..'):
+            with self.assertRaises(ValueError):
+                undo_journal_path(execution_id)
+        from mcshell.mcserver import app
+        reply = app.test_client().post('/api/undo_power', json={'execution_id': '../../secret'})
+        self.assertEqual(reply.status_code, 400)
+
+    def test_schematic_round_trip(self):
+        # 200 materials push palette indices past one varint byte
+        palette = [f'MATERIAL_{i}' for i in range(200)]
+        blocks = np.random.default_rng(0).integers(0, 200, (5, 3, 4)).astype(np.uint16)
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('test.schem', 'test.nbt'):
+                save_schematic(pathlib.Path(directory) / name, blocks, palette)
+                loaded, loaded_palette = load_schematic(pathlib.Path(directory) / name)
+                self.assertEqual(loaded.shape, blocks.shape)
+                self.assertTrue(np.array_equal(np.array(loaded_palette)[loaded], np.array(palette)[blocks]))
+
+    def test_transform_blocks(self):
+        blocks = np.zeros((3, 1, 2), dtype=np.uint16)
+        blocks[2, 0, 0] = 1  # north-east corner
+        # a clockwise quarter turn takes it to the south-east corner
+        rotated = transform_blocks(blocks, 1)
+        self.assertEqual(rotated.shape, (2, 1, 3))
+        self.assertEqual(np.argwhere(rotated == 1).tolist(), [[1, 0, 2]])
+        self.assertEqual(np.argwhere(transform_blocks(blocks, 0, mirror='x') == 1).tolist(), [[0, 0, 0]])
+        self.assertTrue(np.array_equal(transform_blocks(blocks, 4), blocks))
+
+    def test_sharded_writes_keep_blocks_on_one_connection(self):
+        class _Shard:
+            def __init__(self):
+                self.voxels = set()
+                self.synced = 0
+                self.closed = False
+
+            def setBlocks(self, x1, y1, z1, x2, y2, z2, block):
+                self.voxels.update(_expand_boxes(np.array([[x1, y1, z1, x2, y2, z2]])))
+
+            def sync(self, timeout):
+                time.sleep(0.01)
+                self.synced += 1
+                return True
+
+            def close(self):
+                self.closed = True
+
+        pool = ShardedConnection(connections=3, region_size=32, shard_factory=_Shard)
+        pool.setBlocks(-40, 0, 5, 70, 1, 40, 'STONE')
+        pool.setBlocks(20, 1, 30, 50, 1, 33, 'STONE')
+        voxels = [shard.voxels for shard in pool.shards]
+        # every block went to exactly one connection, and all of them were used
+        self.assertEqual(sum(len(v) for v in voxels), len(set.union(*voxels)))
+        self.assertEqual(len(set.union(*voxels)), 111 * 2 * 36)
+        self.assertTrue(all(voxels))
+        self.assertEqual(sum(pool.writes), 12 + 2)
+        self.assertEqual(pool.rates(), [None] * 3)
+
+        pool.close()
+        self.assertTrue(all(shard.closed and shard.synced == 1 for shard in pool.shards))
+        # each connection's rate is over the time it had writes in flight
+        self.assertTrue(all(0 < active < 1.0 for active in pool.active_time))
+        self.assertTrue(all(rate > 0 for rate in pool.rates()))
+        self.assertIn(" writes/s combined.", pool.report())
+
+    def test_pipelined_connection(self):
+        server, client = socket.socketpair()
+        received = []
+
+        def serve():
+            # FruitJuice answers failed writes and every request, in order
+            for line in server.makefile('rb'):
+                received.append(line)
+                if line.startswith(b"world.getPlayerIds"):
+                    server.sendall(b"Fail,There are no players in the server.\n")
+                elif b"BAD" in line:
+                    server.sendall(b"Fail,Unknown material BAD\n")
+
+        threading.Thread(target=serve, daemon=True).start()
+        conn = PipelinedConnection(flush_lines=3, flush_interval=60.0, sock=client)
+        try:
+            conn.setBlock(0, 64, 0, 'STONE')
+            conn.setBlocks(0, 64, 0, 1, 65, 1, 'BAD')
+            time.sleep(0.1)
+            # nothing is sent before the buffer holds flush_lines lines
+            self.assertEqual((received, conn.lines_sent), ([], 0))
+            conn.set_block_encoded(2, 64, 0, b",DIRT)\n")
+            self.assertEqual(conn.lines_sent, 3)
+            self.assertTrue(conn.sync(timeout=5.0))
+            self.assertEqual(received, [b"world.setBlock(0,64,0,STONE)\n", b"world.setBlocks(0,64,0,1,65,1,BAD)\n",
+                                        b"world.setBlock(2,64,0,DIRT)\n", b"world.getPlayerIds()\n"])
+            # the error reply came before the sync reply, so it has been collected
+            self.assertEqual(conn.errors, ["Fail,Unknown material BAD"])
+            self.assertEqual(conn.report_errors(), 1)
+            self.assertEqual(conn.errors, [])
+        finally:
+            conn.close()
+            server.close()
+
+    def test_parallel_reader_heights(self):
+        class _Heights(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    x, z = (int(v) for v in line[len(b"world.getHeight("):-2].split(b","))
+                    # column x = 99 gets a reply that is not a height
+                    self.wfile.write(b"garbled\n" if x == 99 else b"%d\n" % (x * 10 + z))
+                self.server.closed.release()
+
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _Heights)
+        server.daemon_threads = True
+        server.closed = threading.Semaphore(0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        reader = ParallelReader('127.0.0.1', server.server_address[1], workers=2)
+        try:
+            columns = [(x, z) for x in range(4) for z in range(5)]
+            # batches go to two connections and come back in order
+            self.assertEqual(reader.get_heights(columns, batch=3), [x * 10 + z for x, z in columns])
+            self.assertEqual(reader.get_heights([(99, 0), (1, 1)]), [None, None])
+            # the failed connection is closed, not leaked
+            self.assertTrue(server.closed.acquire(timeout=5.0))
+            self.assertEqual(reader.get_heights([(2, 2)]), [22])
+        finally:
+            reader.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_power_registry_cleared_when_close_fails(self):
+        from mcshell import mcserver
+        python_code = textwrap.dedent("""
+            class BlocklyProgramRunner:
+                def __init__(self, action_implementer, cancel_event=None, runtime_params={}):
+                    pass
+
+                def run_program(self):
+                    raise RuntimeError("program failed")
+            """)
+        mcserver.RUNNING_POWERS['failing'] = {}
+        with mock.patch.object(mcserver.socketio, 'emit') as emit, \
+                mock.patch.object(mcserver.MCActions, 'close', side_effect=OSError("connection reset")) as close:
+            mcserver.execute_power_in_thread('power', 'failing', python_code, TEST_PLAYER_NAME, MC_SERVER_DATA, {},
+                                             threading.Event(), {'dry_run': 'on'})
+        self.assertEqual(close.call_count, 1)
+        self.assertEqual(emit.call_args_list[-1][0][1]['status'], 'error')
+        self.assertNotIn('failing', mcserver.RUNNING_POWERS)
+        self.assertNotIn('failing', mcserver.POWER_PROGRESS)
+
+    def test_parse_verify(self):
+        self.assertEqual([parse_verify(v) for v in (None, '', 'off', False)], [0.0] * 4)
+        self.assertEqual([parse_verify(v) for v in (True, 'on', 'full', '1')], [1.0] * 4)
+        self.assertEqual(parse_verify('0.05'), 0.05)
+        self.assertEqual(parse_verify(7), 1.0)
+
+    def test_structure_backend_tiles(self):
+        with tempfile.TemporaryDirectory() as world_path:
+            placed = {}
+
+            class _Client:
+                password = 'secret'
+
+                def run_many(self, commands):
+                    for command in commands:
+                        _, _, template, x, y, z = command.split()
+                        name = template.split(':')[1]
+                        path = pathlib.Path(world_path, 'generated', 'mcshell', 'structures', f"{name}.nbt")
+                        placed[(int(x), int(y), int(z))] = load_schematic(path)
+                    return ['Loaded structure'] * len(commands)
+
+            backend = StructureTemplateBackend(_Client(), world_path)
+            self.assertTrue(backend.available)
+            commands = backend.place_boxes([(-10, 0, 0, 50, 1, 0, 'STONE'), (0, 1, 0, 0, 1, 0, 'GLASS')])
+            # tiles are aligned to a 48-block grid; the later box wins where they overlap
+            self.assertEqual(commands, 3)
+            self.assertEqual(sorted(placed), [(-10, 0, 0), (0, 0, 0), (48, 0, 0)])
+            blocks, palette = placed[(0, 0, 0)]
+            self.assertEqual(blocks.shape, (48, 2, 1))
+            self.assertEqual((palette[blocks[0, 1, 0]], palette[blocks[1, 1, 0]]), ('GLASS', 'STONE'))
+            # the template files are removed once the server has loaded them
+            self.assertEqual(list(backend.structures_path.iterdir()), [])
+
+            # a large box is expanded one tile at a time
+            placed.clear()
+            expanded = []
+            with mock.patch('mcshell.mcschematic.box_voxels',
+                            side_effect=lambda boxes: expanded.append(box_voxels(boxes)) or expanded[-1]):
+                self.assertEqual(backend.place_boxes([(0, 0, 0, 99, 3, 99, 'STONE'),
+                                                      (0, 0, 0, 0, 0, 0, 'GLASS')]), 9)
+            self.assertEqual(max(len(voxels) for voxels in expanded), 48 * 4 * 48 + 1)
+            self.assertEqual(sum(blocks.size for blocks, _ in placed.values()), 100 * 4 * 100)
+            blocks, palette = placed[(0, 0, 0)]
+            self.assertEqual((palette[blocks[0, 0, 0]], palette[blocks[1, 0, 0]]), ('GLASS', 'STONE'))
+
+    def test_in_memory_world(self):
+        world = InMemoryWorld(ground_level=64)
+        world.setBlocks(-2, 70, 14, 1, 71, 17, 'GLASS')  # spans four sections
+        world.setBlock(0, 63, 0, 'AIR')
+        self.assertEqual((world.writes, world.voxels_written), (2, 33))
+        self.assertEqual(world.getBlock(-2, 71, 17), 'GLASS')
+        self.assertEqual(world.getBlock(5, 63, 5), 'STONE')
+        self.assertEqual(world.getHeight(1, 14), 71)
+        self.assertEqual(world.getHeight(0, 0), 62)
+        # getBlocks replies list y outermost, then x, then z
+        self.assertEqual(world.conn.sendReceive(b"world.getBlocks", 1, 71, 17, 2, 72, 17), 'GLASS,AIR,AIR,AIR')
+
+
+if __name__ == '__main__':
+    unittest.main()
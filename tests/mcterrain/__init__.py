@@ -0,0 +1,29 @@
+from tests import *
+from mcshell.mcterrain import *
+
+
+class TestMCTerrain(unittest.TestCase):
+
+    def test_gradient_noise_vanishes_on_lattice(self):
+        x, z = np.arange(-3, 4)[:, None], np.arange(-2, 3)[None, :]
+        self.assertEqual(np.abs(gradient_noise_2d(x, z, seed=1)).max(), 0.0)
+        noise = gradient_noise_2d(x + 0.5, z + 0.25, seed=1)
+        self.assertEqual(noise.shape, (7, 5))
+        self.assertLessEqual(np.abs(noise).max(), 1.0)
+
+    def test_heights_for_a_fixed_seed(self):
+        heights = generate_terrain_heights(0, 0, 7, 3, amplitude=16, seed=42)
+        self.assertEqual(heights.shape, (8, 4))
+        self.assertEqual(heights[7].tolist(), [8, 8, 9, 8])
+        self.assertTrue(np.array_equal(generate_terrain_heights(7, 3, 0, 0, amplitude=16, seed=42), heights))
+        self.assertTrue(1 <= heights.min() and heights.max() <= 17)
+
+    def test_columns(self):
+        runs = generate_terrain_columns(5, 60, -2, np.array([[1, 5], [3, 0]]))
+        self.assertEqual(runs, [(5, 60, -2, 5, 60, -2, 'GRASS_BLOCK'), (5, 64, -1, 5, 64, -1, 'GRASS_BLOCK'),
+                                (6, 62, -2, 6, 62, -2, 'GRASS_BLOCK'), (5, 61, -1, 5, 63, -1, 'DIRT'),
+                                (6, 60, -2, 6, 61, -2, 'DIRT'), (5, 60, -1, 5, 60, -1, 'STONE')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+from tests import *
+from mcshell.mcvoxel import *
+
+
+class TestMCVoxel(unittest.TestCase):
+
+    def test_convex_hull_planes_cube(self):
+        cube = [(x, y, z) for x in (0, 10) for y in (0, 10) for z in (0, 10)]
+        normals, offsets = get_convex_hull_planes(cube)
+        # the 12 triangles of the hull collapse onto the 6 faces of the cube
+        self.assertEqual(len(normals), 6)
+        self.assertTrue(np.all(np.array(cube) @ normals.T - offsets <= 1e-6))
+
+    def test_convex_hull_degenerate(self):
+        self.assertEqual(generate_digital_convex_hull_coordinates([(0, 0, 0), (1, 1, 1), (2, 2, 2), (3, 3, 3)]), [])
+        self.assertEqual(generate_digital_convex_hull_coordinates([(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0)]), [])
+
+    def test_convex_hull_solid_and_hollow(self):
+        cube = [(x, y, z) for x in (0, 10) for y in (0, 10) for z in (0, 10)]
+        solid = generate_digital_convex_hull_coordinates(cube)
+        self.assertEqual(len(solid), 10 ** 3)
+        self.assertEqual(solid, sorted(solid))
+        hollow = generate_digital_convex_hull_coordinates(cube, hollow=True)
+        self.assertEqual(len(hollow), 10 ** 3 - 8 ** 3)
+        self.assertTrue(set(hollow) <= set(solid))
+
+    def test_convex_hull_contains_point_cloud_voxels(self):
+        rng = np.random.default_rng(0)
+        points = rng.normal(size=(200, 3)) * 10
+        coords = set(generate_digital_convex_hull_coordinates(points))
+        normals, offsets = get_convex_hull_planes(points)
+        # every voxel whose center lies inside the hull planes must be generated
+        for p in np.floor(points[:20] - 0.5).astype(int):
+            center = p + 0.5
+            if np.all(normals @ center <= offsets):
+                self.assertIn(tuple(p.tolist()), coords)
+
+
+if __name__ == '__main__':
+    unittest.main()